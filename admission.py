@@ -0,0 +1,149 @@
+"""
+Admission control for transaction submissions.
+
+Every ADD_TRANSACTION / ADD_TRANSACTIONS frame passes three checks before it
+is scored. If any check fails, the frame is shed whole with a RETRY_AFTER reply.
+
+    connection  a token bucket per websocket (transactions per second)
+    account     a token bucket per sender account, so one busy account
+                cannot crowd out the rest of a connection's traffic
+                (client frames only: gossip from peers was already
+                charged to its account on the node a client sent it to)
+    overload    a cap on transactions being scored at once across all
+                connections (only reachable with --score-workers, where
+                scoring awaits)
+
+Nothing waits in a queue. A client that is over its limit is told when to
+come back, so the node's memory and latency stay bounded under a flood.
+
+    admission = AdmissionControl(connection_rate=2000, account_rate=20, max_scoring=4000)
+    shed = admission.admit(websocket, [tx.sender for tx in txs])
+    if shed is None:
+        try:
+            ...  # score the batch
+        finally:
+            admission.release(len(txs))
+"""
+
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Dict, List, Optional
+
+MAX_TRACKED_ACCOUNTS = 100_000  # Least recently seen accounts lose their bucket (it refills anyway)
+
+# Shed reasons (also the keys of LiveStats.throttled)
+REASON_CONNECTION = "connection"
+REASON_ACCOUNT = "account"
+REASON_OVERLOAD = "overload"
+OVERLOAD_RETRY_AFTER = 0.1  # seconds; scoring slots free up within a batch's scoring time
+
+
+class TokenBucket:
+    """`rate` tokens per second, holding at most `burst`."""
+
+    def __init__(self, rate: float, burst: float, now: float):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.updated = now
+
+    def wait_time(self, n: int, now: float) -> float:
+        """Seconds until `n` tokens can be taken (0 = now). A full bucket admits any n, going into debt."""
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        needed = min(n, self.burst)
+        return 0.0 if self.tokens >= needed else (needed - self.tokens) / self.rate
+
+    def take(self, n: int):
+        self.tokens -= n
+
+
+@dataclass
+class Shed:
+    reason: str
+    retry_after: float  # seconds
+    account: Optional[str] = None
+
+
+class AdmissionControl:
+    """Token buckets per connection and per account plus a global scoring cap. A limit of 0 disables that check."""
+
+    def __init__(self, connection_rate: float = 0, account_rate: float = 0, max_scoring: int = 0,
+                 connection_burst: Optional[float] = None, account_burst: Optional[float] = None):
+        self.connection_rate = connection_rate
+        self.account_rate = account_rate
+        self.connection_burst = connection_burst or connection_rate
+        self.account_burst = account_burst or account_rate
+        self.max_scoring = max_scoring
+        self.scoring = 0  # Transactions admitted and not yet released
+        self._connections: Dict[object, TokenBucket] = {}
+        self._accounts: "OrderedDict[str, TokenBucket]" = OrderedDict()
+
+    def describe(self) -> str:
+        """One line for the startup banner."""
+        limits = [f"{self.connection_rate:g} tx/s per client" if self.connection_rate else "",
+                  f"{self.account_rate:g}/account" if self.account_rate else "",
+                  f"{self.max_scoring} scoring" if self.max_scoring else ""]
+        return ", ".join(filter(None, limits)) or "Off"
+
+    def admit(self, connection, senders: List[str], now: Optional[float] = None,
+              check_accounts: bool = True) -> Optional[Shed]:
+        """
+        Admits the transactions from `senders` (one entry per transaction), or
+        says why not. All or nothing. `check_accounts=False` skips the
+        per-account buckets (for peer links).
+        """
+        now = now if now is not None else time.monotonic()
+        n = len(senders)
+
+        connection_bucket = None
+        if self.connection_rate:
+            connection_bucket = self._connections.get(connection)
+            if connection_bucket is None:
+                connection_bucket = self._connections[connection] = \
+                    TokenBucket(self.connection_rate, self.connection_burst, now)
+            wait = connection_bucket.wait_time(n, now)
+            if wait:
+                return Shed(REASON_CONNECTION, wait)
+
+        account_buckets = []
+        if self.account_rate and check_accounts:
+            counts: Dict[str, int] = {}
+            for sender in senders:
+                counts[sender] = counts.get(sender, 0) + 1
+            for account, count in counts.items():
+                bucket = self._account_bucket(account, now)
+                wait = bucket.wait_time(count, now)
+                if wait:
+                    return Shed(REASON_ACCOUNT, wait, account)
+                account_buckets.append((bucket, count))
+
+        # An idle node takes any batch, however large the cap
+        if self.max_scoring and self.scoring and self.scoring + n > self.max_scoring:
+            return Shed(REASON_OVERLOAD, OVERLOAD_RETRY_AFTER)
+
+        # Every check passed: only now spend the tokens
+        if connection_bucket is not None:
+            connection_bucket.take(n)
+        for bucket, count in account_buckets:
+            bucket.take(count)
+        self.scoring += n
+        return None
+
+    def release(self, n: int):
+        """Frees the scoring slots of `n` admitted transactions."""
+        self.scoring -= n
+
+    def forget(self, connection):
+        self._connections.pop(connection, None)
+
+    def _account_bucket(self, account: str, now: float) -> TokenBucket:
+        bucket = self._accounts.get(account)
+        if bucket is None:
+            bucket = self._accounts[account] = TokenBucket(self.account_rate, self.account_burst, now)
+            if len(self._accounts) > MAX_TRACKED_ACCOUNTS:
+                self._accounts.popitem(last=False)
+        else:
+            self._accounts.move_to_end(account)
+        return bucket
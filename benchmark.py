@@ -0,0 +1,482 @@
+"""
+Micro-benchmarks for the core hot paths
+Runs offline (no server, no network) with fixed seeds.
+
+Examples:
+    python benchmark.py --quick
+    python benchmark.py --save bench_baseline.json
+    python benchmark.py --baseline bench_baseline.json --threshold 0.25
+"""
+
+import argparse
+import asyncio
+import json
+import logging
+import platform
+import random
+import statistics
+import sys
+import time
+
+from blockchain import Block, Blockchain, Transaction
+
+SEED = 1234
+BENCHMARKS = []
+
+
+def benchmark(name, quick=True):
+    """Registers a benchmark. The decorated function returns (callable, ops_per_call), or None to skip it."""
+    def register(func):
+        BENCHMARKS.append((name, func, quick))
+        return func
+    return register
+
+
+def make_tx_dicts(rng, count):
+    types = ["PAYMENT", "TRANSFER", "CASH_OUT", "CASH_IN", "DEBIT"]
+    txs = []
+    for i in range(count):
+        tx = Transaction(
+            f"C{rng.randint(100000000, 999999999)}",
+            f"C{rng.randint(100000000, 999999999)}",
+            round(rng.uniform(1, 1000000), 2),
+            rng.choice(types),
+            1700000000.0 + i,
+        )
+        txs.append(tx.to_dict())
+    return txs
+
+
+def make_chain(rng, length, txs_per_block=1):
+    """Builds a valid chain without proof-of-work (validity only checks hashes and links)."""
+    bc = Blockchain()
+    bc.chain[0].timestamp = 1700000000.0
+    bc.chain[0].hash = bc.chain[0].calculate_hash()
+    for i in range(1, length):
+        block = Block(i, 1700000000.0 + i, make_tx_dicts(rng, txs_per_block), bc.chain[-1].hash)
+        block.hash = block.calculate_hash()
+        bc.append_block(block)
+    return bc
+
+
+@benchmark("block.calculate_hash[100tx]")
+def bench_calculate_hash(rng):
+    block = Block(1, 1700000000.0, make_tx_dicts(rng, 100), "0" * 64)
+    return block.calculate_hash, 1
+
+
+def _mine(difficulty, rng):
+    txs = make_tx_dicts(rng, 10)
+
+    def run():
+        block = Block(1, 1700000000.0, txs, "0" * 64)
+        block.mine_block(difficulty)
+    return run, 1
+
+
+@benchmark("block.mine_block[d=1]")
+def bench_mine_d1(rng):
+    return _mine(1, rng)
+
+
+@benchmark("block.mine_block[d=2]")
+def bench_mine_d2(rng):
+    return _mine(2, rng)
+
+
+@benchmark("block.mine_block[d=3]", quick=False)
+def bench_mine_d3(rng):
+    return _mine(3, rng)
+
+
+@benchmark("blockchain.is_chain_valid[1k]")
+def bench_valid_1k(rng):
+    bc = make_chain(rng, 1000)
+    return bc.is_chain_valid, 1
+
+
+@benchmark("blockchain.is_chain_valid[10k]")
+def bench_valid_10k(rng):
+    bc = make_chain(rng, 10000)
+    return bc.is_chain_valid, 1
+
+
+@benchmark("blockchain.is_chain_valid[100k]", quick=False)
+def bench_valid_100k(rng):
+    bc = make_chain(rng, 100000)
+    return bc.is_chain_valid, 1
+
+
+@benchmark("chain_audit.audit_chain[10k, 1 worker]")
+def bench_audit_10k(rng):
+    from chain_audit import audit_chain
+
+    bc = make_chain(rng, 10000)
+    return (lambda: audit_chain(bc, workers=1)), 1
+
+
+@benchmark("chain_audit.audit_chain[100k, all cores]", quick=False)
+def bench_audit_100k(rng):
+    from chain_audit import audit_chain
+
+    bc = make_chain(rng, 100000)
+    return (lambda: audit_chain(bc)), 1
+
+
+@benchmark("blockchain.to_list[1k]")
+def bench_to_list(rng):
+    bc = make_chain(rng, 1000, txs_per_block=5)
+    return (lambda: json.dumps(bc.to_list())), 1
+
+
+def _find_transactions(rng, length):
+    bc = make_chain(rng, length, txs_per_block=10)
+    tx_ids = [bc.chain[rng.randrange(1, length)].transactions[0]["tx_id"] for _ in range(100)]
+    return (lambda: [bc.find_transaction(tx_id) for tx_id in tx_ids]), len(tx_ids)
+
+
+@benchmark("blockchain.find_transaction[1k blocks]")
+def bench_find_tx_1k(rng):
+    return _find_transactions(rng, 1000)
+
+
+@benchmark("blockchain.find_transaction[10k blocks]")
+def bench_find_tx_10k(rng):
+    return _find_transactions(rng, 10000)
+
+
+@benchmark("chain_index.account_page[10k blocks]")
+def bench_account_page(rng):
+    from chain_index import ChainIndex, HistoryQuery
+
+    bc = make_chain(rng, 10000, txs_per_block=10)
+    # One busy account (in every 10th block), so pages are full
+    for block in bc.chain[1::10]:
+        block.transactions[0]["sender"] = "C_BUSY"
+    index = ChainIndex()
+    for block in bc.chain:
+        index.add_block(block)
+    query = HistoryQuery("C_BUSY", limit=50)
+    return (lambda: index.account_page(query)), 1
+
+
+@benchmark("chain_query.run_query[10k blocks]")
+def bench_query(rng):
+    from chain_index import ChainIndex
+    from chain_query import parse_tx_query, run_query
+
+    bc = make_chain(rng, 10000, txs_per_block=10)
+    levels = ["LOW", "MEDIUM", "HIGH"]
+    for block in bc.chain:
+        for tx in block.transactions:
+            tx["fraud_analysis"] = {"risk_level": rng.choices(levels, [90, 9, 1])[0]}
+    bc.index = ChainIndex()  # Re-summarize with the risk levels set
+    for block in bc.chain:
+        bc.index.add_block(block)
+    # "All HIGH-risk TRANSFERs over 100k"
+    query = parse_tx_query({"min_risk": "HIGH", "tx_types": ["TRANSFER"], "min_amount": 100000, "limit": 100})
+    return (lambda: run_query(bc, query)), 1
+
+
+def _engine():
+    from fraud_engine import FraudDetectionEngine
+    return FraudDetectionEngine()
+
+
+def _scoring_payloads(rng, count):
+    return [
+        {
+            "sender": tx["sender"],
+            "receiver": tx["receiver"],
+            "amount": tx["amount"],
+            "type": tx["type"],
+            "sender_balance": round(rng.uniform(0, 2000000), 2),
+            "receiver_balance": round(rng.uniform(0, 2000000), 2),
+        }
+        for tx in make_tx_dicts(rng, count)
+    ]
+
+
+@benchmark("fraud_engine.evaluate_transaction[x500]")
+def bench_evaluate_single(rng):
+    engine = _engine()
+    payloads = _scoring_payloads(rng, 500)
+    return (lambda: [engine.evaluate_transaction(tx) for tx in payloads]), len(payloads)
+
+
+@benchmark("fraud_engine.evaluate_batch[500]")
+def bench_evaluate_batch(rng):
+    engine = _engine()
+    payloads = _scoring_payloads(rng, 500)
+    return (lambda: engine.evaluate_batch(payloads)), len(payloads)
+
+
+def _feature_payloads(rng, count):
+    payloads = _scoring_payloads(rng, count)
+    for tx in payloads[::50]:
+        tx["type"] = "UNKNOWN"  # Exercise the unknown-type path too
+    return payloads
+
+
+@benchmark("features.transform_row[x1000]")
+def bench_feature_row(rng):
+    pipeline = _engine().features
+    payloads = _feature_payloads(rng, 1000)
+    return (lambda: [pipeline.transform_row(tx) for tx in payloads]), len(payloads)
+
+
+@benchmark("features.transform_batch[1000]")
+def bench_feature_batch(rng):
+    pipeline = _engine().features
+    payloads = _feature_payloads(rng, 1000)
+    return (lambda: pipeline.transform_batch(payloads)), len(payloads)
+
+
+class FakeClient:
+    """Stands in for a websocket: send() just counts bytes."""
+
+    def __init__(self):
+        self.bytes_sent = 0
+
+    async def send(self, payload):
+        self.bytes_sent += len(payload)
+
+
+def _fan_out(client_count, rng):
+    import server
+
+    clients = {FakeClient() for _ in range(client_count)}
+    message = {"type": "NEW_TRANSACTIONS", "transactions": make_tx_dicts(rng, 50)}
+    loop = asyncio.new_event_loop()
+    return (lambda: loop.run_until_complete(server.send_to_clients(clients, message))), 1
+
+
+@benchmark("server.send_to_clients[10 clients]")
+def bench_fan_out_10(rng):
+    return _fan_out(10, rng)
+
+
+@benchmark("server.send_to_clients[1000 clients]")
+def bench_fan_out_1000(rng):
+    return _fan_out(1000, rng)
+
+
+@benchmark("metrics.span[x1000]")
+def bench_span(rng):
+    from metrics import StageTimings
+
+    timings = StageTimings()
+
+    def run():
+        for _ in range(1000):
+            with timings.span("bench"):
+                pass
+    return run, 1000
+
+
+def _codec(name):
+    """(dumps, loads) for a runtime codec, or None when it is not installed."""
+    import runtime
+
+    if name == "orjson":
+        return (runtime._orjson_dumps, runtime.orjson.loads) if runtime.orjson else None
+    return json.dumps, json.loads
+
+
+def _scored_tx_dicts(rng, count):
+    """Transactions as the server broadcasts them: fraud_analysis from the engine's real verdicts."""
+    from dataclasses import asdict
+
+    txs = make_tx_dicts(rng, count)
+    payloads = _scoring_payloads(rng, count)
+    for tx, result in zip(txs, _engine().evaluate_batch(payloads)):
+        tx["fraud_analysis"] = asdict(result)  # score, risk_level, decision, details (as server.attach_analysis)
+    return txs
+
+
+def _encode_new_transactions(codec, rng):
+    if not (codec := _codec(codec)):
+        return None
+    # Broadcast batches range from 50 to 200 transactions
+    messages = [{"type": "NEW_TRANSACTIONS", "transactions": _scored_tx_dicts(rng, count)} for count in (50, 100, 200)]
+    return (lambda: [codec[0](message) for message in messages]), len(messages)
+
+
+def _encode_stats_update(codec, rng):
+    if not (codec := _codec(codec)):
+        return None
+    from types import SimpleNamespace
+    from metrics import LiveStats
+
+    chain = make_chain(rng, 6, txs_per_block=20).chain
+    stats = LiveStats(genesis_block=chain[0])
+    for block in chain[1:]:
+        scored = [SimpleNamespace(risk_level=rng.choice(["LOW", "MEDIUM", "HIGH"])) for _ in range(100)]
+        stats.record_transactions(scored, rng.random() / 10)
+        stats.record_block(block, rng.random())
+    message = {"type": "STATS_UPDATE", "stats": stats.snapshot(120, 3)}
+    return (lambda: codec[0](message)), 1
+
+
+def _decode_add_transactions(codec, rng):
+    if not (codec := _codec(codec)):
+        return None
+    payload = json.dumps({"type": "ADD_TRANSACTIONS", "transactions": make_tx_dicts(rng, 100)})
+    return (lambda: codec[1](payload)), 1
+
+
+@benchmark("codec.dumps[NEW_TRANSACTIONS, json]")
+def bench_dumps_new_tx_json(rng):
+    return _encode_new_transactions("json", rng)
+
+
+@benchmark("codec.dumps[NEW_TRANSACTIONS, orjson]")
+def bench_dumps_new_tx_orjson(rng):
+    return _encode_new_transactions("orjson", rng)
+
+
+@benchmark("codec.dumps[STATS_UPDATE, json]")
+def bench_dumps_stats_json(rng):
+    return _encode_stats_update("json", rng)
+
+
+@benchmark("codec.dumps[STATS_UPDATE, orjson]")
+def bench_dumps_stats_orjson(rng):
+    return _encode_stats_update("orjson", rng)
+
+
+@benchmark("codec.loads[ADD_TRANSACTIONS x100, json]")
+def bench_loads_add_json(rng):
+    return _decode_add_transactions("json", rng)
+
+
+@benchmark("codec.loads[ADD_TRANSACTIONS x100, orjson]")
+def bench_loads_add_orjson(rng):
+    return _decode_add_transactions("orjson", rng)
+
+
+def _task_churn(loop_name):
+    """1000 tasks that each yield once: the scheduling cost every connection handler pays."""
+    import runtime
+
+    if loop_name == "uvloop":
+        if not runtime.uvloop:
+            return None
+        loop = runtime.uvloop.new_event_loop()
+    else:
+        loop = asyncio.new_event_loop()
+
+    async def churn():
+        await asyncio.gather(*(asyncio.sleep(0) for _ in range(1000)))
+    return (lambda: loop.run_until_complete(churn())), 1000
+
+
+@benchmark("loop.tasks[1000 x sleep(0), asyncio]")
+def bench_loop_asyncio(rng):
+    return _task_churn("asyncio")
+
+
+@benchmark("loop.tasks[1000 x sleep(0), uvloop]")
+def bench_loop_uvloop(rng):
+    return _task_churn("uvloop")
+
+
+def measure(func, ops, min_time, repeats):
+    """Median seconds per op over `repeats` rounds, each running for at least min_time."""
+    # Calibrate the number of calls per round
+    calls = 1
+    while True:
+        started = time.perf_counter()
+        for _ in range(calls):
+            func()
+        elapsed = time.perf_counter() - started
+        if elapsed >= min_time or calls >= 1 << 20:
+            break
+        calls *= 2
+
+    rounds = [elapsed / (calls * ops)]
+    for _ in range(repeats - 1):
+        started = time.perf_counter()
+        for _ in range(calls):
+            func()
+        rounds.append((time.perf_counter() - started) / (calls * ops))
+    return statistics.median(rounds)
+
+
+def format_time(seconds):
+    if seconds < 1e-3:
+        return f"{seconds * 1e6:10.2f} µs"
+    if seconds < 1:
+        return f"{seconds * 1e3:10.2f} ms"
+    return f"{seconds:10.2f} s "
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Core hot path micro-benchmarks")
+    parser.add_argument("--quick", action="store_true", help="Skip the slowest benchmarks")
+    parser.add_argument("--filter", help="Only run benchmarks whose name contains this text")
+    parser.add_argument("--min-time", type=float, default=0.2, help="Minimum seconds per measurement round")
+    parser.add_argument("--repeats", type=int, default=5)
+    parser.add_argument("--save", help="Write results as JSON to this path")
+    parser.add_argument("--baseline", help="Compare against a previous --save JSON file")
+    parser.add_argument("--threshold", type=float, default=0.20,
+                        help="Fail if any benchmark is this much slower than baseline (0.20 = 20%%)")
+    args = parser.parse_args()
+
+    # Model loading and mining chatter would drown the report
+    logging.disable(logging.INFO)
+
+    baseline = {}
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f).get("results", {})
+
+    print("⏱️  Core micro-benchmarks (seconds per op, median of rounds)\n")
+    results = {}
+    regressions = []
+    for name, factory, quick in BENCHMARKS:
+        if args.quick and not quick:
+            continue
+        if args.filter and args.filter not in name:
+            continue
+
+        rng = random.Random(SEED)
+        bench = factory(rng)
+        if bench is None:
+            print(f"  {name:<42}    skipped (not installed)")
+            continue
+        func, ops = bench
+        per_op = measure(func, ops, args.min_time, args.repeats)
+        results[name] = per_op
+
+        line = f"  {name:<42} {format_time(per_op)}"
+        if name in baseline:
+            change = (per_op - baseline[name]) / baseline[name]
+            flag = "❌" if change > args.threshold else "✅"
+            line += f"   {flag} {change * 100:+6.1f}% vs baseline"
+            if change > args.threshold:
+                regressions.append((name, change))
+        print(line)
+
+    if args.save:
+        with open(args.save, "w") as f:
+            json.dump({
+                "environment": {
+                    "python": platform.python_version(),
+                    "platform": platform.platform(),
+                    "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+                },
+                "seed": SEED,
+                "results": results,
+            }, f, indent=2)
+        print(f"\n💾 Results written to {args.save}")
+
+    if regressions:
+        print(f"\n❌ {len(regressions)} regression(s) above {args.threshold * 100:.0f}%:")
+        for name, change in regressions:
+            print(f"   - {name}: {change * 100:+.1f}%")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,153 @@
+"""
+On-disk block store and snapshots for long-running nodes.
+
+    <data dir>/blocks.jsonl    every block (header + transactions), one JSON line each, append-only
+    <data dir>/blocks.idx      int64 byte offset of each line, so block N is one seek away
+    <data dir>/snapshot.json   derived state at some height (headers + chain index)
+
+A Blockchain given a store appends every block to it. With a prune horizon
+it then drops the transaction lists of blocks more than `horizon` blocks
+behind the tip, keeping only their headers (hash, links, Merkle root) in
+memory; bodies are read back from disk on demand through a small LRU cache.
+
+On restart the chain is rebuilt from the latest snapshot plus the blocks
+appended after it, instead of replaying every block into the indexes.
+"""
+
+import json
+import os
+from array import array
+from collections import OrderedDict
+from typing import Any, Dict, Iterator, List, Optional
+
+SNAPSHOT_VERSION = 1
+BODY_CACHE_BLOCKS = 64  # Pruned block bodies kept in memory after a read
+
+
+class BlockStore:
+    def __init__(self, directory: str, readonly: bool = False):
+        """`readonly` opens a store another process may be appending to (nothing is repaired or written)."""
+        self.directory = directory
+        self.readonly = readonly
+        if not readonly:
+            os.makedirs(directory, exist_ok=True)
+        self.blocks_path = os.path.join(directory, "blocks.jsonl")
+        self.index_path = os.path.join(directory, "blocks.idx")
+        self.snapshot_path = os.path.join(directory, "snapshot.json")
+        self.offsets = array("q")
+        self._body_cache: "OrderedDict[int, List[Dict[str, Any]]]" = OrderedDict()
+        self._recover()
+        self._blocks = self._index = None
+        if not readonly:
+            self._blocks = open(self.blocks_path, "ab")
+            self._index = open(self.index_path, "ab")
+        self._reader = open(self.blocks_path, "rb")
+
+    def _recover(self):
+        """Loads the offsets, re-deriving them if the index file is behind the block file (e.g. after a crash)."""
+        if os.path.exists(self.index_path):
+            with open(self.index_path, "rb") as f:
+                data = f.read()
+            self.offsets.frombytes(data[:len(data) - len(data) % self.offsets.itemsize])
+        if not os.path.exists(self.blocks_path):
+            if self.readonly:
+                raise FileNotFoundError(f"No block store in {self.directory}")
+            open(self.blocks_path, "wb").close()
+        size = os.path.getsize(self.blocks_path)
+
+        with open(self.blocks_path, "rb") as f:
+            # Drop index entries that do not point at a complete line
+            while self.offsets:
+                f.seek(self.offsets[-1])
+                line = f.readline()
+                if self.offsets[-1] < size and line.endswith(b"\n"):
+                    position = self.offsets[-1] + len(line)
+                    break
+                self.offsets.pop()
+            else:
+                position = 0
+            f.seek(position)
+            # Index any complete lines after the last indexed one
+            while True:
+                line = f.readline()
+                if not line.endswith(b"\n"):
+                    break
+                self.offsets.append(position)
+                position += len(line)
+
+        if self.readonly:
+            return
+        # A partial last line is an interrupted append
+        if position < size:
+            with open(self.blocks_path, "r+b") as f:
+                f.truncate(position)
+        with open(self.index_path, "wb") as f:
+            f.write(self.offsets.tobytes())
+
+    def __len__(self) -> int:
+        return len(self.offsets)
+
+    def append(self, block: Dict[str, Any]):
+        """Writes one block (header + transactions) after the last one."""
+        line = json.dumps(block, separators=(",", ":")).encode() + b"\n"
+        offset = self._blocks.tell()
+        self._blocks.write(line)
+        self._blocks.flush()
+        self.offsets.append(offset)
+        self._index.write(array("q", [offset]).tobytes())
+        self._index.flush()
+
+    def truncate(self, count: int):
+        """Keeps the first `count` blocks (a reorg replaces the rest)."""
+        if count >= len(self.offsets):
+            return
+        size = self.offsets[count]
+        del self.offsets[count:]
+        self._body_cache.clear()
+        for f, length in ((self._blocks, size), (self._index, count * self.offsets.itemsize)):
+            f.flush()
+            f.truncate(length)
+            f.seek(length)  # Keeps tell() (the next block's offset) right in append mode
+
+    def read(self, height: int) -> Dict[str, Any]:
+        self._reader.seek(self.offsets[height])
+        return json.loads(self._reader.readline())
+
+    def read_transactions(self, height: int) -> List[Dict[str, Any]]:
+        """A block's transaction list, from the LRU cache or disk."""
+        transactions = self._body_cache.get(height)
+        if transactions is None:
+            transactions = self.read(height)["transactions"]
+            self._body_cache[height] = transactions
+            if len(self._body_cache) > BODY_CACHE_BLOCKS:
+                self._body_cache.popitem(last=False)
+        else:
+            self._body_cache.move_to_end(height)
+        return transactions
+
+    def iter_blocks(self, start: int = 0) -> Iterator[Dict[str, Any]]:
+        for height in range(start, len(self.offsets)):
+            yield self.read(height)
+
+    def close(self):
+        for f in (self._blocks, self._index, self._reader):
+            if f is not None:
+                f.close()
+
+
+def write_snapshot(path: str, state: Dict[str, Any]):
+    """Writes a snapshot atomically (temp file + rename), so a crash never leaves a torn one."""
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w") as f:
+        json.dump({"version": SNAPSHOT_VERSION, **state}, f, separators=(",", ":"))
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
+
+def read_snapshot(path: str) -> Optional[Dict[str, Any]]:
+    if not os.path.exists(path):
+        return None
+    with open(path) as f:
+        state = json.load(f)
+    return state if state.get("version") == SNAPSHOT_VERSION else None
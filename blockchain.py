@@ -2,9 +2,58 @@
 import hashlib
 import json
 import time
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Optional, Tuple
 from dataclasses import dataclass, field, asdict
 
+from block_store import BlockStore, read_snapshot, write_snapshot
+from chain_index import ChainIndex
+
+GENESIS_TIMESTAMP = 1700000000.0  # Fixed, so every node starts from the same genesis block
+
+
+def _merkle_leaf(tx_id: str) -> str:
+    # Leaves and inner nodes are hashed with different prefixes, so an inner node can never pass as a leaf
+    return hashlib.sha256(f"0{tx_id}".encode()).hexdigest()
+
+
+def _merkle_node(left: str, right: str) -> str:
+    return hashlib.sha256(f"1{left}{right}".encode()).hexdigest()
+
+
+def _merkle_levels(tx_ids: List[str]) -> List[List[str]]:
+    """Every level of the tree, leaves first. An odd last node moves up unpaired (not duplicated)."""
+    level = [_merkle_leaf(tx_id) for tx_id in tx_ids] or [hashlib.sha256(b"").hexdigest()]
+    levels = [level]
+    while len(level) > 1:
+        level = [_merkle_node(level[i], level[i + 1]) if i + 1 < len(level) else level[i]
+                 for i in range(0, len(level), 2)]
+        levels.append(level)
+    return levels
+
+
+def merkle_root(transactions: List[Dict[str, Any]]) -> str:
+    """Root of the binary Merkle tree over the block's tx ids, committed in the block header."""
+    return _merkle_levels([tx["tx_id"] for tx in transactions])[-1][0]
+
+
+def merkle_proof(transactions: List[Dict[str, Any]], offset: int) -> List[List[str]]:
+    """Inclusion proof for the transaction at `offset`: [sibling hash, "L" or "R"] pairs from the leaf up."""
+    proof = []
+    for level in _merkle_levels([tx["tx_id"] for tx in transactions])[:-1]:
+        sibling = offset ^ 1
+        if sibling < len(level):
+            proof.append([level[sibling], "L" if offset % 2 else "R"])
+        offset //= 2
+    return proof
+
+
+def verify_merkle_proof(tx_id: str, proof: List[List[str]], root: str) -> bool:
+    """Whether `proof` (from merkle_proof) links `tx_id` to `root`. Needs only the block header, not the body."""
+    node = _merkle_leaf(tx_id)
+    for sibling, side in proof:
+        node = _merkle_node(sibling, node) if side == "L" else _merkle_node(node, sibling)
+    return node == root
+
 class Transaction:
     def __init__(self, sender: str, receiver: str, amount: float, type: str = "PAYMENT", timestamp: float = None):
         self.sender = sender
@@ -30,21 +79,31 @@ class Transaction:
             "fraud_analysis": self.fraud_analysis
         }
 
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "Transaction":
+        """Rebuilds a transaction from to_dict() output (e.g. from a peer). Raises ValueError if tx_id does not match."""
+        tx = cls(data["sender"], data["receiver"], data["amount"], data.get("type", "PAYMENT"), data["timestamp"])
+        if tx.id != data.get("tx_id"):
+            raise ValueError(f"tx_id {data.get('tx_id')} does not match the transaction fields")
+        tx.fraud_analysis = data.get("fraud_analysis")
+        return tx
+
 @dataclass
 class Block:
     index: int
     timestamp: float
-    transactions: List[Dict[str, Any]]
+    transactions: Optional[List[Dict[str, Any]]]  # None once pruned (body on disk, see block_store.py)
     previous_hash: str
     nonce: int = 0
     hash: str = ""
     merkle_root: str = ""
 
-    def calculate_hash(self) -> str:
+    def calculate_hash(self, transactions: Optional[List[Dict[str, Any]]] = None) -> str:
+        """Header hash; pass `transactions` for a pruned block."""
         block_string = json.dumps({
             "index": self.index,
             "timestamp": self.timestamp,
-            "transactions": self.transactions,
+            "transactions": self.transactions if transactions is None else transactions,
             "previous_hash": self.previous_hash,
             "nonce": self.nonce,
             "merkle_root": self.merkle_root
@@ -58,23 +117,142 @@ class Block:
             self.hash = self.calculate_hash()
 
 class Blockchain:
-    def __init__(self):
-        self.chain: List[Block] = [self.create_genesis_block()]
+    def __init__(self, store: Optional[BlockStore] = None, prune_horizon: Optional[int] = None):
+        self.index = ChainIndex()  # tx_id and account lookups, see chain_index.py
+        self.chain: List[Block] = []
+        self.store = store  # Persists every block when set
+        self.prune_horizon = prune_horizon  # Blocks this far behind the tip keep only their header in memory
+        if store is not None and len(store):
+            self._restore()
+        else:
+            self.append_block(self.create_genesis_block())
         self.difficulty = 2  # Adjust for demo speed
         self.mempool: List[Transaction] = []
+        self.mempool_ids = set()
+        self.verbose = True  # Print mining progress to stdout
 
     def create_genesis_block(self) -> Block:
-        genesis_tx = Transaction("SYSTEM", "ADMIN", 1000000, "GENESIS", 0)
-        block = Block(0, time.time(), [genesis_tx.to_dict()], "0")
+        genesis_tx = Transaction("SYSTEM", "ADMIN", 1000000, "GENESIS", GENESIS_TIMESTAMP)
+        block = Block(0, GENESIS_TIMESTAMP, [genesis_tx.to_dict()], "0")
         block.hash = block.calculate_hash()
         return block
 
     def get_latest_block(self) -> Block:
         return self.chain[-1]
 
+    def append_block(self, block: Block):
+        """Appends a block to the chain (and the store) and indexes its transactions."""
+        if self.store is not None:
+            self.store.append(asdict(block))
+        self._attach(block)
+
+    def _attach(self, block: Block):
+        self.chain.append(block)
+        self.index.add_block(block)
+        if self.prune_horizon is not None and len(self.chain) > self.prune_horizon:
+            self.chain[-1 - self.prune_horizon].transactions = None
+
+    def truncate(self, height: int) -> List[Block]:
+        """Drops every block above `height` (from memory, the index and the store); returns them with their bodies."""
+        dropped = self.chain[height + 1:]
+        for block in dropped:
+            block.transactions = self.get_block_transactions(block.index)
+        del self.chain[height + 1:]
+        self.index.truncate(height + 1, dropped)
+        if self.store is not None:
+            self.store.truncate(height + 1)
+            # Blocks back inside the horizon get their bodies back
+            for block in self.chain[-self.prune_horizon:] if self.prune_horizon else []:
+                if block.transactions is None:
+                    block.transactions = self.store.read(block.index)["transactions"]
+        return dropped
+
+    def reorganize(self, fork_height: int, blocks: List[Block]) -> List[Dict[str, Any]]:
+        """
+        Switches to another branch: drops the blocks above `fork_height` and
+        appends `blocks` (already verified). Returns the transactions of the
+        dropped blocks that the new branch does not contain.
+        """
+        dropped = self.truncate(fork_height)
+        for block in blocks:
+            self.append_block(block)
+        return [tx for block in dropped for tx in block.transactions if tx["tx_id"] not in self.index.by_tx_id]
+
+    def _restore(self):
+        """Rebuilds the chain from the store: the latest snapshot, then the blocks appended after it."""
+        snapshot = read_snapshot(self.store.snapshot_path)
+        if snapshot and snapshot["height"] < len(self.store) and \
+                self.store.read(snapshot["height"])["hash"] == snapshot["headers"][-1]["hash"]:
+            self.chain = [Block(transactions=None, **header) for header in snapshot["headers"]]
+            self.index = ChainIndex.from_state(snapshot["index"])
+        for block in self.store.iter_blocks(len(self.chain)):
+            self._attach(Block(**block))
+
+        # Blocks inside the horizon keep their bodies in memory
+        keep_from = 0 if self.prune_horizon is None else len(self.chain) - self.prune_horizon
+        for block in self.chain[max(keep_from, 0):]:
+            if block.transactions is None:
+                block.transactions = self.store.read(block.index)["transactions"]
+
+    def snapshot_state(self) -> Dict[str, Any]:
+        """Headers and indexes at the current tip (see block_store.write_snapshot)."""
+        headers = [{k: v for k, v in asdict(block).items() if k != "transactions"} for block in self.chain]
+        return {"height": len(self.chain) - 1, "headers": headers, "index": self.index.to_state()}
+
+    def save_snapshot(self):
+        write_snapshot(self.store.snapshot_path, self.snapshot_state())
+
+    def get_block_transactions(self, block_index: int) -> List[Dict[str, Any]]:
+        """A block's transactions; pruned bodies are read from the store and checked against the header."""
+        block = self.chain[block_index]
+        if block.transactions is not None:
+            return block.transactions
+        transactions = self.store.read_transactions(block_index)
+        if block.merkle_root and merkle_root(transactions) != block.merkle_root:
+            raise ValueError(f"Block {block_index} body on disk does not match its Merkle root")
+        return transactions
+
+    def get_transaction(self, block_index: int, offset: int) -> Dict[str, Any]:
+        return self.get_block_transactions(block_index)[offset]
+
+    def get_transactions(self, positions: List[Tuple[int, int]]) -> List[Dict[str, Any]]:
+        """Transactions at (block, offset) positions, reading and checking each block's body once."""
+        bodies: Dict[int, List[Dict[str, Any]]] = {}
+        result = []
+        for block_index, offset in positions:
+            if block_index not in bodies:
+                bodies[block_index] = self.get_block_transactions(block_index)
+            result.append(bodies[block_index][offset])
+        return result
+
+    def get_merkle_proof(self, block_index: int, offset: int) -> List[List[str]]:
+        return merkle_proof(self.get_block_transactions(block_index), offset)
+
+    def find_transaction(self, tx_id: str) -> Optional[Tuple[int, int, Dict[str, Any]]]:
+        """(block index, offset, transaction) of a mined transaction, or None."""
+        position = self.index.find_tx(tx_id)
+        if position is None:
+            return None
+        return (*position, self.get_transaction(*position))
+
     def add_transaction(self, tx: Transaction):
         """Adds a validated transaction to the mempool."""
         self.mempool.append(tx)
+        self.mempool_ids.add(tx.id)
+
+    def add_transactions(self, txs: List[Transaction]):
+        """Adds a batch of validated transactions to the mempool in one step."""
+        self.mempool.extend(txs)
+        self.mempool_ids.update(tx.id for tx in txs)
+
+    def remove_transactions(self, tx_ids: set):
+        """Drops mempool transactions that were mined elsewhere (a block from a peer)."""
+        self.mempool = [tx for tx in self.mempool if tx.id not in tx_ids]
+        self.mempool_ids -= tx_ids
+
+    def has_transaction(self, tx_id: str) -> bool:
+        """Whether a transaction is already in the mempool or mined."""
+        return tx_id in self.mempool_ids or tx_id in self.index.by_tx_id
 
     def mine_pending_transactions(self, miner_address: str):
         """Mines all transactions in the mempool into a new block."""
@@ -84,44 +262,54 @@ class Blockchain:
         # Create new block
         latest_block = self.get_latest_block()
         
-        # Calculate Merkle Root (Simplified for now)
-        tx_hashes = [tx.to_dict()['tx_id'] for tx in self.mempool]
-        merkle_root = hashlib.sha256("".join(tx_hashes).encode()).hexdigest()
+        # Merkle root over the tx ids (see merkle_proof for inclusion proofs)
+        transactions = [tx.to_dict() for tx in self.mempool]
         
         new_block = Block(
             index=latest_block.index + 1,
             timestamp=time.time(),
-            transactions=[tx.to_dict() for tx in self.mempool],
+            transactions=transactions,
             previous_hash=latest_block.hash,
-            merkle_root=merkle_root
+            merkle_root=merkle_root(transactions)
         )
 
         # Proof of Work
-        print(f"⛏️ Mining block {new_block.index} with {len(self.mempool)} transactions...")
+        if self.verbose:
+            print(f"⛏️ Mining block {new_block.index} with {len(self.mempool)} transactions...")
         new_block.mine_block(self.difficulty)
-        print(f"✅ Block mined! Hash: {new_block.hash}")
+        if self.verbose:
+            print(f"✅ Block mined! Hash: {new_block.hash}")
 
         # Add to chain
-        self.chain.append(new_block)
+        self.append_block(new_block)
 
         # Clear mempool
         self.mempool = []
+        self.mempool_ids = set()
         
         # Reward Miner (optional, adding a coinbase tx for next block)
         # self.mempool.append(Transaction("SYSTEM", miner_address, 50, "REWARD"))
 
         return new_block
 
+    def is_block_valid(self, current: Block, previous: Block) -> bool:
+        """Checks a single block's hash and its link to the previous block."""
+        try:
+            transactions = self.get_block_transactions(current.index)
+        except ValueError:
+            return False  # Pruned body no longer matches its Merkle root
+        if current.hash != current.calculate_hash(transactions):
+            return False
+        if current.previous_hash != previous.hash:
+            return False
+        return True
+
     def is_chain_valid(self) -> bool:
         for i in range(1, len(self.chain)):
-            current = self.chain[i]
-            previous = self.chain[i - 1]
-
-            if current.hash != current.calculate_hash():
-                return False
-            if current.previous_hash != previous.hash:
+            if not self.is_block_valid(self.chain[i], self.chain[i - 1]):
                 return False
         return True
 
     def to_list(self) -> List[Dict[str, Any]]:
+        """Every block as a dict. Pruned blocks keep "transactions": None (read them with GET_TX / QUERY_TXS or the store)."""
         return [asdict(block) for block in self.chain]
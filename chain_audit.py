@@ -0,0 +1,172 @@
+"""
+Full-chain integrity audit across a process pool.
+
+Every block's checks depend only on its own data and the hash of the block
+before it. So the chain is cut into height ranges, each worker checks its
+ranges on its own, and the results are merged in chain order:
+
+    hash         the stored hash equals the hash recomputed from the block's data
+    link         previous_hash equals the previous block's recomputed hash
+    Merkle root  the root recomputed from the transaction ids (blocks that carry one)
+
+Chains with a block store (see block_store.py) are audited from the raw
+store records, not from the headers in memory (which were restored from
+the same store). Workers are sent only height ranges: each opens the store
+read-only, re-hashes the block before its range to seed the first link,
+and reads and re-hashes its own blocks. In-memory chains ship each range's
+blocks to the worker instead.
+
+    python chain_audit.py --data-dir chain_data --workers 4
+
+    from chain_audit import audit_chain
+    result = audit_chain(blockchain)
+    result.first_invalid  # None when the chain is valid
+"""
+
+import argparse
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
+from typing import List, Optional, Tuple
+
+from colorama import init, Fore, Style
+
+from block_store import BlockStore
+from blockchain import Block, Blockchain, merkle_root
+
+init(autoreset=True)
+
+RANGES_PER_WORKER = 4  # More, smaller ranges even out uneven block sizes
+MIN_RANGE_BLOCKS = 256  # Below this a range costs more to ship than to check
+
+# Block store to read from: set by _init_worker in workers, by audit_store when it runs in-process
+_store = None
+
+
+@dataclass
+class AuditResult:
+    valid: bool
+    blocks_checked: int
+    first_invalid: Optional[int] = None  # Lowest failing height
+    reason: str = ""
+    workers: int = 1
+    seconds: float = 0.0
+
+
+def _init_worker(store_dir: Optional[str] = None):
+    global _store
+    if store_dir:
+        _store = BlockStore(store_dir, readonly=True)
+
+
+def _check_block(block: Block, height: int, previous_hash: str) -> Optional[str]:
+    """Why the block at `height` is invalid, or None."""
+    if block.index != height:
+        return f"block has index {block.index}"
+    if block.calculate_hash() != block.hash:
+        return "hash does not match block data"
+    if block.previous_hash != previous_hash:
+        return "previous_hash does not match the previous block"
+    if block.merkle_root and merkle_root(block.transactions) != block.merkle_root:
+        return "Merkle root does not match transactions"
+    return None
+
+
+def _audit_blocks(start: int, previous_hash: str, blocks: List[Block]) -> Optional[Tuple[int, str]]:
+    """(height, reason) of the first failing block in an in-memory range, or None."""
+    for height, block in enumerate(blocks, start):
+        reason = _check_block(block, height, previous_hash)
+        if reason:
+            return height, reason
+        previous_hash = block.hash
+    return None
+
+
+def _audit_stored(start: int, stop: int) -> Optional[Tuple[int, str]]:
+    """(height, reason) of the first failing block in heights [start, stop) of the store, or None."""
+    # Recomputed, not the stored hash field: the range before checks that block itself
+    previous_hash = Block(**_store.read(start - 1)).calculate_hash()
+    for height in range(start, stop):
+        block = Block(**_store.read(height))
+        reason = _check_block(block, height, previous_hash)
+        if reason:
+            return height, reason
+        previous_hash = block.hash
+    return None
+
+
+def _range_size(height: int, pool_size: int, ranges_per_worker: int) -> int:
+    return max(-(-(height - 1) // (pool_size * ranges_per_worker)), MIN_RANGE_BLOCKS)
+
+
+def _run(check, tasks: list, height: int, workers: Optional[int], store: Optional[BlockStore] = None) -> AuditResult:
+    """Runs `check` over `tasks` (argument tuples in chain order) and merges the results."""
+    global _store
+    pool_size = workers or os.cpu_count() or 1
+    started = time.perf_counter()
+    # One worker is not worth a pool (and keeps single-core machines on the fast path)
+    pool = ProcessPoolExecutor(min(pool_size, len(tasks)), initializer=_init_worker,
+                               initargs=(store.directory if store is not None else None,)) \
+        if pool_size > 1 and len(tasks) > 1 else None
+    if pool is None:
+        _store = store
+    try:
+        # map() yields in range order, so the first failure reported is the lowest failing height
+        failure = next(filter(None, (pool.map if pool else map)(check, *zip(*tasks))), None) \
+            if tasks else None
+    finally:
+        if pool:
+            pool.shutdown(cancel_futures=True)
+
+    result = AuditResult(valid=failure is None, blocks_checked=max(height - 1, 0),
+                         workers=pool_size if pool else 1, seconds=time.perf_counter() - started)
+    if failure:
+        result.first_invalid, result.reason = failure
+        result.blocks_checked = result.first_invalid - 1  # Valid blocks before the failure
+    return result
+
+
+def audit_store(store: BlockStore, workers: Optional[int] = None,
+                ranges_per_worker: int = RANGES_PER_WORKER) -> AuditResult:
+    """Checks every stored block after genesis from the raw records; workers read their own height ranges."""
+    height = len(store)
+    pool_size = workers or os.cpu_count() or 1
+    range_size = _range_size(height, pool_size, ranges_per_worker)
+    tasks = [(start, min(start + range_size, height)) for start in range(1, height, range_size)]
+    return _run(_audit_stored, tasks, height, workers, store)
+
+
+def audit_chain(blockchain: Blockchain, workers: Optional[int] = None,
+                ranges_per_worker: int = RANGES_PER_WORKER) -> AuditResult:
+    """Checks every block after genesis (as is_chain_valid does) and reports the first failing height."""
+    if blockchain.store is not None:
+        return audit_store(blockchain.store, workers, ranges_per_worker)
+    chain = blockchain.chain
+    height = len(chain)
+    pool_size = workers or os.cpu_count() or 1
+    range_size = _range_size(height, pool_size, ranges_per_worker)
+    tasks = [(start, chain[start - 1].hash, chain[start:start + range_size])
+             for start in range(1, height, range_size)]
+    return _run(_audit_blocks, tasks, height, workers)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Audit a stored chain: hashes, links and Merkle roots")
+    parser.add_argument("--data-dir", required=True, help="A node's --data-dir")
+    parser.add_argument("--workers", type=int, help="Worker processes (default: CPU count)")
+    args = parser.parse_args()
+
+    # Read-only: safe to run against the data directory of a running node
+    store = BlockStore(args.data_dir, readonly=True)
+    if not len(store):
+        sys.exit(f"No blocks in {args.data_dir}")
+    print(f"🔍 Auditing {len(store):,} blocks from {args.data_dir}...")
+    result = audit_store(store, workers=args.workers)
+    if result.valid:
+        print(f"{Fore.GREEN}✅ Chain valid: {result.blocks_checked:,} blocks checked in {result.seconds:.2f}s "
+              f"on {result.workers} worker(s){Style.RESET_ALL}")
+    else:
+        print(f"{Fore.RED}❌ Block {result.first_invalid} invalid: {result.reason}{Style.RESET_ALL}")
+        sys.exit(1)
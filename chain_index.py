@@ -0,0 +1,157 @@
+"""
+Secondary indexes over the mined chain, maintained on block append.
+
+Every transaction in the chain gets a sequence number: its position in
+chain order (genesis transaction = 0). The indexes store sequence numbers
+only and map them back to (block, offset) through the first sequence
+number of every block, so a lookup costs a dict probe plus a binary search
+however long the chain is:
+
+    tx_id   -> sequence number
+    account -> posting list of sequence numbers (sender or receiver), ascending
+
+It also keeps a per-block summary for skipping blocks in queries (see
+chain_query.py).
+"""
+
+from array import array
+from bisect import bisect_left, bisect_right
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional, Tuple
+
+from chain_query import BlockSummary, summarize_block
+
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 500
+
+
+@dataclass
+class HistoryQuery:
+    account: str
+    limit: int = DEFAULT_PAGE_SIZE
+    cursor: Optional[int] = None  # next_cursor of the previous page
+    newest_first: bool = True
+
+
+def parse_history_query(data: Dict[str, Any]) -> HistoryQuery:
+    """Builds a HistoryQuery from a GET_ACCOUNT_HISTORY message. Raises ValueError on bad fields."""
+    account = data.get("account")
+    if not account:
+        raise ValueError("'account' is required")
+
+    try:
+        limit = int(data.get("limit", DEFAULT_PAGE_SIZE))
+        cursor = data.get("cursor")
+        cursor = None if cursor is None else int(cursor)
+    except (TypeError, ValueError):
+        raise ValueError("'limit' and 'cursor' must be integers")
+    if not 1 <= limit <= MAX_PAGE_SIZE:
+        raise ValueError(f"'limit' must be between 1 and {MAX_PAGE_SIZE}")
+
+    order = data.get("order", "desc")
+    if order not in ("asc", "desc"):
+        raise ValueError(f"Unknown order: {order}")
+
+    return HistoryQuery(account=str(account), limit=limit, cursor=cursor, newest_first=(order == "desc"))
+
+
+class ChainIndex:
+    def __init__(self):
+        self.block_starts = array("q")  # Sequence number of each block's first transaction
+        self.tx_count = 0
+        self.by_tx_id: Dict[str, int] = {}
+        self.by_account: Dict[str, array] = {}
+        self.summaries: List[BlockSummary] = []
+
+    def add_block(self, block):
+        """Indexes a block appended to the chain (blocks must arrive in chain order)."""
+        self.block_starts.append(self.tx_count)
+        self.summaries.append(summarize_block(block.transactions))
+        for tx in block.transactions:
+            seq = self.tx_count
+            self.by_tx_id.setdefault(tx["tx_id"], seq)  # First occurrence wins
+            for account in {tx["sender"], tx["receiver"]}:
+                postings = self.by_account.get(account)
+                if postings is None:
+                    postings = self.by_account[account] = array("q")
+                postings.append(seq)
+            self.tx_count += 1
+
+    def truncate(self, block_count: int, dropped):
+        """Un-indexes the blocks from `block_count` on (`dropped`, with their transactions), for a reorg."""
+        if block_count >= len(self.block_starts):
+            return
+        tx_count = self.block_starts[block_count]
+        for block in dropped:
+            for tx in block.transactions:
+                if self.by_tx_id.get(tx["tx_id"], -1) >= tx_count:
+                    del self.by_tx_id[tx["tx_id"]]
+                for account in {tx["sender"], tx["receiver"]}:
+                    postings = self.by_account.get(account)
+                    if postings is None:
+                        continue
+                    while postings and postings[-1] >= tx_count:
+                        postings.pop()
+                    if not postings:
+                        del self.by_account[account]
+        del self.block_starts[block_count:]
+        del self.summaries[block_count:]
+        self.tx_count = tx_count
+
+    def to_state(self) -> Dict[str, Any]:
+        """JSON-serializable copy of the index, for snapshots. Shares nothing mutable with the live index."""
+        return {
+            "block_starts": self.block_starts.tolist(),
+            "tx_count": self.tx_count,
+            "by_tx_id": dict(self.by_tx_id),
+            "by_account": {account: postings.tolist() for account, postings in self.by_account.items()},
+            "summaries": [
+                [s.min_timestamp, s.max_timestamp, s.min_amount, s.max_amount, list(s.types), s.risk_counts]
+                for s in self.summaries
+            ],
+        }
+
+    @classmethod
+    def from_state(cls, state: Dict[str, Any]) -> "ChainIndex":
+        index = cls()
+        index.block_starts = array("q", state["block_starts"])
+        index.tx_count = state["tx_count"]
+        index.by_tx_id = dict(state["by_tx_id"])
+        index.by_account = {account: array("q", postings) for account, postings in state["by_account"].items()}
+        index.summaries = [
+            BlockSummary(min_ts, max_ts, min_amount, max_amount, frozenset(types), risk_counts)
+            for min_ts, max_ts, min_amount, max_amount, types, risk_counts in state["summaries"]
+        ]
+        return index
+
+    def position(self, seq: int) -> Tuple[int, int]:
+        """(block index, offset in block) of a sequence number."""
+        block = bisect_right(self.block_starts, seq) - 1
+        return block, seq - self.block_starts[block]
+
+    def find_tx(self, tx_id: str) -> Optional[Tuple[int, int]]:
+        seq = self.by_tx_id.get(tx_id)
+        return None if seq is None else self.position(seq)
+
+    def account_page(self, query: HistoryQuery) -> Tuple[List[Tuple[int, int]], int, Optional[int]]:
+        """
+        One page of an account's transactions as (block, offset) positions,
+        plus the account's total count and the cursor for the next page
+        (None on the last page). Cursors are sequence numbers, so pages stay
+        stable while new blocks are appended.
+        """
+        postings = self.by_account.get(query.account, array("q"))
+        if query.newest_first:
+            end = len(postings) if query.cursor is None else bisect_left(postings, query.cursor)
+            start = max(end - query.limit, 0)
+            page = postings[start:end][::-1]
+            more = start > 0
+        else:
+            start = 0 if query.cursor is None else bisect_left(postings, query.cursor)
+            page = postings[start:start + query.limit]
+            more = start + query.limit < len(postings)
+        # Newest first continues below the last returned sequence number, oldest first above it
+        next_cursor = None
+        if more:
+            next_cursor = page[-1] if query.newest_first else page[-1] + 1
+        return [self.position(seq) for seq in page], len(postings), next_cursor
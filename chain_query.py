@@ -0,0 +1,251 @@
+"""
+Server-side queries over mined transactions (QUERY_TXS).
+
+Every block gets a BlockSummary when it is appended: timestamp and amount
+ranges, the transaction types it contains and its risk level counts. A
+query first checks a block's summary and skips the whole block when no
+transaction in it can match; only the remaining blocks have their
+transactions filtered one by one. Account queries walk the account's
+posting list from the chain index instead of the blocks.
+
+Results come back in pages of `limit`, newest first by default, with a
+cursor (a transaction sequence number, see chain_index.py) for the next page.
+"""
+
+import time
+from bisect import bisect_left
+from dataclasses import dataclass, field
+from typing import Any, Dict, FrozenSet, List, Optional, Set, Tuple
+
+from subscriptions import RISK_RANK
+
+DEFAULT_PAGE_SIZE = 100
+MAX_PAGE_SIZE = 1000
+MAX_SCAN_ROWS = 20_000  # Transactions checked per page
+MAX_SCAN_BLOCKS = 50_000  # Blocks visited (scanned or skipped) per page
+
+
+@dataclass(frozen=True)
+class BlockSummary:
+    min_timestamp: float
+    max_timestamp: float
+    min_amount: float
+    max_amount: float
+    types: FrozenSet[str]
+    risk_counts: Dict[str, int]
+
+
+def summarize_block(transactions: List[Dict[str, Any]]) -> BlockSummary:
+    timestamps = [float(tx.get("timestamp", 0.0)) for tx in transactions] or [0.0]
+    amounts = [float(tx.get("amount", 0.0)) for tx in transactions] or [0.0]
+    risk_counts = dict.fromkeys(RISK_RANK, 0)
+    for tx in transactions:
+        level = (tx.get("fraud_analysis") or {}).get("risk_level")
+        if level in risk_counts:
+            risk_counts[level] += 1
+    return BlockSummary(min(timestamps), max(timestamps), min(amounts), max(amounts),
+                        frozenset(tx.get("type") for tx in transactions), risk_counts)
+
+
+@dataclass
+class TxQuery:
+    since: Optional[float] = None
+    until: Optional[float] = None
+    min_amount: Optional[float] = None
+    max_amount: Optional[float] = None
+    tx_types: Optional[Set[str]] = None
+    risk_levels: Optional[Set[str]] = None
+    account: Optional[str] = None
+    limit: int = DEFAULT_PAGE_SIZE
+    cursor: Optional[int] = None
+    newest_first: bool = True
+
+    def block_may_match(self, summary: BlockSummary) -> bool:
+        if self.since is not None and summary.max_timestamp < self.since:
+            return False
+        if self.until is not None and summary.min_timestamp > self.until:
+            return False
+        if self.min_amount is not None and summary.max_amount < self.min_amount:
+            return False
+        if self.max_amount is not None and summary.min_amount > self.max_amount:
+            return False
+        if self.tx_types is not None and summary.types.isdisjoint(self.tx_types):
+            return False
+        if self.risk_levels is not None and not any(summary.risk_counts[level] for level in self.risk_levels):
+            return False
+        return True
+
+    def matches(self, tx: Dict[str, Any]) -> bool:
+        timestamp = float(tx.get("timestamp", 0.0))
+        amount = float(tx.get("amount", 0.0))
+        if self.since is not None and timestamp < self.since:
+            return False
+        if self.until is not None and timestamp > self.until:
+            return False
+        if self.min_amount is not None and amount < self.min_amount:
+            return False
+        if self.max_amount is not None and amount > self.max_amount:
+            return False
+        if self.tx_types is not None and tx.get("type") not in self.tx_types:
+            return False
+        if self.risk_levels is not None and (tx.get("fraud_analysis") or {}).get("risk_level") not in self.risk_levels:
+            return False
+        if self.account is not None and self.account not in (tx.get("sender"), tx.get("receiver")):
+            return False
+        return True
+
+
+def _optional_float(data: Dict[str, Any], key: str) -> Optional[float]:
+    value = data.get(key)
+    if value is None:
+        return None
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        raise ValueError(f"'{key}' must be a number")
+
+
+def _optional_set(data: Dict[str, Any], key: str) -> Optional[Set[str]]:
+    values = data.get(key)
+    if values is None:
+        return None
+    if not isinstance(values, list):
+        raise ValueError(f"'{key}' must be a list")
+    return {str(v).upper() for v in values}
+
+
+def parse_tx_query(data: Dict[str, Any], now: Optional[float] = None) -> TxQuery:
+    """
+    Builds a TxQuery from a QUERY_TXS message. Time range: "since" / "until"
+    (Unix seconds) or "last_seconds". Risk: "risk_levels" (list) or
+    "min_risk". Raises ValueError on anything it does not understand.
+    """
+    since, until = _optional_float(data, "since"), _optional_float(data, "until")
+    last_seconds = _optional_float(data, "last_seconds")
+    if last_seconds is not None:
+        since = (now if now is not None else time.time()) - last_seconds
+
+    risk_levels = _optional_set(data, "risk_levels")
+    min_risk = data.get("min_risk")
+    if min_risk is not None:
+        min_risk = str(min_risk).upper()
+        if min_risk not in RISK_RANK:
+            raise ValueError(f"Unknown risk level: {min_risk}")
+        risk_levels = {level for level, rank in RISK_RANK.items() if rank >= RISK_RANK[min_risk]}
+    if risk_levels is not None and not risk_levels <= set(RISK_RANK):
+        raise ValueError(f"Unknown risk level(s): {', '.join(sorted(risk_levels - set(RISK_RANK)))}")
+
+    try:
+        limit = int(data.get("limit", DEFAULT_PAGE_SIZE))
+        cursor = data.get("cursor")
+        cursor = None if cursor is None else int(cursor)
+    except (TypeError, ValueError):
+        raise ValueError("'limit' and 'cursor' must be integers")
+    if not 1 <= limit <= MAX_PAGE_SIZE:
+        raise ValueError(f"'limit' must be between 1 and {MAX_PAGE_SIZE}")
+
+    order = data.get("order", "desc")
+    if order not in ("asc", "desc"):
+        raise ValueError(f"Unknown order: {order}")
+
+    account = data.get("account")
+    return TxQuery(
+        since=since, until=until,
+        min_amount=_optional_float(data, "min_amount"), max_amount=_optional_float(data, "max_amount"),
+        tx_types=_optional_set(data, "tx_types"), risk_levels=risk_levels,
+        account=None if account is None else str(account),
+        limit=limit, cursor=cursor, newest_first=(order == "desc"),
+    )
+
+
+@dataclass
+class QueryPage:
+    matches: List[Tuple[int, int, Dict[str, Any]]] = field(default_factory=list)  # (block, offset, tx)
+    next_cursor: Optional[int] = None  # None once the scan reached the end of the chain (or account)
+    blocks_scanned: int = 0
+    blocks_skipped: int = 0
+
+
+def _scan_blocks(blockchain, query: TxQuery, page: QueryPage):
+    """Walks blocks in query order from the cursor, skipping whole blocks by summary, until the page or budget fills."""
+    index = blockchain.index
+    if not index.tx_count:
+        return
+    if query.newest_first:
+        first = index.tx_count - 1 if query.cursor is None else min(query.cursor, index.tx_count) - 1
+        if first < 0:
+            return
+        start_block, _ = index.position(first)
+        blocks = range(start_block, -1, -1)
+    else:
+        first = 0 if query.cursor is None else query.cursor
+        if first >= index.tx_count:
+            return
+        start_block, _ = index.position(first)
+        blocks = range(start_block, len(index.block_starts))
+
+    rows = 0
+    for visited, block in enumerate(blocks):
+        block_start = index.block_starts[block]
+        block_end = index.block_starts[block + 1] if block + 1 < len(index.block_starts) else index.tx_count
+        if visited == MAX_SCAN_BLOCKS or rows >= MAX_SCAN_ROWS:
+            # Budget spent: hand back a (possibly short) page that resumes at this block
+            page.next_cursor = block_end if query.newest_first else block_start
+            return
+        if not query.block_may_match(index.summaries[block]):
+            page.blocks_skipped += 1
+            continue
+        page.blocks_scanned += 1
+        transactions = blockchain.get_block_transactions(block)  # One read and Merkle check per block
+        if query.newest_first:
+            seqs = range(min(block_end - 1, first), block_start - 1, -1)
+        else:
+            seqs = range(max(block_start, first), block_end)
+        for seq in seqs:
+            rows += 1
+            tx = transactions[seq - block_start]
+            if not query.matches(tx):
+                continue
+            page.matches.append((block, seq - block_start, tx))
+            if len(page.matches) == query.limit:
+                page.next_cursor = seq if query.newest_first else seq + 1
+                return
+
+
+def _scan_account(blockchain, query: TxQuery, page: QueryPage):
+    """Walks the account's posting list from the cursor until the page or the row budget fills."""
+    index = blockchain.index
+    postings = index.by_account.get(query.account, [])
+    if query.newest_first:
+        end = len(postings) if query.cursor is None else bisect_left(postings, query.cursor)
+        seqs = (postings[i] for i in range(end - 1, -1, -1))
+    else:
+        start = 0 if query.cursor is None else bisect_left(postings, query.cursor)
+        seqs = (postings[i] for i in range(start, len(postings)))
+
+    bodies: Dict[int, List[Dict[str, Any]]] = {}
+    for rows, seq in enumerate(seqs, 1):
+        block, offset = index.position(seq)
+        if block not in bodies:
+            bodies[block] = blockchain.get_block_transactions(block)
+        tx = bodies[block][offset]
+        if query.matches(tx):
+            page.matches.append((block, offset, tx))
+        if len(page.matches) == query.limit or rows == MAX_SCAN_ROWS:
+            page.next_cursor = seq if query.newest_first else seq + 1
+            return
+
+
+def run_query(blockchain, query: TxQuery) -> QueryPage:
+    """
+    One page of transactions matching `query`. A page stops early once it has
+    checked MAX_SCAN_ROWS rows or visited MAX_SCAN_BLOCKS blocks, so a
+    selective query cannot hold the event loop for a whole-chain walk; it then
+    returns fewer than `limit` matches and a next_cursor to continue from.
+    """
+    page = QueryPage()
+    if query.account is not None:
+        _scan_account(blockchain, query, page)
+    else:
+        _scan_blocks(blockchain, query, page)
+    return page
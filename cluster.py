@@ -0,0 +1,190 @@
+"""
+Local multi-node harness for block and transaction replication.
+
+Starts N server processes on consecutive ports, each peered with the one
+before it (a line, so gossip has to be relayed), all mining. It then checks
+three things:
+
+    1. Transactions sent to different nodes end up mined exactly once, and
+       every node converges on the same chain (concurrent miners fork; the
+       forks resolve by chain work).
+    2. A node that was down while blocks were mined syncs the missing range
+       from its peer (headers first) after a restart from its --data-dir.
+    3. All nodes agree on the tip afterwards.
+
+Node logs and data directories go to a temporary directory (kept on failure).
+
+    python cluster.py --nodes 3 --transactions 60 --mine-interval 2
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import random
+import shutil
+import subprocess
+import sys
+import secrets
+import tempfile
+import time
+
+import websockets
+
+BASE_PORT = 8770
+PEER_SECRET = secrets.token_hex(16)  # Shared by the nodes of one run
+
+
+class Node:
+    def __init__(self, number, port, peers, workdir, mine_interval):
+        self.number = number
+        self.port = port
+        self.uri = f"ws://localhost:{port}"
+        self.peers = peers
+        self.data_dir = os.path.join(workdir, f"node{number}")
+        self.log_path = os.path.join(workdir, f"node{number}.log")
+        self.mine_interval = mine_interval
+        self.process = None
+
+    def start(self):
+        command = [sys.executable, "server.py", "--headless", "--port", str(self.port),
+                   "--data-dir", self.data_dir, "--mine-interval", str(self.mine_interval),
+                   "--peer-secret", PEER_SECRET]
+        if self.peers:
+            command += ["--peers", ",".join(self.peers)]
+        with open(self.log_path, "a") as log:
+            self.process = subprocess.Popen(command, stdout=log, stderr=subprocess.STDOUT)
+
+    def stop(self):
+        if self.process and self.process.poll() is None:
+            self.process.terminate()
+            self.process.wait(timeout=10)
+
+
+async def request(uri, message, reply_type, timeout=10.0):
+    async with websockets.connect(uri, max_size=None) as websocket:
+        await websocket.send(json.dumps(message))
+        while True:
+            data = json.loads(await asyncio.wait_for(websocket.recv(), timeout))
+            if data.get("type") == reply_type:
+                return data
+
+
+async def wait_until_up(node, timeout=30.0):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            await request(node.uri, {"type": "GET_STATS"}, "STATS_DATA")
+            return
+        except (OSError, websockets.exceptions.WebSocketException, asyncio.TimeoutError):
+            await asyncio.sleep(0.5)
+    raise RuntimeError(f"node {node.number} did not come up (see {node.log_path})")
+
+
+async def send_transactions(node, count, rng):
+    transactions = [
+        {"sender": f"C{rng.randint(10**8, 10**9)}", "receiver": f"C{rng.randint(10**8, 10**9)}",
+         "amount": round(rng.uniform(1, 5000), 2), "type": rng.choice(["PAYMENT", "TRANSFER", "CASH_OUT"])}
+        for _ in range(count)
+    ]
+    reply = await request(node.uri, {"type": "ADD_TRANSACTIONS", "transactions": transactions}, "TRANSACTIONS_RESULT")
+    return [r["tx_id"] for r in reply["results"]]
+
+
+async def chain_of(node):
+    data = await request(node.uri, {"type": "GET_CHAIN"}, "CHAIN_DATA")
+    return data["chain"], data["stats"]["mempool_size"]
+
+
+async def wait_for_convergence(nodes, tx_ids, timeout):
+    """Waits until every node has the same tip, an empty mempool and every tx mined. Returns the common chain."""
+    deadline = time.time() + timeout
+    while True:
+        views = [await chain_of(node) for node in nodes]
+        tips = {chain[-1]["hash"] for chain, _ in views}
+        mined = [tx["tx_id"] for block in views[0][0] for tx in block["transactions"]]
+        if len(tips) == 1 and not any(mempool for _, mempool in views) and tx_ids <= set(mined):
+            return views[0][0], mined
+        if time.time() > deadline:
+            heights = [len(chain) - 1 for chain, _ in views]
+            raise RuntimeError(f"no convergence: heights {heights}, {len(tips)} tips, "
+                               f"{len(tx_ids - set(mined))} tx not mined on node 0")
+        await asyncio.sleep(1.0)
+
+
+def count_events(node, event):
+    with open(node.log_path) as f:
+        return [json.loads(line) for line in f if f'"event": "{event}"' in line]
+
+
+async def run(args, workdir):
+    rng = random.Random(args.seed)
+    uris = [f"ws://localhost:{args.base_port + i}" for i in range(args.nodes)]
+    nodes = [Node(i, args.base_port + i, uris[i - 1:i], workdir, args.mine_interval) for i in range(args.nodes)]
+    for node in nodes:
+        node.start()
+    try:
+        for node in nodes:
+            await wait_until_up(node)
+        print(f"🌐 {len(nodes)} nodes up on ports {nodes[0].port}-{nodes[-1].port}, peered in a line")
+        await asyncio.sleep(1.0)  # Let the peer links come up
+
+        # 1. Transactions spread over all nodes, concurrent miners
+        tx_ids = set()
+        for i in range(args.transactions // 10):
+            tx_ids.update(await send_transactions(nodes[i % len(nodes)], 10, rng))
+            await asyncio.sleep(args.mine_interval / 4)
+        chain, mined = await wait_for_convergence(nodes, tx_ids, args.timeout)
+        assert len(mined) == len(set(mined)), "a transaction was mined twice"
+        print(f"✅ Converged: height {len(chain) - 1}, {len(tx_ids)} transactions mined exactly once on every node")
+
+        # 2. One node misses blocks, then catches up after a restart
+        lagging = nodes[-1]
+        lagging.stop()
+        height_before = len(chain) - 1
+        more = set()
+        for i in range(3):
+            more.update(await send_transactions(nodes[i % (len(nodes) - 1)], 10, rng))
+            await asyncio.sleep(args.mine_interval * 1.5)
+        chain, mined = await wait_for_convergence(nodes[:-1], tx_ids | more, args.timeout)
+        print(f"⏸️  Node {lagging.number} was down while the chain grew from {height_before} to {len(chain) - 1}")
+        lagging.start()
+        await wait_until_up(lagging)
+        chain, mined = await wait_for_convergence(nodes, tx_ids | more, args.timeout)
+        print(f"✅ Node {lagging.number} caught up: all nodes at height {len(chain) - 1}, tip {chain[-1]['hash'][:16]}...")
+
+        # 3. Report how the nodes got there
+        syncs = [event for node in nodes for event in count_events(node, "chain_synced")]
+        reorgs = [event for event in syncs if event["dropped"]]
+        received = sum(len(count_events(node, "block_received")) for node in nodes)
+        print(f"\n📊 Blocks relayed by gossip: {received} | branch syncs: {len(syncs)} "
+              f"| reorgs (forks resolved by work): {len(reorgs)}")
+        return True
+    finally:
+        for node in nodes:
+            node.stop()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run a local multi-node replication test")
+    parser.add_argument("--nodes", type=int, default=3)
+    parser.add_argument("--base-port", type=int, default=BASE_PORT)
+    parser.add_argument("--transactions", type=int, default=60, help="Transactions for the first phase")
+    parser.add_argument("--mine-interval", type=float, default=2.0, help="Seconds between mining rounds per node")
+    parser.add_argument("--timeout", type=float, default=60.0, help="Seconds to wait for convergence")
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+    if args.nodes < 2:
+        parser.error("--nodes must be at least 2")
+
+    workdir = tempfile.mkdtemp(prefix="cluster_")
+    try:
+        asyncio.run(run(args, workdir))
+    except (AssertionError, RuntimeError) as e:
+        print(f"❌ {e}\n   Logs and data kept in {workdir}")
+        sys.exit(1)
+    shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -24,31 +24,29 @@ def format_hash(h, length=16):
         return h or "N/A"
     return f"{h[:length]}...{h[-6:]}"
 
-def draw_dashboard(chain_data, stats_data, server_connected):
+def draw_dashboard(stats, server_connected):
     clear()
 
-    chain = chain_data.get("chain", [])
-    stats = stats_data.get("stats", {})
-    
-    total_blocks = len(chain)
+    recent_blocks = stats.get("recent_blocks", [])
+
+    total_blocks = stats.get("total_blocks", 0)
     total_tx = stats.get("total_tx", 0)
     fraud_count = stats.get("fraud_detected", 0)
     mempool = stats.get("mempool_size", 0)
     chain_valid = stats.get("chain_valid", True)
     uptime = stats.get("uptime", 0)
+    difficulty = stats.get("difficulty", 0)
+    tps = stats.get("tx_per_sec", 0.0)
+    scoring = stats.get("scoring_latency", {})
+    mining = stats.get("mining_time", {})
+    throttled = stats.get("throttled_tx", 0)
 
-    # Calculate TPS
-    if uptime > 0:
-        tps = total_tx / uptime
-    else:
-        tps = 0.0
-
-    latest_block = chain[-1] if chain else {}
+    latest_block = recent_blocks[-1] if recent_blocks else {}
     latest_hash = latest_block.get("hash", "N/A")
     latest_prev = latest_block.get("previous_hash", "N/A")
     latest_nonce = latest_block.get("nonce", 0)
     latest_merkle = latest_block.get("merkle_root", "N/A")
-    latest_txs = len(latest_block.get("transactions", []))
+    latest_txs = latest_block.get("tx_count", 0)
 
     # Health indicator
     if chain_valid and server_connected:
@@ -59,7 +57,7 @@ def draw_dashboard(chain_data, stats_data, server_connected):
         health_bar = f"{Back.RED}{Fore.WHITE}{Style.BRIGHT}  SYSTEM DEGRADED  {Style.RESET_ALL}"
 
     # Fraud rate
-    fraud_rate = (fraud_count / total_tx * 100) if total_tx > 0 else 0
+    fraud_rate = stats.get("fraud_rate", 0.0)
 
     print(f"""
 {Fore.CYAN}{Style.BRIGHT}╔══════════════════════════════════════════════════════════════════════╗
@@ -82,9 +80,11 @@ def draw_dashboard(chain_data, stats_data, server_connected):
   │                                                      │
   │  {Fore.CYAN}Block Height     :{Style.RESET_ALL}  {Fore.WHITE}{Style.BRIGHT}{total_blocks}{Style.RESET_ALL}
   │  {Fore.CYAN}Total Transactions:{Style.RESET_ALL} {Fore.WHITE}{Style.BRIGHT}{total_tx}{Style.RESET_ALL}
-  │  {Fore.CYAN}TPS (avg)        :{Style.RESET_ALL}  {Fore.WHITE}{Style.BRIGHT}{tps:.2f}{Style.RESET_ALL} tx/sec
+  │  {Fore.CYAN}TPS (10s)        :{Style.RESET_ALL}  {Fore.WHITE}{Style.BRIGHT}{tps:.2f}{Style.RESET_ALL} tx/sec
   │  {Fore.CYAN}Mempool Pending  :{Style.RESET_ALL}  {Fore.YELLOW if mempool > 0 else Fore.GREEN}{mempool}{Style.RESET_ALL} transaction(s)
-  │  {Fore.CYAN}Difficulty       :{Style.RESET_ALL}  {Fore.WHITE}2 leading zeros{Style.RESET_ALL}
+  │  {Fore.CYAN}Throttled        :{Style.RESET_ALL}  {Fore.YELLOW if throttled > 0 else Fore.GREEN}{throttled}{Style.RESET_ALL} transaction(s) shed
+  │  {Fore.CYAN}Difficulty       :{Style.RESET_ALL}  {Fore.WHITE}{difficulty} leading zeros{Style.RESET_ALL}
+  │  {Fore.CYAN}Mining Time p50  :{Style.RESET_ALL}  {Fore.WHITE}{mining.get('p50_ms', 0.0):.1f} ms{Style.RESET_ALL} (p99 {mining.get('p99_ms', 0.0):.1f} ms)
   │  {Fore.CYAN}Hashing Algo     :{Style.RESET_ALL}  {Fore.WHITE}SHA-256{Style.RESET_ALL}
   │                                                      │
   {Fore.WHITE}{Style.BRIGHT}└──────────────────────────────────────────────────────┘{Style.RESET_ALL}
@@ -94,6 +94,7 @@ def draw_dashboard(chain_data, stats_data, server_connected):
   │  {Fore.CYAN}Fraud Alerts     :{Style.RESET_ALL}  {Fore.RED if fraud_count > 0 else Fore.GREEN}{Style.BRIGHT}{fraud_count}{Style.RESET_ALL}
   │  {Fore.CYAN}Fraud Rate       :{Style.RESET_ALL}  {Fore.RED if fraud_rate > 5 else Fore.GREEN}{fraud_rate:.2f}%{Style.RESET_ALL}
   │  {Fore.CYAN}Engine           :{Style.RESET_ALL}  {Fore.GREEN}Rule-Based + ML (RF + XGB){Style.RESET_ALL}
+  │  {Fore.CYAN}Scoring p50/p99  :{Style.RESET_ALL}  {Fore.WHITE}{scoring.get('p50_ms', 0.0):.3f} / {scoring.get('p99_ms', 0.0):.3f} ms{Style.RESET_ALL}
   │  {Fore.CYAN}Status           :{Style.RESET_ALL}  {Fore.GREEN}● Active{Style.RESET_ALL}
   │                                                      │
   {Fore.WHITE}{Style.BRIGHT}└──────────────────────────────────────────────────────┘{Style.RESET_ALL}
@@ -110,14 +111,14 @@ def draw_dashboard(chain_data, stats_data, server_connected):
   {Fore.WHITE}{Style.BRIGHT}└──────────────────────────────────────────────────────┘{Style.RESET_ALL}""")
 
     # Show recent blocks as a mini chain visualization
-    if len(chain) > 1:
+    if len(recent_blocks) > 1:
         print(f"\n{Fore.WHITE}{Style.BRIGHT}  ┌──────────────── CHAIN VISUALIZATION ─────────────────┐{Style.RESET_ALL}")
-        # Show last 5 blocks
-        recent = chain[-5:]
+        # Server keeps the last 5 blocks
+        recent = recent_blocks
         for i, block in enumerate(recent):
             bh = block.get("hash", "")[:10]
             bi = block.get("index", 0)
-            btx = len(block.get("transactions", []))
+            btx = block.get("tx_count", 0)
             if i == len(recent) - 1:
                 print(f"  │  {Fore.GREEN}{Style.BRIGHT}[Block #{bi}]{Style.RESET_ALL} {bh}... ({btx} tx)  ← {Fore.GREEN}{Style.BRIGHT}LATEST{Style.RESET_ALL}")
             else:
@@ -126,7 +127,7 @@ def draw_dashboard(chain_data, stats_data, server_connected):
                 print(f"  │      ↓")
         print(f"  {Fore.WHITE}{Style.BRIGHT}└──────────────────────────────────────────────────────┘{Style.RESET_ALL}")
 
-    print(f"\n{Fore.WHITE}{Style.DIM}  Auto-refreshing every 5 seconds... Press Ctrl+C to exit.{Style.RESET_ALL}")
+    print(f"\n{Fore.WHITE}{Style.DIM}  Live updates pushed by the server... Press Ctrl+C to exit.{Style.RESET_ALL}")
     print(f"{Fore.WHITE}{Style.DIM}  Last updated: {time.strftime('%Y-%m-%d %H:%M:%S')}{Style.RESET_ALL}")
 
 
@@ -143,26 +144,13 @@ async def dashboard_loop():
                 # Wait for welcome
                 welcome = await websocket.recv()
 
-                while True:
-                    # Request chain data
-                    await websocket.send(json.dumps({"type": "GET_CHAIN"}))
-                    chain_msg = await websocket.recv()
-                    chain_data = json.loads(chain_msg)
-
-                    # Request stats
-                    await websocket.send(json.dumps({"type": "GET_STATS"}))
-                    stats_msg = await websocket.recv()
-                    stats_data = json.loads(stats_msg)
-
-                    # Handle any broadcast messages that arrive between requests
-                    if stats_data.get("type") != "STATS_DATA":
-                        # Got a broadcast instead, try again
-                        await websocket.send(json.dumps({"type": "GET_STATS"}))
-                        stats_msg = await websocket.recv()
-                        stats_data = json.loads(stats_msg)
-
-                    draw_dashboard(chain_data, stats_data, True)
-                    await asyncio.sleep(5)
+                # Stats are pushed by the server; no transaction or block stream needed
+                await websocket.send(json.dumps({"type": "SUBSCRIBE", "events": ["stats"]}))
+
+                async for message in websocket:
+                    data = json.loads(message)
+                    if data.get("type") == "STATS_UPDATE":
+                        draw_dashboard(data.get("stats", {}), True)
 
         except ConnectionRefusedError:
             retry_count += 1
@@ -3,72 +3,113 @@ Create Account Threat Database
 Extracts unique accounts and assigns threat levels and failed transaction counts
 """
 
+import argparse
+import os
+import sys
 import pandas as pd
 import numpy as np
 
-print("Creating Account Threat Database...")
-
-# Load transaction data
-df = pd.read_csv('output_1_to_10.csv')
-
-print(f"Loaded {len(df)} transactions")
-
-# Extract unique accounts from both sender and receiver
-senders = df['nameOrig'].unique()
-receivers = df['nameDest'].unique()
-all_accounts = list(set(list(senders) + list(receivers)))
-
-print(f"Found {len(all_accounts)} unique accounts")
-
-# Create account threat database
-account_data = []
-
-for account in all_accounts:
-    # Generate random threat level (0-100, higher = more suspicious)
-    # Most accounts should have low threat (skewed distribution)
-    threat_level = np.random.choice(
-        [np.random.randint(0, 30),     # 70% chance: low threat (0-30)
-         np.random.randint(30, 60),    # 20% chance: medium threat (30-60)
-         np.random.randint(60, 100)],  # 10% chance: high threat (60-100)
-        p=[0.7, 0.2, 0.1]
-    )
-    
-    # Generate random failed transaction count (0-50)
-    # Most accounts should have few failures
-    failed_transactions = np.random.choice(
-        [np.random.randint(0, 5),      # 80% chance: 0-5 failures
-         np.random.randint(5, 15),     # 15% chance: 5-15 failures
-         np.random.randint(15, 50)],   # 5% chance: 15-50 failures
-        p=[0.8, 0.15, 0.05]
-    )
-    
-    account_data.append({
-        'account_id': account,
-        'threat_level': threat_level,
-        'failed_transactions': failed_transactions
-    })
-
-# Create DataFrame
-account_df = pd.DataFrame(account_data)
-
-# Save to CSV
-account_df.to_csv('account_threats.csv', index=False)
-
-print(f"\n✓ Created account_threats.csv with {len(account_df)} accounts")
-print(f"\nThreat Level Statistics:")
-print(f"  Mean: {account_df['threat_level'].mean():.2f}")
-print(f"  Median: {account_df['threat_level'].median():.2f}")
-print(f"  Min: {account_df['threat_level'].min()}")
-print(f"  Max: {account_df['threat_level'].max()}")
-
-print(f"\nFailed Transactions Statistics:")
-print(f"  Mean: {account_df['failed_transactions'].mean():.2f}")
-print(f"  Median: {account_df['failed_transactions'].median():.2f}")
-print(f"  Min: {account_df['failed_transactions'].min()}")
-print(f"  Max: {account_df['failed_transactions'].max()}")
-
-# Show sample
-print(f"\nSample accounts:")
-print(account_df.head(10))
-
-print("\n✓ Account threat database created successfully!")
+DATA_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(DATA_DIR))
+from dataset import open_cache
+
+SEED = 42
+CHUNK_SIZE = 1_000_000  # Accounts generated and written per chunk
+
+# Threat level (0-100, higher = more suspicious); most accounts should have low threat
+# (probability, low, high): 70% low 0-30, 20% medium 30-60, 10% high 60-100
+THREAT_BANDS = [(0.7, 0, 30), (0.2, 30, 60), (0.1, 60, 100)]
+# Failed transaction count (0-50); most accounts should have few failures
+# 80% 0-5 failures, 15% 5-15 failures, 5% 15-50 failures
+FAILURE_BANDS = [(0.8, 0, 5), (0.15, 5, 15), (0.05, 15, 50)]
+
+
+def draw_banded(rng, bands, n):
+    """Picks a band per account, then a uniform integer inside it, for n accounts at once."""
+    probs, lows, highs = (np.array(column) for column in zip(*bands))
+    band = rng.choice(len(bands), size=n, p=probs)
+    return rng.integers(lows[band], highs[band]).astype(np.int16)
+
+
+def iter_accounts(accounts_file, chunk_size):
+    """Yields account-id arrays: from a one-per-line file, or the transaction cache's name dictionary."""
+    if accounts_file:
+        for chunk in pd.read_csv(accounts_file, header=None, names=['account_id'], dtype=str, chunksize=chunk_size):
+            yield chunk['account_id'].to_numpy()
+        return
+
+    # Unique accounts from both sender and receiver: the cache's shared name dictionary
+    cache = open_cache(os.path.join(DATA_DIR, 'output_1_to_10.csv'))
+    print(f"Loaded {cache.rows} transactions")
+    names = cache.names  # Memory-mapped
+    for start in range(0, len(names), chunk_size):
+        yield names[start:start + chunk_size]
+
+
+def histogram_median(counts):
+    """Median of integer samples given their bincount (averages the middle pair, like pandas)."""
+    cumulative = np.cumsum(counts)
+    n = cumulative[-1]
+    lower = np.searchsorted(cumulative, (n - 1) // 2, side='right')
+    upper = np.searchsorted(cumulative, n // 2, side='right')
+    return (lower + upper) / 2
+
+
+def print_stats(title, counts):
+    values = np.nonzero(counts)[0]
+    print(f"\n{title} Statistics:")
+    print(f"  Mean: {(counts * np.arange(len(counts))).sum() / counts.sum():.2f}")
+    print(f"  Median: {histogram_median(counts):.2f}")
+    print(f"  Min: {values.min()}")
+    print(f"  Max: {values.max()}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Create the account threat database")
+    parser.add_argument("--accounts", help="Read account ids (one per line) from this file instead of the transactions")
+    parser.add_argument("--output", default=os.path.join(DATA_DIR, 'account_threats.csv'))
+    parser.add_argument("--seed", type=int, default=SEED)
+    parser.add_argument("--chunk-size", type=int, default=CHUNK_SIZE)
+    args = parser.parse_args()
+
+    print("Creating Account Threat Database...")
+    rng = np.random.default_rng(args.seed)
+
+    # Summary statistics are kept as histograms, so nothing but one chunk is held in memory
+    threat_counts = np.zeros(THREAT_BANDS[-1][2], dtype=np.int64)
+    failure_counts = np.zeros(FAILURE_BANDS[-1][2], dtype=np.int64)
+    total = 0
+    sample = None
+
+    for i, accounts in enumerate(iter_accounts(args.accounts, args.chunk_size)):
+        chunk_df = pd.DataFrame({
+            'account_id': accounts,
+            'threat_level': draw_banded(rng, THREAT_BANDS, len(accounts)),
+            'failed_transactions': draw_banded(rng, FAILURE_BANDS, len(accounts)),
+        })
+        chunk_df.to_csv(args.output, index=False, mode='w' if i == 0 else 'a', header=(i == 0))
+
+        threat_counts += np.bincount(chunk_df['threat_level'], minlength=len(threat_counts))
+        failure_counts += np.bincount(chunk_df['failed_transactions'], minlength=len(failure_counts))
+        total += len(chunk_df)
+        if sample is None:
+            sample = chunk_df.head(10)
+
+    print(f"Found {total} unique accounts")
+    if not total:
+        print("No accounts found - nothing written")
+        return
+
+    print(f"\n✓ Created {os.path.basename(args.output)} with {total} accounts")
+    print_stats("Threat Level", threat_counts)
+    print_stats("Failed Transactions", failure_counts)
+
+    # Show sample
+    print(f"\nSample accounts:")
+    print(sample)
+
+    print("\n✓ Account threat database created successfully!")
+
+
+if __name__ == "__main__":
+    main()
@@ -3,12 +3,20 @@ Data Preprocessing Module for Transaction Fraud Detection
 Handles data loading, cleaning, feature engineering, and normalization
 """
 
+import os
+import sys
 import pandas as pd
 import numpy as np
 from sklearn.preprocessing import StandardScaler, LabelEncoder
 from sklearn.model_selection import train_test_split
 import pickle
 
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from features import ENGINEERED_FEATURES, TX_TYPES, FeaturePipeline
+
+# engineer_features column names for the shared feature spec entries
+COLUMN_NAMES = {'type': 'type_encoded'}
+
 
 class TransactionPreprocessor:
     """
@@ -26,6 +34,7 @@ class TransactionPreprocessor:
         self.scaler = StandardScaler()
         self.label_encoder = LabelEncoder()
         self.feature_names = None
+        self.pipeline = FeaturePipeline(ENGINEERED_FEATURES)
         
     def load_data(self, filepath):
         """
@@ -63,33 +72,16 @@ class TransactionPreprocessor:
             DataFrame with engineered features
         """
         print("Engineering features...")
-        
-        features_df = pd.DataFrame()
-        
-        # Basic features
-        features_df['amount'] = df['amount']
-        
-        # Balance changes (indicate unusual behavior)
-        features_df['balance_change_orig'] = df['newbalanceOrig'] - df['oldbalanceOrg']
-        features_df['balance_change_dest'] = df['newbalanceDest'] - df['oldbalanceDest']
-        
-        # Transaction type encoding (some types are riskier)
-        features_df['type_encoded'] = self.label_encoder.fit_transform(df['type'])
-        
-        # Binary flags for risky transaction types
-        features_df['is_transfer'] = (df['type'] == 'TRANSFER').astype(int)
-        features_df['is_cash_out'] = (df['type'] == 'CASH_OUT').astype(int)
-        
-        # Balance ratio (large transactions relative to account balance are suspicious)
-        features_df['balance_ratio'] = df['amount'] / (df['oldbalanceOrg'] + 1)  # +1 to avoid division by zero
-        
-        # Time step (fraud patterns may vary over time)
-        features_df['time_step'] = df['step']
-        
-        # Error flags (when balance doesn't match transaction)
-        features_df['error_balanceOrig'] = ((df['oldbalanceOrg'] - df['amount']) != df['newbalanceOrig']).astype(int)
-        features_df['error_balanceDest'] = ((df['oldbalanceDest'] + df['amount']) != df['newbalanceDest']).astype(int)
-        
+
+        # All features come from the shared spec in features.py, the same
+        # one the fraud engine uses at serving time
+        self.label_encoder.fit(TX_TYPES)
+        features_df = pd.DataFrame(
+            self.pipeline.transform_frame(df),
+            columns=[COLUMN_NAMES.get(name, name) for name in self.pipeline.names],
+            index=df.index,
+        )
+
         # Target variable
         features_df['isFraud'] = df['isFraud']
         
@@ -173,25 +165,14 @@ class TransactionPreprocessor:
         Preprocess a single transaction for real-time prediction
         
         Args:
-            transaction_data: Dict with transaction features
+            transaction_data: Server transaction dict (type, amount,
+                sender_balance, receiver_balance, optional step)
             
         Returns:
             Normalized feature array ready for model
         """
-        # Create feature vector (same order as training)
-        features = []
-        
-        # This should match the feature engineering logic
-        # For simplicity in demo, we'll use a basic version
-        # In production, this should exactly match engineer_features
-        
-        required_features = [
-            'amount', 'balance_change_orig', 'balance_change_dest',
-            'type_encoded', 'is_transfer', 'is_cash_out',
-            'balance_ratio', 'time_step', 'error_balanceOrig', 'error_balanceDest'
-        ]
-        
-        feature_vector = np.array([[transaction_data.get(f, 0) for f in required_features]])
+        # Same feature spec as engineer_features, so no training/serving skew
+        feature_vector = self.pipeline.transform_row(transaction_data)
         normalized = self.scaler.transform(feature_vector)
         
         return normalized
@@ -0,0 +1,225 @@
+"""
+Columnar cache for PaySim-style transaction CSVs.
+
+The first load parses the CSV once (in chunks) and writes every column as a
+raw binary array next to it, under .cache/<sha256 of the CSV>/:
+
+    meta.json          row count, column dtypes, dictionaries
+    <column>.bin       one fixed-width array per column
+    names.npy          shared account-name dictionary (nameOrig / nameDest codes)
+
+Later loads memory-map those arrays instead of re-parsing text. Transaction
+types and account names are dictionary-encoded, so they come back as pandas
+Categoricals instead of millions of Python strings. Decoding the name columns
+still has to hash the whole name dictionary once, so only ask for them when
+needed (`cache.names` alone is every distinct account).
+
+    from dataset import load_transactions
+    df = load_transactions("data/output_1_to_10.csv", columns=["type", "amount", "isFraud"])
+"""
+
+import errno
+import hashlib
+import json
+import os
+import shutil
+import time
+from typing import Any, Dict, Iterator, List, Optional
+
+import numpy as np
+import pandas as pd
+
+DATA_PATH = "data/output_1_to_10.csv"
+CACHE_DIRNAME = ".cache"
+CACHE_VERSION = 1
+CHUNK_SIZE = 500_000  # CSV rows parsed per chunk while building the cache
+
+# Column -> storage: a NumPy dtype, "category" (small per-column dictionary)
+# or "name" (int32 codes into the shared account-name dictionary)
+PAYSIM_SCHEMA = {
+    "step": "int32",
+    "type": "category",
+    "amount": "float64",
+    "nameOrig": "name",
+    "oldbalanceOrg": "float64",
+    "newbalanceOrig": "float64",
+    "nameDest": "name",
+    "oldbalanceDest": "float64",
+    "newbalanceDest": "float64",
+    "isFraud": "int8",
+    "isFlaggedFraud": "int8",
+}
+CATEGORY_CODE_DTYPE = "int8"
+NAME_CODE_DTYPE = "int32"
+
+
+def file_sha256(path: str, block_size: int = 1 << 20) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(block_size), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def source_hash(csv_path: str) -> str:
+    """
+    SHA-256 of the CSV. Remembered in .cache/hashes.json against the file's
+    size and mtime, so an unchanged file is not re-read just to be hashed.
+    """
+    cache_root = os.path.join(os.path.dirname(os.path.abspath(csv_path)), CACHE_DIRNAME)
+    memo_path = os.path.join(cache_root, "hashes.json")
+    stat = os.stat(csv_path)
+    key = os.path.basename(csv_path)
+
+    memo = {}
+    if os.path.exists(memo_path):
+        with open(memo_path) as f:
+            memo = json.load(f)
+    entry = memo.get(key)
+    if entry and entry["size"] == stat.st_size and entry["mtime_ns"] == stat.st_mtime_ns:
+        return entry["sha256"]
+
+    digest = file_sha256(csv_path)
+    memo[key] = {"size": stat.st_size, "mtime_ns": stat.st_mtime_ns, "sha256": digest}
+    os.makedirs(cache_root, exist_ok=True)
+    with open(memo_path, "w") as f:
+        json.dump(memo, f, indent=2)
+    return digest
+
+
+def cache_path(csv_path: str) -> str:
+    cache_root = os.path.join(os.path.dirname(os.path.abspath(csv_path)), CACHE_DIRNAME)
+    return os.path.join(cache_root, source_hash(csv_path)[:16])
+
+
+def _encode(values: np.ndarray, index: Dict[Any, int]) -> np.ndarray:
+    """Dictionary-encodes values, growing `index` with values not seen before."""
+    for value in pd.unique(values):
+        if value not in index:
+            index[value] = len(index)
+    return pd.Series(values).map(index).to_numpy()
+
+
+def build_cache(csv_path: str, target: str, chunksize: int = CHUNK_SIZE):
+    """Parses the CSV chunk by chunk into columnar files under `target`."""
+    print(f"🗄️  Building columnar cache for {csv_path} (one-time)...")
+    started = time.perf_counter()
+    building = target + ".tmp"
+    shutil.rmtree(building, ignore_errors=True)
+    os.makedirs(building)
+
+    columns = list(PAYSIM_SCHEMA)
+    read_dtypes = {c: (s if s not in ("category", "name") else "object") for c, s in PAYSIM_SCHEMA.items()}
+    files = {c: open(os.path.join(building, f"{c}.bin"), "wb") for c in columns}
+    categories: Dict[str, Dict[Any, int]] = {c: {} for c, s in PAYSIM_SCHEMA.items() if s == "category"}
+    names: Dict[Any, int] = {}
+    rows = 0
+    try:
+        for chunk in pd.read_csv(csv_path, usecols=columns, dtype=read_dtypes, chunksize=chunksize):
+            for column, storage in PAYSIM_SCHEMA.items():
+                values = chunk[column].to_numpy()
+                if storage == "category":
+                    values = _encode(values, categories[column]).astype(CATEGORY_CODE_DTYPE)
+                elif storage == "name":
+                    values = _encode(values, names).astype(NAME_CODE_DTYPE)
+                np.ascontiguousarray(values).tofile(files[column])
+            rows += len(chunk)
+    finally:
+        for f in files.values():
+            f.close()
+
+    np.save(os.path.join(building, "names.npy"), np.array(list(names), dtype=str))
+    meta = {
+        "version": CACHE_VERSION,
+        "source": os.path.basename(csv_path),
+        "rows": rows,
+        "schema": PAYSIM_SCHEMA,
+        "categories": {c: list(index) for c, index in categories.items()},
+    }
+    with open(os.path.join(building, "meta.json"), "w") as f:
+        json.dump(meta, f, indent=2)
+
+    shutil.rmtree(target, ignore_errors=True)
+    os.replace(building, target)
+    print(f"✅ Cached {rows:,} rows in {time.perf_counter() - started:.1f}s -> {target}")
+
+
+def _read_meta(target: str) -> Optional[Dict[str, Any]]:
+    meta_path = os.path.join(target, "meta.json")
+    if not os.path.exists(meta_path):
+        return None
+    with open(meta_path) as f:
+        meta = json.load(f)
+    return meta if meta.get("version") == CACHE_VERSION else None
+
+
+class TransactionCache:
+    """Memory-mapped view of one cached CSV."""
+
+    def __init__(self, target: str, meta: Dict[str, Any]):
+        self.path = target
+        self.rows = meta["rows"]
+        self.schema = meta["schema"]
+        self.categories = meta["categories"]
+        self._names = None
+        self._name_dtype = None
+
+    def codes(self, column: str) -> np.ndarray:
+        """Raw column array (dictionary codes for category/name columns), memory-mapped."""
+        storage = self.schema[column]
+        dtype = {"category": CATEGORY_CODE_DTYPE, "name": NAME_CODE_DTYPE}.get(storage, storage)
+        if not self.rows:
+            return np.empty(0, dtype=dtype)
+        return np.memmap(os.path.join(self.path, f"{column}.bin"), dtype=dtype, mode="r", shape=(self.rows,))
+
+    @property
+    def names(self) -> np.ndarray:
+        """Shared account-name dictionary, indexed by nameOrig / nameDest codes."""
+        if self._names is None:
+            self._names = np.load(os.path.join(self.path, "names.npy"), mmap_mode="r")
+        return self._names
+
+    @property
+    def name_dtype(self) -> pd.CategoricalDtype:
+        """Categorical dtype over the name dictionary, built once (hashing it is the slow part)."""
+        if self._name_dtype is None:
+            self._name_dtype = pd.CategoricalDtype(pd.Index(self.names.astype(object)))
+        return self._name_dtype
+
+    def column(self, column: str, start: int = 0, stop: Optional[int] = None):
+        values = self.codes(column)[start:stop]
+        storage = self.schema[column]
+        if storage == "category":
+            return pd.Categorical.from_codes(values, self.categories[column])
+        if storage == "name":
+            return pd.Categorical.from_codes(values, dtype=self.name_dtype)
+        return values
+
+    def to_frame(self, columns: Optional[List[str]] = None, start: int = 0, stop: Optional[int] = None) -> pd.DataFrame:
+        columns = columns or list(self.schema)
+        return pd.DataFrame({c: self.column(c, start, stop) for c in columns})
+
+
+def open_cache(csv_path: str = DATA_PATH, chunksize: int = CHUNK_SIZE) -> TransactionCache:
+    """Returns the cache for `csv_path`, building it first if the CSV is new or changed."""
+    if not os.path.exists(csv_path):
+        raise FileNotFoundError(errno.ENOENT, os.strerror(errno.ENOENT), csv_path)
+    target = cache_path(csv_path)
+    meta = _read_meta(target)
+    if meta is None:
+        build_cache(csv_path, target, chunksize)
+        meta = _read_meta(target)
+    return TransactionCache(target, meta)
+
+
+def load_transactions(csv_path: str = DATA_PATH, columns: Optional[List[str]] = None) -> pd.DataFrame:
+    """Loads the CSV as a DataFrame through the columnar cache."""
+    return open_cache(csv_path).to_frame(columns)
+
+
+def iter_transactions(csv_path: str = DATA_PATH, columns: Optional[List[str]] = None,
+                      chunksize: int = CHUNK_SIZE) -> Iterator[pd.DataFrame]:
+    """Yields the cached CSV in row slices of `chunksize`, for files larger than memory."""
+    cache = open_cache(csv_path, chunksize)
+    for start in range(0, cache.rows, chunksize):
+        yield cache.to_frame(columns, start, start + chunksize)
@@ -0,0 +1,154 @@
+"""
+Distills the RF/XGB teacher into a compact student for the serving path.
+
+The student is fitted to the teacher's fraud probabilities (as logits), not
+to the labels, then exported to models/student_model.bin. The report shows
+how closely it agrees with the teacher and what it costs per row.
+
+    python train_model.py --distill trees --teacher rf
+    python server.py --student
+"""
+
+import os
+import time
+from typing import Dict, List
+
+import numpy as np
+import pandas as pd
+from sklearn.ensemble import GradientBoostingRegressor
+from sklearn.linear_model import Ridge
+from sklearn.metrics import average_precision_score
+
+import train_model
+from features import ENGINEERED_FEATURES, MODEL_FEATURES, TX_TYPES, UNKNOWN_TYPE, FeaturePipeline, type_codes
+from model_format import export_model, load_model
+from student import LinearStudent, TreeStudent
+
+STUDENT_MODEL_PATH = train_model.model_path("student")
+
+# Student sizes: few, shallow trees keep per-row cost to a few array operations
+STUDENT_TREES = 40
+STUDENT_DEPTH = 3
+STUDENT_LEARNING_RATE = 0.2
+# The server has no time step for live transactions, so the linear student must not use it
+LINEAR_FEATURES = [name for name in ENGINEERED_FEATURES if name != 'time_step']
+# Raw columns -> the server transaction fields FeaturePipeline._raw_values reads
+SERVING_FIELDS = {'type': 'type', 'amount': 'amount', 'oldbalanceOrg': 'sender_balance',
+                  'oldbalanceDest': 'receiver_balance'}
+PROB_CLIP = 1e-4           # Teacher probabilities are clipped before taking logits
+LATENCY_ROWS = 500
+
+
+def _logit(p: np.ndarray) -> np.ndarray:
+    p = np.clip(p, PROB_CLIP, 1 - PROB_CLIP)
+    return np.log(p / (1 - p))
+
+
+def load_sample(data_path: str, negative_rate: float, seed: int):
+    """Sampled raw rows (all fraud, `negative_rate` of the rest) as (train_frame, test_frame)."""
+    rng = np.random.default_rng(seed)
+    train_parts, test_parts = [], []
+    for chunk in train_model.read_transactions(data_path, chunksize=train_model.CHUNK_SIZE):
+        fraud = chunk[train_model.TARGET].to_numpy() == 1
+        keep = fraud | (rng.random(len(fraud)) < negative_rate)
+        chunk = chunk[keep & (type_codes(chunk['type']) != UNKNOWN_TYPE)]
+        test = rng.random(len(chunk)) < 0.2
+        train_parts.append(chunk[~test])
+        test_parts.append(chunk[test])
+    return pd.concat(train_parts, ignore_index=True), pd.concat(test_parts, ignore_index=True)
+
+
+def serving_features(pipeline: FeaturePipeline, frame: pd.DataFrame) -> np.ndarray:
+    """
+    Feature rows as the server computes them for live transactions: every row
+    goes through FeaturePipeline._raw_values, which derives the post-transaction
+    balances from the amount. The balance_change and error_balance features
+    therefore take the values the student will see when serving, not the
+    ones recorded in the data.
+    """
+    tx_list = frame[list(SERVING_FIELDS)].rename(columns=SERVING_FIELDS).astype({'type': str}).to_dict('records')
+    return pipeline.transform_batch(tx_list).copy()
+
+
+def fit_student(kind: str, X: np.ndarray, target_logit: np.ndarray, feature_names: List[str], seed: int):
+    if kind == "trees":
+        model = GradientBoostingRegressor(n_estimators=STUDENT_TREES, max_depth=STUDENT_DEPTH,
+                                          learning_rate=STUDENT_LEARNING_RATE, random_state=seed)
+        model.fit(X, target_logit)
+        return TreeStudent.from_sklearn(model, feature_names)
+
+    # Linear: standardize for the fit, then fold the scaling into the weights
+    X = X.astype(np.float64)
+    mean, scale = X.mean(axis=0), X.std(axis=0)
+    scale[scale == 0] = 1.0
+    ridge = Ridge(alpha=1.0).fit((X - mean) / scale, target_logit)
+    coef = ridge.coef_ / scale
+    return LinearStudent(feature_names, coef, ridge.intercept_ - (coef * mean).sum())
+
+
+def per_row_latency_us(model, X: np.ndarray) -> Dict[str, float]:
+    rows = X[:LATENCY_ROWS]
+    started = time.perf_counter()
+    for i in range(len(rows)):
+        model.predict_proba(rows[i:i + 1])
+    row_us = (time.perf_counter() - started) / len(rows) * 1e6
+    started = time.perf_counter()
+    model.predict_proba(X)
+    batch_us = (time.perf_counter() - started) / len(X) * 1e6
+    return {"row_us": row_us, "batch_us": batch_us}
+
+
+def distill(data_path: str = train_model.DATA_PATH, kind: str = "trees", teacher_name: str = "rf",
+            negative_rate: float = 0.05, seed: int = 42, output: str = STUDENT_MODEL_PATH):
+    print(f"🎓 Distilling {teacher_name.upper()} teacher into a {kind} student...")
+    teacher_path = train_model.model_path(teacher_name)
+    if not os.path.exists(teacher_path):
+        print(f"❌ Error: teacher model not found at {teacher_path} (run python train_model.py first)")
+        return
+    if not os.path.exists(data_path):
+        print(f"❌ Error: Data file not found at {data_path}")
+        return
+    teacher = load_model(teacher_path)
+
+    train_df, test_df = load_sample(data_path, negative_rate, seed)
+    print(f"📊 {len(train_df):,} training rows, {len(test_df):,} hold-out rows")
+
+    teacher_features = FeaturePipeline(MODEL_FEATURES)
+    student_names = MODEL_FEATURES if kind == "trees" else LINEAR_FEATURES
+    student_features = FeaturePipeline(student_names)
+    # The linear student's engineered features differ between the data and serving: fit on what it will be served
+    student_inputs = (student_features.transform_frame if kind == "trees"
+                      else lambda frame: serving_features(student_features, frame))
+
+    # Soft targets: what the teacher thinks, not the labels
+    teacher_train = teacher.predict_proba(teacher_features.transform_frame(train_df))[:, 1]
+    started = time.perf_counter()
+    student = fit_student(kind, student_inputs(train_df), _logit(teacher_train), student_names, seed)
+    print(f"✅ Student fitted in {time.perf_counter() - started:.1f}s")
+
+    # Agreement on the hold-out set
+    X_teacher = teacher_features.transform_frame(test_df)
+    X_student = student_inputs(test_df)
+    p_teacher = teacher.predict_proba(X_teacher)[:, 1]
+    p_student = student.predict_proba(X_student)[:, 1]
+    y = test_df[train_model.TARGET].to_numpy()
+
+    # Risk level the ML score alone would put the transaction in (engine thresholds 20 / 60)
+    levels = lambda p: np.digitize(p * 100, [20, 60])
+    teacher_latency = per_row_latency_us(teacher, X_teacher)
+    student_latency = per_row_latency_us(student, X_student)
+
+    print(f"\n📋 Student vs teacher on {len(y):,} hold-out rows")
+    print(f"   Mean |Δ probability|   : {np.abs(p_teacher - p_student).mean():.4f}")
+    print(f"   Label agreement @0.5   : {((p_teacher >= 0.5) == (p_student >= 0.5)).mean() * 100:.2f}%")
+    print(f"   Risk level agreement   : {(levels(p_teacher) == levels(p_student)).mean() * 100:.2f}%")
+    print(f"   PR-AUC (true labels)   : teacher {average_precision_score(y, p_teacher):.4f}  "
+          f"student {average_precision_score(y, p_student):.4f}")
+    print(f"   Single-row latency     : teacher {teacher_latency['row_us']:9.1f} µs  "
+          f"student {student_latency['row_us']:7.1f} µs")
+    print(f"   Batched latency / row  : teacher {teacher_latency['batch_us']:9.2f} µs  "
+          f"student {student_latency['batch_us']:7.2f} µs")
+
+    export_model(student, output, type_classes=TX_TYPES)
+    print(f"\n💾 Student saved to {output} (serve it with: python server.py --student)")
+    return student
@@ -0,0 +1,154 @@
+"""
+Feature spec shared by training and serving.
+
+Every model feature is declared once, as a Python expression over the raw
+PaySim columns that is valid both for NumPy arrays and for plain floats.
+FeaturePipeline compiles a list of features two ways:
+
+- transform_frame(df): evaluated over whole columns of a training DataFrame
+- transform_row(tx) / transform_batch(txs): one generated function that
+  computes a whole feature row from scalars and writes it into a
+  preallocated output buffer, so scoring builds no per-request arrays
+
+so training and serving cannot drift apart.
+"""
+
+from dataclasses import dataclass
+from typing import Any, Dict, List
+
+import numpy as np
+import pandas as pd
+
+# PaySim transaction types; sorted, so codes match a LabelEncoder fitted on them
+TX_TYPES = ['CASH_IN', 'CASH_OUT', 'DEBIT', 'PAYMENT', 'TRANSFER']
+TX_TYPE_CODES = {tx_type: code for code, tx_type in enumerate(TX_TYPES)}
+UNKNOWN_TYPE = -1
+_ABSENT_TYPE = -2  # Value of a type constant missing from a type table: no row has it
+
+# Raw inputs a feature expression may use (plus the TX_TYPES names as constants)
+RAW_COLUMNS = ('type', 'amount', 'oldbalanceOrg', 'newbalanceOrig', 'oldbalanceDest', 'newbalanceDest', 'step')
+
+FEATURE_DTYPE = np.float32  # What the tree models use internally anyway
+
+
+@dataclass(frozen=True)
+class Feature:
+    name: str
+    expr: str
+
+    @property
+    def inputs(self) -> List[str]:
+        names = compile(self.expr, self.name, 'eval').co_names
+        return [column for column in RAW_COLUMNS if column in names]
+
+
+FEATURES: Dict[str, Feature] = {f.name: f for f in [
+    Feature('type', 'type'),
+    Feature('amount', 'amount'),
+    Feature('oldbalanceOrg', 'oldbalanceOrg'),
+    Feature('newbalanceOrig', 'newbalanceOrig'),
+    Feature('oldbalanceDest', 'oldbalanceDest'),
+    Feature('newbalanceDest', 'newbalanceDest'),
+    # Balance changes (indicate unusual behavior)
+    Feature('balance_change_orig', 'newbalanceOrig - oldbalanceOrg'),
+    Feature('balance_change_dest', 'newbalanceDest - oldbalanceDest'),
+    # Binary flags for risky transaction types
+    Feature('is_transfer', 'type == TRANSFER'),
+    Feature('is_cash_out', 'type == CASH_OUT'),
+    # Large transactions relative to account balance are suspicious (+1 avoids division by zero)
+    Feature('balance_ratio', 'amount / (oldbalanceOrg + 1)'),
+    Feature('time_step', 'step'),
+    # Error flags (when balance doesn't match transaction)
+    Feature('error_balanceOrig', '(oldbalanceOrg - amount) != newbalanceOrig'),
+    Feature('error_balanceDest', '(oldbalanceDest + amount) != newbalanceDest'),
+]}
+
+# Feature sets, in model column order
+MODEL_FEATURES = ['type', 'amount', 'oldbalanceOrg', 'newbalanceOrig', 'oldbalanceDest', 'newbalanceDest']
+ENGINEERED_FEATURES = [
+    'amount', 'balance_change_orig', 'balance_change_dest', 'type', 'is_transfer', 'is_cash_out',
+    'balance_ratio', 'time_step', 'error_balanceOrig', 'error_balanceDest',
+]
+
+
+def type_codes(types: pd.Series, type_table: Dict[str, int] = TX_TYPE_CODES) -> np.ndarray:
+    """Codes from `type_table` for a column of types (categorical or strings); unknown types are UNKNOWN_TYPE."""
+    if isinstance(types.dtype, pd.CategoricalDtype):
+        # One lookup per category; the extra last entry catches missing values (code -1)
+        lookup = np.array([type_table.get(c, UNKNOWN_TYPE) for c in types.cat.categories] + [UNKNOWN_TYPE],
+                          dtype=np.int8)
+        return lookup[types.cat.codes.to_numpy()]
+    return types.map(type_table).fillna(UNKNOWN_TYPE).to_numpy(np.int8)
+
+
+class FeaturePipeline:
+    """
+    Compiles a list of feature names into one transform. Serving output
+    buffers are kept between calls (the batch buffer grows only when a batch
+    is larger than any before), so the array returned by transform_row and
+    transform_batch is overwritten by the next call.
+    """
+
+    def __init__(self, names: List[str] = MODEL_FEATURES, type_table: Dict[str, int] = TX_TYPE_CODES):
+        self.names = list(names)
+        self.features = [FEATURES[name] for name in self.names]
+        self.inputs = [c for c in RAW_COLUMNS if any(c in f.inputs for f in self.features)]
+        self.type_table = type_table  # Type name -> code; anything else is UNKNOWN_TYPE
+
+        # Type names in expressions (type == TRANSFER) resolve through the same table as the type column
+        type_constants = {tx_type: type_table.get(tx_type, _ABSENT_TYPE) for tx_type in TX_TYPES}
+        self._constants = {"__builtins__": {}, **type_constants}
+        self._frame_exprs = [compile(f.expr, f.name, 'eval') for f in self.features]
+        source = (f"def row({', '.join(RAW_COLUMNS)}):\n"
+                  f"    return ({', '.join(f.expr for f in self.features)},)\n")
+        namespace = dict(self._constants)
+        exec(compile(source, "<features>", "exec"), namespace)
+        self._row_fn = namespace["row"]
+
+        self._row_out = np.zeros((1, len(self.features)), dtype=FEATURE_DTYPE)
+        self._batch_out = np.zeros((64, len(self.features)), dtype=FEATURE_DTYPE)
+
+    def transform_frame(self, df: pd.DataFrame) -> np.ndarray:
+        """Vectorized transform of a training DataFrame holding the raw PaySim columns."""
+        columns = dict(self._constants)
+        for column in self.inputs:
+            columns[column] = (type_codes(df['type'], self.type_table) if column == 'type'
+                               else df[column].to_numpy(np.float64))
+        out = np.empty((len(df), len(self.features)), dtype=FEATURE_DTYPE)
+        for i, expr in enumerate(self._frame_exprs):
+            np.copyto(out[:, i], eval(expr, columns), casting='unsafe')
+        return out
+
+    def transform_row(self, tx: Dict[str, Any]) -> np.ndarray:
+        """1 x n_features matrix for a single server transaction dict."""
+        self._row_out[0] = self._row_fn(*self._raw_values(tx))
+        return self._row_out
+
+    def transform_batch(self, tx_list: List[Dict[str, Any]]) -> np.ndarray:
+        """n x n_features matrix for server transaction dicts."""
+        n = len(tx_list)
+        if n > len(self._batch_out):
+            self._batch_out = np.zeros((max(n, 2 * len(self._batch_out)), len(self.features)), dtype=FEATURE_DTYPE)
+        out, row_fn, raw_values = self._batch_out, self._row_fn, self._raw_values
+        for i, tx in enumerate(tx_list):
+            out[i] = row_fn(*raw_values(tx))
+        return out[:n]
+
+    def _raw_values(self, tx: Dict[str, Any]) -> tuple:
+        """
+        Maps one server transaction dict onto RAW_COLUMNS. Serving transactions
+        carry the pre-transaction balances; the post-transaction balances are
+        what this transfer would leave.
+        """
+        amount = float(tx.get("amount", 0.0))
+        old_org = float(tx.get("sender_balance", 0.0))
+        old_dest = float(tx.get("receiver_balance", 0.0))
+        return (
+            self.type_table.get(tx.get("type", "PAYMENT"), UNKNOWN_TYPE),
+            amount,
+            old_org,
+            old_org - amount,
+            old_dest,
+            old_dest + amount,
+            float(tx.get("step", 0)),
+        )
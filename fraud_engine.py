@@ -1,25 +1,31 @@
 
 import os
-import pickle
+import glob
+from contextlib import nullcontext
 import numpy as np
+import pandas as pd
 import logging
-from typing import Dict, Any, List, Optional
+from typing import Dict, Any, List, Optional, Tuple
 from dataclasses import dataclass
 
+from features import MODEL_FEATURES, TX_TYPE_CODES, FeaturePipeline
+from model_format import load_model
+
 # Setup logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
 logger = logging.getLogger("FraudEngine")
 
-# Constants
+# Constants (binary model files, memory-mapped - see model_format.py)
 MODEL_DIR = "models"
-RF_MODEL_PATH = os.path.join(MODEL_DIR, "rf_model.pkl")
-XGB_MODEL_PATH = os.path.join(MODEL_DIR, "xgb_model.pkl")
-LABEL_ENCODER_PATH = os.path.join(MODEL_DIR, "label_encoder_type.pkl")
+RF_MODEL_PATH = os.path.join(MODEL_DIR, "rf_model.bin")
+XGB_MODEL_PATH = os.path.join(MODEL_DIR, "xgb_model.bin")
+STUDENT_MODEL_PATH = os.path.join(MODEL_DIR, "student_model.bin")  # see distill.py
 
 # Risk Levels
 RISK_LOW = "LOW"
 RISK_MEDIUM = "MEDIUM"
 RISK_HIGH = "HIGH"
+RISK_LEVELS = [RISK_LOW, RISK_MEDIUM, RISK_HIGH]  # Code order used by evaluate_frame
 DECISION_SAFE = "SAFE"
 DECISION_FRAUD = "FRAUD"  # Advisory only
 
@@ -30,33 +36,52 @@ class FraudAnalysisResult:
     decision: str
     details: List[str]
 
+# Shared no-op span used when no stage timings are attached
+_NO_SPAN = nullcontext()
+
 class FraudDetectionEngine:
-    def __init__(self):
+    def __init__(self, timings=None, use_student=False):
+        self.timings = timings  # Optional metrics.StageTimings for per-stage spans
+        self.use_student = use_student  # Score with the distilled student instead of the forest
         self.rf_model = None
         self.xgb_model = None
-        self.label_encoder = None
+        self.student_model = None
+        self.type_table = dict(TX_TYPE_CODES)  # Replaced by the type classes stored with the models
         self.models_loaded = False
         self._load_models()
+        # The model predict_proba is called on, and the features it was trained on
+        self.scorer = self.student_model or self.rf_model
+        feature_names = self.student_model.feature_names if self.student_model else MODEL_FEATURES
+        self.features = FeaturePipeline(feature_names, type_table=self.type_table)
 
     def _load_models(self):
         """Attempts to load pre-trained ML models."""
         try:
             if os.path.exists(RF_MODEL_PATH):
-                with open(RF_MODEL_PATH, "rb") as f:
-                    self.rf_model = pickle.load(f)
+                self.rf_model = load_model(RF_MODEL_PATH)
                 logger.info("✅ Random Forest model loaded.")
             
             if os.path.exists(XGB_MODEL_PATH):
-                with open(XGB_MODEL_PATH, "rb") as f:
-                    self.xgb_model = pickle.load(f)
+                self.xgb_model = load_model(XGB_MODEL_PATH)
                 logger.info("✅ XGBoost model loaded.")
-                
-            if os.path.exists(LABEL_ENCODER_PATH):
-                with open(LABEL_ENCODER_PATH, "rb") as f:
-                    self.label_encoder = pickle.load(f)
-                logger.info("✅ Label Encoder loaded.")
             
-            if self.rf_model or self.xgb_model:
+            if self.use_student:
+                if os.path.exists(STUDENT_MODEL_PATH):
+                    self.student_model = load_model(STUDENT_MODEL_PATH)
+                    logger.info(f"✅ Distilled {self.student_model.kind} student loaded.")
+                else:
+                    logger.warning("⚠️ No student model found - run: python train_model.py --distill trees")
+
+            if not (self.rf_model or self.xgb_model) and glob.glob(os.path.join(MODEL_DIR, "*_model.pkl")):
+                logger.warning("⚠️ Only pickled models found - convert them with: python train_model.py --export")
+
+            # Plain dict lookup of the type codes the scoring model was trained with
+            for model in (self.student_model, self.rf_model, self.xgb_model):
+                if model and model.type_classes:
+                    self.type_table = {tx_type: code for code, tx_type in enumerate(model.type_classes)}
+                    break
+
+            if self.rf_model or self.xgb_model or self.student_model:
                 self.models_loaded = True
         except Exception as e:
             logger.error(f"⚠️ Failed to load ML models: {e}")
@@ -66,17 +91,79 @@ class FraudDetectionEngine:
         """
         Analyzes a transaction using a hybrid approach (Rules + ML).
         """
-        score = 0.0
-        details = []
-
         # 1. Rule-Based Checks
-        rule_score, rule_details = self._check_rules(tx_data)
-        score += rule_score
-        details.extend(rule_details)
+        with self._span("rules"):
+            rule_score, rule_details = self._check_rules(tx_data)
 
         # 2. ML-Based Checks (if models are available)
+        ml_result = None
         if self.models_loaded and rule_score < 100:  # Only use ML if rules didn't find critical fraud
-            ml_score, ml_details = self._check_ml(tx_data)
+            with self._span("ml"):
+                ml_result = self._check_ml(tx_data)
+
+        return self._combine_scores(rule_score, rule_details, ml_result)
+
+    def evaluate_batch(self, tx_list: List[Dict[str, Any]]) -> List[FraudAnalysisResult]:
+        """
+        Analyzes many transactions at once. Rules run per transaction, the ML
+        models run once over a single feature matrix for the whole batch.
+        """
+        with self._span("rules_batch"):
+            rule_results = [self._check_rules(tx) for tx in tx_list]
+
+        ml_indices = []
+        if self.models_loaded:
+            ml_indices = [i for i, (rule_score, _) in enumerate(rule_results) if rule_score < 100]
+        with self._span("ml_batch"):
+            ml_results = self._check_ml_batch([tx_list[i] for i in ml_indices]) if ml_indices else []
+        ml_by_index = dict(zip(ml_indices, ml_results))
+
+        return [
+            self._combine_scores(rule_score, rule_details, ml_by_index.get(i))
+            for i, (rule_score, rule_details) in enumerate(rule_results)
+        ]
+
+    def evaluate_frame(self, raw: pd.DataFrame, merchant_sender: np.ndarray) -> Dict[str, np.ndarray]:
+        """
+        Vectorized evaluate_batch for offline re-scoring. `raw` holds the
+        features.RAW_COLUMNS and `merchant_sender` flags rows whose sender name
+        starts with "M". Returns score, rule_score and ml_score arrays plus
+        risk_level codes into RISK_LEVELS; no per-transaction details.
+        """
+        amount = raw["amount"].to_numpy(np.float64)
+        # Same rules as _check_rules
+        rule_score = np.where(amount <= 0, 100.0, 0.0)
+        rule_score += np.select([amount > 500000, amount > 100000], [40.0, 20.0], 0.0)
+        rule_score += np.where(merchant_sender & (amount > 10000), 10.0, 0.0)
+
+        # Same weighting as _combine_scores
+        ml_score = np.zeros(len(raw))
+        if self.models_loaded:
+            if self.scorer:
+                ml_score = self.scorer.predict_proba(self.features.transform_frame(raw))[:, 1] * 100
+            score = np.where(rule_score < 100, rule_score * 0.4 + ml_score * 0.6, 100.0)
+        else:
+            score = np.minimum(rule_score, 100.0)
+        score = np.clip(score, 0.0, 100.0)
+
+        return {
+            "score": np.round(score, 2),
+            "rule_score": rule_score,
+            "ml_score": ml_score,
+            "risk_level": np.digitize(score, [20, 60]).astype(np.int8),
+        }
+
+    def _span(self, stage: str):
+        return self.timings.span(stage) if self.timings is not None else _NO_SPAN
+
+    def _combine_scores(self, rule_score: float, rule_details: List[str],
+                        ml_result: Optional[Tuple[float, List[str]]]) -> FraudAnalysisResult:
+        """Merges rule and ML outputs into the final score, risk level and decision."""
+        score = rule_score
+        details = list(rule_details)
+
+        if ml_result is not None:
+            ml_score, ml_details = ml_result
             score = (score * 0.4) + (ml_score * 0.6)  # Weighted average
             details.extend(ml_details)
         elif rule_score >= 100:
@@ -137,46 +224,32 @@ class FraudDetectionEngine:
 
     def _check_ml(self, tx: Dict[str, Any]) -> (float, List[str]):
         """Uses loaded ML models to predict fraud probability."""
-        score = 0.0
-        reasons = []
+        return self._check_ml_batch([tx])[0]
+
+    def _check_ml_batch(self, tx_list: List[Dict[str, Any]]) -> List[Tuple[float, List[str]]]:
+        """Scores a list of transactions with a single predict call per model."""
+        results = [(0.0, []) for _ in tx_list]
 
         try:
-            # Prepare features for model:
-            # ['type', 'amount', 'oldbalanceOrg', 'newbalanceOrig', 'oldbalanceDest', 'newbalanceDest']
-            # We need to map tx data to these features.
-            # Assuming tx_data has similar keys or we derive them. 
-            # For simplicity in this demo, we'll try to extract them or use defaults.
-            
-            tx_type = tx.get("type", "PAYMENT")
-            amount = float(tx.get("amount", 0.0))
-            old_bal_org = float(tx.get("sender_balance", 0.0)) # From state? Or passed in tx?
-            new_bal_orig = old_bal_org - amount
-            old_bal_dest = float(tx.get("receiver_balance", 0.0))
-            new_bal_dest = old_bal_dest + amount
-
-            # Encode Type
-            if self.label_encoder:
-                try:
-                    type_encoded = self.label_encoder.transform([tx_type])[0]
-                except ValueError:
-                    type_encoded = 0 # Default/Unknown
+            # Feature matrix from the shared spec in features.py (reused buffers)
+            if len(tx_list) == 1:
+                features = self.features.transform_row(tx_list[0])
             else:
-                type_encoded = 0
-            
-            features = np.array([[
-                type_encoded, 
-                amount, 
-                old_bal_org, 
-                new_bal_orig, 
-                old_bal_dest, 
-                new_bal_dest
-            ]])
-
-            # RF Prediction
-            if self.rf_model:
-                prob_rf = self.rf_model.predict_proba(features)[0][1] # Probability of Class 1 (Fraud)
-                score += prob_rf * 100
-                reasons.append(f"ML Model Risk: {prob_rf*100:.1f}%")
+                features = self.features.transform_batch(tx_list)
+
+            # RF (or distilled student) Prediction
+            if self.scorer:
+                probs_rf = self.scorer.predict_proba(features)[:, 1] # Probability of Class 1 (Fraud)
+                results = [
+                    (prob_rf * 100, [f"ML Model Risk: {prob_rf*100:.1f}%"])
+                    for prob_rf in probs_rf
+                ]
+
+                # Types the models never saw are encoded as features.UNKNOWN_TYPE
+                for tx, (_, ml_details) in zip(tx_list, results):
+                    tx_type = tx.get("type", "PAYMENT")
+                    if tx_type not in self.type_table:
+                        ml_details.append(f"Unknown transaction type '{tx_type}' - ML scored without type")
 
             # XGB Prediction (optional fallback or ensemble)
             if self.xgb_model:
@@ -184,9 +257,9 @@ class FraudDetectionEngine:
 
         except Exception as e:
             logger.error(f"ML Prediction Error: {e}")
-            reasons.append("ML Analysis Failed")
-        
-        return score, reasons
+            results = [(0.0, ["ML Analysis Failed"]) for _ in tx_list]
+
+        return results
 
 # Singleton instance for easy access if needed
 engine = FraudDetectionEngine()
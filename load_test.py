@@ -0,0 +1,346 @@
+"""
+Load Generator & Throughput Benchmark
+Drives the server over N WebSocket connections and reports what it sustains.
+
+Examples:
+    python load_test.py --connections 8 --rate 2000 --duration 30
+    python load_test.py --mode closed --batch-size 50 --output results.json
+    python load_test.py --baseline results.json
+"""
+
+import argparse
+import asyncio
+import csv
+import json
+import math
+import os
+import platform
+import random
+import time
+from collections import deque
+import websockets
+
+DEFAULT_URI = "ws://localhost:8765"
+DATA_PATH = os.path.join("data", "output_1_to_10.csv")
+
+# PaySim-style mix used when the dataset is not available
+FALLBACK_TYPE_MIX = {"CASH_OUT": 0.35, "PAYMENT": 0.34, "CASH_IN": 0.22, "TRANSFER": 0.08, "DEBIT": 0.01}
+
+
+def percentile(samples, q):
+    """Nearest-rank percentile of a list of samples (q in 0-100)."""
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    rank = max(1, math.ceil(q / 100.0 * len(ordered)))
+    return ordered[rank - 1]
+
+
+def latency_summary(samples):
+    """p50/p99/p999/max in milliseconds."""
+    return {
+        "count": len(samples),
+        "p50_ms": percentile(samples, 50) * 1000,
+        "p99_ms": percentile(samples, 99) * 1000,
+        "p999_ms": percentile(samples, 99.9) * 1000,
+        "max_ms": max(samples) * 1000 if samples else 0.0,
+    }
+
+
+class TransactionMix:
+    """
+    Samples transactions shaped like the training data. Rows are drawn from
+    a reservoir sample of the CSV; without the CSV a synthetic PaySim-like
+    mix (log-normal amounts per type) is used instead.
+    """
+
+    def __init__(self, rng, data_path=DATA_PATH, sample_rows=50000):
+        self.rng = rng
+        self.rows = self._load_rows(data_path, sample_rows) if os.path.exists(data_path) else []
+        self.source = data_path if self.rows else "synthetic"
+
+    def _load_rows(self, path, sample_rows):
+        reservoir = []
+        with open(path, newline="") as f:
+            for i, row in enumerate(csv.DictReader(f)):
+                record = (
+                    row["type"],
+                    float(row["amount"]),
+                    row["nameOrig"],
+                    row["nameDest"],
+                    float(row["oldbalanceOrg"]),
+                    float(row["oldbalanceDest"]),
+                )
+                if i < sample_rows:
+                    reservoir.append(record)
+                else:
+                    j = self.rng.randint(0, i)
+                    if j < sample_rows:
+                        reservoir[j] = record
+        return reservoir
+
+    def next(self):
+        if self.rows:
+            tx_type, amount, sender, receiver, sender_balance, receiver_balance = self.rng.choice(self.rows)
+        else:
+            tx_type = self.rng.choices(list(FALLBACK_TYPE_MIX), weights=list(FALLBACK_TYPE_MIX.values()))[0]
+            amount = round(self.rng.lognormvariate(11 if tx_type == "TRANSFER" else 9.5, 1.4), 2)
+            sender = f"C{self.rng.randint(100000000, 999999999)}"
+            receiver = f"{'M' if tx_type == 'PAYMENT' else 'C'}{self.rng.randint(100000000, 999999999)}"
+            sender_balance = round(self.rng.lognormvariate(10, 2), 2)
+            receiver_balance = round(self.rng.lognormvariate(10, 2), 2)
+        return {
+            "sender": sender,
+            "receiver": receiver,
+            "amount": amount,
+            "type": tx_type,
+            "sender_balance": sender_balance,
+            "receiver_balance": receiver_balance,
+            # Unique timestamp so repeated CSV rows still hash to distinct tx ids
+            "timestamp": time.time() + self.rng.random() * 1e-6,
+        }
+
+
+class LoadRun:
+    def __init__(self, args):
+        self.args = args
+        self.rng = random.Random(args.seed)
+        self.mix = TransactionMix(self.rng, args.data, args.sample_rows)
+        self.sent = 0
+        self.accepted = 0
+        self.errors = 0
+        self.throttled = 0  # Batches shed by the server's admission control (RETRY_AFTER)
+        self.ack_latencies = []
+        self.send_times = {}      # tx_id -> send time (filled in from acks)
+        self.broadcast_times = {}  # tx_id -> first time a listener saw it
+        self.blocks_seen = 0
+        self.stop_at = 0.0
+
+    def make_batch(self):
+        return [self.mix.next() for _ in range(self.args.batch_size)]
+
+    async def _ack_reader(self, websocket, in_flight, acked):
+        """Matches TRANSACTIONS_RESULT frames (in order) to the batches that produced them."""
+        async for message in websocket:
+            data = json.loads(message)
+            msg_type = data.get("type")
+            if msg_type == "TRANSACTIONS_RESULT":
+                sent_at = in_flight.popleft()
+                self.ack_latencies.append(time.perf_counter() - sent_at)
+                self.accepted += data.get("accepted", 0)
+                for result in data.get("results", []):
+                    self.send_times[result["tx_id"]] = sent_at
+            elif msg_type in ("ERROR", "RETRY_AFTER"):
+                if in_flight:
+                    in_flight.popleft()
+                if msg_type == "ERROR":
+                    self.errors += 1
+                else:
+                    self.throttled += 1
+                    if self.args.mode == "closed":
+                        await asyncio.sleep(data.get("retry_after", 0))  # Back off as told before the next send
+            else:
+                continue
+            acked.set()
+            if not in_flight and time.perf_counter() >= self.stop_at:
+                return
+
+    async def producer(self, conn_id):
+        """One connection. Open loop sends on a Poisson schedule, closed loop waits for each ack."""
+        rng = random.Random(self.args.seed * 1000 + conn_id)
+        batches_per_sec = self.args.rate / self.args.connections / self.args.batch_size if self.args.rate else 0
+        async with websockets.connect(self.args.uri, max_size=None) as websocket:
+            await websocket.recv()  # WELCOME
+            await websocket.send(json.dumps({"type": "SUBSCRIBE", "events": []}))
+            await websocket.recv()  # SUBSCRIBED
+
+            in_flight = deque()  # send times of batches still waiting for an ack
+            acked = asyncio.Event()
+            reader = asyncio.create_task(self._ack_reader(websocket, in_flight, acked))
+            next_send = time.perf_counter()
+            try:
+                while time.perf_counter() < self.stop_at:
+                    if batches_per_sec:
+                        next_send += rng.expovariate(batches_per_sec)
+                        delay = next_send - time.perf_counter()
+                        if delay > 0:
+                            await asyncio.sleep(delay)
+                            if time.perf_counter() >= self.stop_at:
+                                break
+                    batch = self.make_batch()
+                    in_flight.append(time.perf_counter())
+                    acked.clear()
+                    await websocket.send(json.dumps({"type": "ADD_TRANSACTIONS", "transactions": batch}))
+                    self.sent += len(batch)
+                    if self.args.mode == "closed":
+                        await acked.wait()
+                if in_flight:
+                    await asyncio.wait_for(reader, timeout=self.args.drain_timeout)
+            except asyncio.TimeoutError:
+                pass
+            finally:
+                reader.cancel()
+
+    async def listener(self):
+        """A passive receiver measuring broadcast lag and counting mined blocks."""
+        async with websockets.connect(self.args.uri, max_size=None) as websocket:
+            await websocket.recv()  # WELCOME
+            await websocket.send(json.dumps({"type": "SUBSCRIBE", "events": ["transactions", "blocks"]}))
+            async for message in websocket:
+                now = time.perf_counter()
+                data = json.loads(message)
+                if data.get("type") == "NEW_TRANSACTIONS":
+                    for tx in data.get("transactions", []):
+                        self.broadcast_times.setdefault(tx.get("tx_id"), now)
+                elif data.get("type") == "NEW_BLOCK":
+                    self.blocks_seen += 1
+
+    async def server_stats(self):
+        async with websockets.connect(self.args.uri, max_size=None) as websocket:
+            await websocket.recv()  # WELCOME
+            await websocket.send(json.dumps({"type": "SUBSCRIBE", "events": []}))
+            await websocket.recv()  # SUBSCRIBED
+            await websocket.send(json.dumps({"type": "GET_STATS"}))
+            async for message in websocket:
+                data = json.loads(message)
+                if data.get("type") == "STATS_DATA":
+                    return data.get("stats", {})
+
+    async def run(self):
+        before = await self.server_stats()
+        listener = asyncio.create_task(self.listener()) if self.args.listeners else None
+        await asyncio.sleep(0.2)
+
+        started = time.perf_counter()
+        self.stop_at = started + self.args.duration
+        await asyncio.gather(*(self.producer(i) for i in range(self.args.connections)))
+        elapsed = time.perf_counter() - started
+
+        await asyncio.sleep(0.5)  # Let the last coalesced broadcasts arrive
+        if listener:
+            listener.cancel()
+        after = await self.server_stats()
+
+        broadcast_lags = [
+            self.broadcast_times[tx_id] - sent_at
+            for tx_id, sent_at in self.send_times.items()
+            if tx_id in self.broadcast_times
+        ]
+        return {
+            "config": {
+                "uri": self.args.uri,
+                "mode": self.args.mode,
+                "connections": self.args.connections,
+                "target_rate": self.args.rate,
+                "batch_size": self.args.batch_size,
+                "duration": self.args.duration,
+                "seed": self.args.seed,
+                "data_source": self.mix.source,
+            },
+            "environment": {
+                "python": platform.python_version(),
+                "platform": platform.platform(),
+                "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            },
+            "results": {
+                "elapsed_sec": elapsed,
+                "sent": self.sent,
+                "accepted": self.accepted,
+                "errors": self.errors,
+                "throttled_batches": self.throttled,
+                "accepted_tx_per_sec": self.accepted / elapsed if elapsed else 0.0,
+                "ack_latency": latency_summary(self.ack_latencies),
+                "broadcast_lag": latency_summary(broadcast_lags),
+                "blocks_seen": self.blocks_seen,
+                "server_scoring_latency": after.get("scoring_latency", {}),
+                "server_mining_time": after.get("mining_time", {}),
+                "server_tx_delta": after.get("total_tx", 0) - before.get("total_tx", 0),
+            },
+        }
+
+
+# Metrics compared against a baseline run; True means higher is better
+COMPARED_METRICS = {
+    "accepted_tx_per_sec": True,
+    "ack_latency.p50_ms": False,
+    "ack_latency.p99_ms": False,
+    "ack_latency.p999_ms": False,
+    "broadcast_lag.p99_ms": False,
+}
+
+
+def _lookup(results, dotted):
+    value = results
+    for key in dotted.split("."):
+        value = value.get(key, {}) if isinstance(value, dict) else {}
+    return value if isinstance(value, (int, float)) else None
+
+
+def print_report(report, baseline=None):
+    r = report["results"]
+    c = report["config"]
+    print("\n📊 Load Test Results")
+    print(f"   Mode        : {c['mode']} loop, {c['connections']} connection(s), batch {c['batch_size']}, "
+          f"target {c['target_rate'] or 'max'} tx/s, data: {c['data_source']}")
+    print(f"   Accepted    : {r['accepted']:,} / {r['sent']:,} sent ({r['errors']} errors, {r.get('throttled_batches', 0)} batches throttled) in {r['elapsed_sec']:.1f}s")
+    print(f"   Throughput  : {r['accepted_tx_per_sec']:,.1f} tx/s")
+    for name in ("ack_latency", "broadcast_lag"):
+        s = r[name]
+        print(f"   {name:<12}: p50 {s['p50_ms']:.2f} ms | p99 {s['p99_ms']:.2f} ms | p999 {s['p999_ms']:.2f} ms | max {s['max_ms']:.2f} ms")
+    scoring = r["server_scoring_latency"]
+    mining = r["server_mining_time"]
+    print(f"   Server scoring (per tx): p50 {scoring.get('p50_ms', 0):.3f} ms | p99 {scoring.get('p99_ms', 0):.3f} ms")
+    print(f"   Mining time : p50 {mining.get('p50_ms', 0):.1f} ms | p99 {mining.get('p99_ms', 0):.1f} ms | blocks seen {r['blocks_seen']}")
+
+    if baseline:
+        print("\n📈 Compared with baseline")
+        for metric, higher_is_better in COMPARED_METRICS.items():
+            new = _lookup(r, metric)
+            old = _lookup(baseline.get("results", {}), metric)
+            if new is None or not old:
+                continue
+            change = (new - old) / old * 100
+            better = change >= 0 if higher_is_better else change <= 0
+            print(f"   {'✅' if better else '⚠️ '} {metric:<22} {old:>12,.2f} → {new:>12,.2f} ({change:+.1f}%)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Blockchain server load generator")
+    parser.add_argument("--uri", default=DEFAULT_URI)
+    parser.add_argument("--connections", type=int, default=4, help="Concurrent producer connections")
+    parser.add_argument("--mode", choices=["open", "closed"], default="open",
+                        help="open: send on schedule regardless of acks; closed: wait for each ack")
+    parser.add_argument("--rate", type=float, default=0,
+                        help="Target total tx/s across connections (0 = as fast as possible)")
+    parser.add_argument("--batch-size", type=int, default=1, help="Transactions per ADD_TRANSACTIONS frame")
+    parser.add_argument("--duration", type=float, default=10.0, help="Seconds to generate load")
+    parser.add_argument("--drain-timeout", type=float, default=10.0, help="Seconds to wait for outstanding acks")
+    parser.add_argument("--data", default=DATA_PATH, help="CSV to draw the transaction mix from")
+    parser.add_argument("--sample-rows", type=int, default=50000, help="Rows kept from the CSV for sampling")
+    parser.add_argument("--no-listener", dest="listeners", action="store_false",
+                        help="Skip the receiver connection that measures broadcast lag")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--output", help="Write results as JSON to this path")
+    parser.add_argument("--baseline", help="Compare against a previous --output JSON file")
+    args = parser.parse_args()
+
+    print(f"🚀 Load test against {args.uri} for {args.duration:.0f}s...")
+    report = asyncio.run(LoadRun(args).run())
+
+    baseline = None
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+    print_report(report, baseline)
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"\n💾 Results written to {args.output}")
+
+
+if __name__ == "__main__":
+    try:
+        main()
+    except ConnectionRefusedError:
+        print(f"❌ Server not running on {DEFAULT_URI}. Start it first: python server.py")
@@ -0,0 +1,313 @@
+"""
+Running server metrics, updated incrementally on every event so reading
+them never has to walk the chain.
+"""
+
+import bisect
+import time
+from collections import deque
+from time import perf_counter
+from typing import Any, Dict, List, Optional
+
+# Histogram bucket upper bounds in seconds: 1-2.5-5 steps from 1us to 10s
+LATENCY_BUCKETS = (
+    0.000001, 0.0000025, 0.000005,
+    0.00001, 0.000025, 0.00005,
+    0.0001, 0.00025, 0.0005,
+    0.001, 0.0025, 0.005,
+    0.01, 0.025, 0.05,
+    0.1, 0.25, 0.5,
+    1.0, 2.5, 5.0, 10.0,
+)
+
+
+class LatencyHistogram:
+    """
+    Fixed-bucket latency histogram; recording is one bisect and two adds.
+    Spans append raw samples to `pending`, which is folded into the buckets
+    in a tight loop on read (or once it fills up).
+    """
+
+    def __init__(self, bounds=LATENCY_BUCKETS):
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1)  # Last bucket catches overflow
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+        self.pending: List[float] = []
+
+    def fold(self):
+        """Moves pending span samples into the buckets."""
+        pending = self.pending
+        if not pending:
+            return
+        counts, bounds, bisect_left = self.counts, self.bounds, bisect.bisect_left
+        for seconds in pending:
+            counts[bisect_left(bounds, seconds)] += 1
+        self.count += len(pending)
+        self.total += sum(pending)
+        self.max = max(self.max, max(pending))
+        pending.clear()
+
+    def record(self, seconds: float, n: int = 1):
+        self.counts[bisect.bisect_left(self.bounds, seconds)] += n
+        self.count += n
+        self.total += seconds * n
+        if seconds > self.max:
+            self.max = seconds
+
+    def merge(self, other: "LatencyHistogram"):
+        """Adds another histogram's samples (same bounds) to this one."""
+        other.fold()
+        for i, bucket_count in enumerate(other.counts):
+            self.counts[i] += bucket_count
+        self.count += other.count
+        self.total += other.total
+        self.max = max(self.max, other.max)
+
+    def percentile(self, q: float) -> float:
+        """Returns the upper bound of the bucket holding the q-th percentile (0-100)."""
+        self.fold()
+        if not self.count:
+            return 0.0
+        rank = q / 100.0 * self.count
+        seen = 0
+        for i, bucket_count in enumerate(self.counts):
+            seen += bucket_count
+            if seen >= rank and bucket_count:
+                return min(self.bounds[i], self.max) if i < len(self.bounds) else self.max
+        return self.max
+
+    def to_dict(self) -> Dict[str, Any]:
+        self.fold()
+        return {
+            "count": self.count,
+            "mean_ms": (self.total / self.count * 1000) if self.count else 0.0,
+            "p50_ms": self.percentile(50) * 1000,
+            "p99_ms": self.percentile(99) * 1000,
+            "max_ms": self.max * 1000,
+        }
+
+
+# Pending span samples per histogram before they are folded into buckets
+SPAN_FOLD_THRESHOLD = 4096
+
+
+class _Span:
+    """
+    Times one `with` block into a histogram's pending samples. One span object
+    exists per stage and is reused, so a span must not contain an `await`
+    (use StageTimings.record for stages that yield to the event loop).
+    """
+    __slots__ = ("histogram", "pending", "started")
+
+    def __init__(self, histogram: LatencyHistogram):
+        self.histogram = histogram
+        self.pending = histogram.pending
+
+    def __enter__(self):
+        self.started = perf_counter()
+
+    def __exit__(self, exc_type, exc, tb):
+        pending = self.pending
+        pending.append(perf_counter() - self.started)
+        if len(pending) >= SPAN_FOLD_THRESHOLD:
+            self.histogram.fold()
+
+
+class StageTimings:
+    """
+    Per-stage latency histograms for the transaction pipeline.
+
+        with stage_timings.span("rules"):
+            ...
+
+    A span costs two perf_counter calls and a list append; bucketing is
+    deferred to read time. See the metrics.span benchmark in benchmark.py.
+    """
+
+    def __init__(self):
+        self.histograms: Dict[str, LatencyHistogram] = {}
+        self.spans: Dict[str, _Span] = {}
+
+    def histogram(self, stage: str) -> LatencyHistogram:
+        histogram = self.histograms.get(stage)
+        if histogram is None:
+            histogram = self.histograms[stage] = LatencyHistogram()
+        return histogram
+
+    def span(self, stage: str) -> _Span:
+        span = self.spans.get(stage)
+        if span is None:
+            span = self.spans[stage] = _Span(self.histogram(stage))
+        return span
+
+    def record(self, stage: str, seconds: float, n: int = 1):
+        self.histogram(stage).record(seconds, n)
+
+    def drain(self) -> Dict[str, LatencyHistogram]:
+        """Hands over every histogram and starts empty (a worker process ships these back with its results)."""
+        histograms = self.histograms
+        self.histograms, self.spans = {}, {}
+        return histograms
+
+    def merge(self, histograms: Dict[str, LatencyHistogram]):
+        for stage, histogram in histograms.items():
+            self.histogram(stage).merge(histogram)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {stage: histogram.to_dict() for stage, histogram in sorted(self.histograms.items())}
+
+    def to_prometheus(self, prefix: str = "blockchain") -> List[str]:
+        """Prometheus text exposition lines for every stage histogram."""
+        name = f"{prefix}_stage_seconds"
+        lines = [
+            f"# HELP {name} Time spent in each transaction pipeline stage.",
+            f"# TYPE {name} histogram",
+        ]
+        for stage, histogram in sorted(self.histograms.items()):
+            histogram.fold()
+            cumulative = 0
+            for bound, count in zip(histogram.bounds, histogram.counts):
+                cumulative += count
+                lines.append(f'{name}_bucket{{stage="{stage}",le="{bound:g}"}} {cumulative}')
+            lines.append(f'{name}_bucket{{stage="{stage}",le="+Inf"}} {histogram.count}')
+            lines.append(f'{name}_sum{{stage="{stage}"}} {histogram.total:.9f}')
+            lines.append(f'{name}_count{{stage="{stage}"}} {histogram.count}')
+        return lines
+
+
+def render_prometheus(stage_timings: StageTimings, snapshot: Dict[str, Any], prefix: str = "blockchain") -> str:
+    """Renders stage histograms plus the numeric LiveStats gauges as Prometheus text."""
+    lines = stage_timings.to_prometheus(prefix)
+    for key, value in sorted(snapshot.items()):
+        if isinstance(value, bool):
+            value = int(value)
+        if isinstance(value, (int, float)):
+            lines.append(f"# TYPE {prefix}_{key} gauge")
+            lines.append(f"{prefix}_{key} {value}")
+    return "\n".join(lines) + "\n"
+
+
+class RateCounter:
+    """Events per second over a sliding window of one-second buckets."""
+
+    def __init__(self, window: int = 10):
+        self.window = window
+        self.buckets = deque()  # [second, count]
+
+    def add(self, n: int = 1, now: Optional[float] = None):
+        second = int(now if now is not None else time.time())
+        if self.buckets and self.buckets[-1][0] == second:
+            self.buckets[-1][1] += n
+        else:
+            self.buckets.append([second, n])
+        self._expire(second)
+
+    def rate(self, now: Optional[float] = None) -> float:
+        second = int(now if now is not None else time.time())
+        self._expire(second)
+        return sum(count for _, count in self.buckets) / self.window
+
+    def _expire(self, second: int):
+        while self.buckets and self.buckets[0][0] <= second - self.window:
+            self.buckets.popleft()
+
+
+def block_summary(block) -> Dict[str, Any]:
+    """Block header fields without the transaction bodies."""
+    return {
+        "index": block.index,
+        "timestamp": block.timestamp,
+        "hash": block.hash,
+        "previous_hash": block.previous_hash,
+        "merkle_root": block.merkle_root,
+        "nonce": block.nonce,
+        "tx_count": len(block.transactions),
+    }
+
+
+class LiveStats:
+    """
+    Server-wide aggregates. Transactions and blocks are folded in as they
+    happen, and snapshot() only reads the current values.
+    """
+
+    def __init__(self, genesis_block=None, recent_blocks: int = 5):
+        self.start_time = time.time()
+        self.total_tx = 0
+        self.total_blocks = 1  # genesis
+        self.fraud_detected = 0
+        self.risk_counts = {"LOW": 0, "MEDIUM": 0, "HIGH": 0}
+        self.throttled = {"connection": 0, "account": 0, "overload": 0}  # Transactions shed, by reason
+        self.invalid_from = None  # Height of the first mined block that failed validation
+        self.tx_rate = RateCounter()
+        self.scoring_latency = LatencyHistogram()
+        self.mining_time = LatencyHistogram()
+        self.recent_blocks = deque(maxlen=recent_blocks)
+        if genesis_block is not None:
+            self.recent_blocks.append(block_summary(genesis_block))
+
+    def record_transactions(self, analysis_results: List[Any], scoring_seconds: float):
+        """Folds in a scored batch; scoring_seconds is the time for the whole batch."""
+        n = len(analysis_results)
+        if not n:
+            return
+        for result in analysis_results:
+            if result.risk_level in self.risk_counts:
+                self.risk_counts[result.risk_level] += 1
+            if result.risk_level == "HIGH":
+                self.fraud_detected += 1
+        self.total_tx += n
+        self.tx_rate.add(n)
+        self.scoring_latency.record(scoring_seconds / n, n)
+
+    def record_throttled(self, reason: str, n: int):
+        self.throttled[reason] = self.throttled.get(reason, 0) + n
+
+    @property
+    def chain_valid(self) -> bool:
+        return self.invalid_from is None
+
+    def record_block(self, block, mining_seconds: float, valid: bool = True):
+        """Folds in a block this node mined."""
+        self.total_blocks += 1
+        if not valid and self.invalid_from is None:
+            self.invalid_from = block.index
+        self.mining_time.record(mining_seconds)
+        self.recent_blocks.append(block_summary(block))
+
+    def record_received_block(self, block):
+        """Folds in a block appended from a peer (already checked, and not mined here)."""
+        self.total_blocks += 1
+        self.recent_blocks.append(block_summary(block))
+
+    def record_reorg(self, fork_height: int, blocks: List[Any]):
+        """The chain above `fork_height` was replaced by `blocks`: forget what was dropped."""
+        self.total_blocks = fork_height + 1 + len(blocks)
+        if self.invalid_from is not None and self.invalid_from > fork_height:
+            self.invalid_from = None
+        kept = [summary for summary in self.recent_blocks if summary["index"] <= fork_height]
+        self.recent_blocks.clear()
+        self.recent_blocks.extend(kept + [block_summary(block) for block in blocks])
+
+    def snapshot(self, mempool_size: int = 0, difficulty: int = 0) -> Dict[str, Any]:
+        now = time.time()
+        return {
+            "total_tx": self.total_tx,
+            "total_blocks": self.total_blocks,
+            "fraud_detected": self.fraud_detected,
+            "fraud_rate": (self.fraud_detected / self.total_tx * 100) if self.total_tx else 0.0,
+            "risk_counts": dict(self.risk_counts),
+            "throttled_tx": sum(self.throttled.values()),
+            "throttled": dict(self.throttled),
+            "tx_per_sec": self.tx_rate.rate(now),
+            "mempool_size": mempool_size,
+            "difficulty": difficulty,
+            "chain_valid": self.chain_valid,
+            "start_time": self.start_time,
+            "uptime": now - self.start_time,
+            "recent_blocks": list(self.recent_blocks),
+            "scoring_latency": self.scoring_latency.to_dict(),
+            "mining_time": self.mining_time.to_dict(),
+        }
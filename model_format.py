@@ -0,0 +1,280 @@
+"""
+Versioned binary format for the trained models.
+
+A model file holds the parameters the server needs to score, not a pickled
+Python object, so loading it executes no code and needs neither sklearn nor
+xgboost:
+
+    magic        8 bytes  b"FRDMODEL"
+    version      uint32   FORMAT_VERSION
+    header size  uint32
+    header       JSON: model kind, feature names, type classes, array table
+    arrays       raw little-endian arrays, each starting on a 64-byte boundary
+
+load_model() memory-maps the file read-only and views the arrays in place,
+so startup does no parsing and every process scoring with the same file
+shares one physical copy through the page cache.
+
+Tree ensembles (Random Forest, XGBoost, distilled student trees) are stored
+as one flat node table: per node a split feature, threshold and child
+indices, with leaves pointing at themselves, plus the root node of every
+tree. All trees are walked for all rows at once, one level per step.
+
+    from model_format import export_model, load_model
+    export_model(rf_model, "models/rf_model.bin", MODEL_FEATURES, TX_TYPES)
+    model = load_model("models/rf_model.bin")
+    model.predict_proba(X)
+"""
+
+import json
+import mmap
+import os
+import struct
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+
+from student import LinearStudent, TreeStudent
+
+MAGIC = b"FRDMODEL"
+FORMAT_VERSION = 1
+ALIGNMENT = 64
+_PREFIX = struct.Struct("<8sII")  # magic, version, header size
+
+
+def _sigmoid(z: np.ndarray) -> np.ndarray:
+    return 1.0 / (1.0 + np.exp(-z))
+
+
+class TreeEnsemble:
+    """
+    Scoring view over a stored tree ensemble. `output` is "mean_proba" (the
+    Random Forest averages per-tree fraud probabilities) or "logit" (boosted
+    trees sum leaf margins onto `base`). `split` is the comparison that sends
+    a row left: sklearn uses x <= threshold, XGBoost x < threshold.
+    """
+
+    kind = "trees"
+
+    def __init__(self, meta: Dict[str, Any], arrays: Dict[str, np.ndarray]):
+        self.meta = meta
+        self.source = meta["source"]
+        self.feature_names = meta["feature_names"]
+        self.type_classes = meta.get("type_classes")
+        self.output = meta["output"]
+        self.depth = meta["depth"]
+        self.base = meta.get("base", 0.0)
+        self._goes_left = np.less if meta["split"] == "lt" else np.less_equal
+        self.roots = arrays["roots"]
+        self.feature = arrays["feature"]
+        self.threshold = arrays["threshold"]
+        self.left = arrays["left"]
+        self.right = arrays["right"]
+        self.value = arrays["value"]
+        self._is_leaf = self.left == np.arange(len(self.left))
+
+    def _leaf_values(self, X: np.ndarray) -> np.ndarray:
+        """(rows, trees) leaf values. Only (row, tree) pairs not yet at a leaf take the next step."""
+        n_rows, n_trees = len(X), len(self.roots)
+        node = np.tile(self.roots, n_rows)
+        row = np.repeat(np.arange(n_rows), n_trees)
+        active = np.flatnonzero(~self._is_leaf[node])
+        while active.size:
+            current = node[active]
+            go_left = self._goes_left(X[row[active], self.feature[current]], self.threshold[current])
+            node[active] = current = np.where(go_left, self.left[current], self.right[current])
+            active = active[~self._is_leaf[current]]
+        return self.value[node].reshape(n_rows, n_trees)
+
+    def predict_proba(self, X: np.ndarray) -> np.ndarray:
+        leaves = self._leaf_values(X)
+        if self.output == "logit":
+            p = _sigmoid(self.base + leaves.sum(axis=1))
+        else:
+            p = leaves.mean(axis=1)
+        return np.column_stack([1.0 - p, p])
+
+
+class LinearModel(LinearStudent):
+    """Scoring view over a stored linear student."""
+
+    def __init__(self, meta: Dict[str, Any], arrays: Dict[str, np.ndarray]):
+        super().__init__(meta["feature_names"], arrays["coef"], meta["intercept"])
+        self.meta = meta
+        self.source = meta["source"]
+        self.type_classes = meta.get("type_classes")
+
+
+_MODEL_CLASSES = {"trees": TreeEnsemble, "linear": LinearModel}
+
+
+# --- Writing ---------------------------------------------------------------
+
+def save_model(path: str, meta: Dict[str, Any], arrays: Dict[str, np.ndarray]):
+    """Writes `meta` (JSON-serializable) and named arrays; replaces `path` atomically."""
+    table, offset = {}, 0
+    arrays = {name: np.ascontiguousarray(a, dtype=np.asarray(a).dtype.newbyteorder("<"))
+              for name, a in arrays.items()}
+    for name, a in arrays.items():
+        table[name] = {"dtype": a.dtype.str, "shape": list(a.shape), "offset": offset}
+        offset += -(-a.nbytes // ALIGNMENT) * ALIGNMENT
+    header = json.dumps({**meta, "arrays": table}).encode()
+    data_start = -(-(_PREFIX.size + len(header)) // ALIGNMENT) * ALIGNMENT
+
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(_PREFIX.pack(MAGIC, FORMAT_VERSION, len(header)))
+        f.write(header)
+        for name, a in arrays.items():
+            f.seek(data_start + table[name]["offset"])
+            f.write(a.tobytes())
+        f.truncate(data_start + offset)
+    os.replace(tmp_path, path)
+
+
+def _flat_trees(trees: List[Dict[str, np.ndarray]]) -> Dict[str, np.ndarray]:
+    """Concatenates per-tree node arrays (children as local indices, -1 at leaves) into one node table."""
+    roots, offset = [], 0
+    feature, threshold, left, right, value = [], [], [], [], []
+    for tree in trees:
+        n = len(tree["feature"])
+        leaf = tree["left"] < 0
+        index = np.arange(offset, offset + n, dtype=np.int32)
+        feature.append(np.where(leaf, 0, tree["feature"]).astype(np.int32))
+        threshold.append(tree["threshold"])
+        left.append(np.where(leaf, index, tree["left"] + offset).astype(np.int32))
+        right.append(np.where(leaf, index, tree["right"] + offset).astype(np.int32))
+        value.append(tree["value"])
+        roots.append(offset)
+        offset += n
+    return {
+        "roots": np.array(roots, dtype=np.int32),
+        "feature": np.concatenate(feature),
+        "threshold": np.concatenate(threshold),
+        "left": np.concatenate(left),
+        "right": np.concatenate(right),
+        "value": np.concatenate(value),
+    }
+
+
+def _sklearn_forest(model) -> tuple:
+    fraud_column = list(model.classes_).index(1)
+    trees = []
+    for estimator in model.estimators_:
+        t = estimator.tree_
+        counts = t.value[:, 0, :]
+        trees.append({
+            "feature": t.feature, "threshold": t.threshold.astype(np.float64),
+            "left": t.children_left, "right": t.children_right,
+            "value": counts[:, fraud_column] / counts.sum(axis=1),
+        })
+    depth = max(e.tree_.max_depth for e in model.estimators_)
+    return {"source": "rf", "output": "mean_proba", "split": "le", "depth": depth}, _flat_trees(trees)
+
+
+def _xgboost_trees(model) -> tuple:
+    booster = model.get_booster()
+    nodes = booster.trees_to_dataframe()
+    names = booster.feature_names  # None when fitted on a plain array: features are then f0, f1, ...
+    column = lambda f: names.index(f) if names else int(f[1:])
+    trees, depth = [], 0
+    for _, tree in nodes.groupby("Tree", sort=True):
+        tree = tree.sort_values("Node")
+        ids = {node_id: i for i, node_id in enumerate(tree["ID"])}
+        leaf = (tree["Feature"] == "Leaf").to_numpy()
+        child = lambda column: np.array([-1 if is_leaf else ids[c] for is_leaf, c in zip(leaf, tree[column])])
+        left, right = child("Yes"), child("No")
+        trees.append({
+            "feature": np.array([0 if is_leaf else column(f) for is_leaf, f in zip(leaf, tree["Feature"])]),
+            "threshold": tree["Split"].fillna(0).to_numpy(np.float32),
+            "left": left, "right": right,
+            "value": np.where(leaf, tree["Gain"].to_numpy(), 0.0),
+        })
+        # Depth: longest root-to-leaf path
+        level = np.zeros(len(leaf), dtype=np.int64)
+        for i in range(len(leaf)):
+            if not leaf[i]:
+                level[left[i]] = level[right[i]] = level[i] + 1
+        depth = max(depth, int(level.max()))
+
+    config = json.loads(booster.save_config())
+    base_score = float(config["learner"]["learner_model_param"]["base_score"].strip("[]"))
+    base = float(np.log(base_score / (1 - base_score)))
+    return {"source": "xgb", "output": "logit", "split": "lt", "depth": depth, "base": base}, _flat_trees(trees)
+
+
+def _student_trees(model: TreeStudent) -> tuple:
+    n_trees, max_nodes = model.feature.shape
+    trees = []
+    for i in range(n_trees):
+        loops = model.left[i] == np.arange(max_nodes)
+        trees.append({
+            "feature": model.feature[i], "threshold": model.threshold[i],
+            "left": np.where(loops, -1, model.left[i]), "right": np.where(loops, -1, model.right[i]),
+            "value": model.value[i] * model.learning_rate,
+        })
+    meta = {"source": "student", "output": "logit", "split": "le", "depth": model.depth, "base": model.base}
+    return meta, _flat_trees(trees)
+
+
+def export_model(model, path: str, feature_names: Optional[List[str]] = None,
+                 type_classes: Optional[List[str]] = None, negative_rate: Optional[float] = None):
+    """
+    Writes a fitted sklearn RandomForestClassifier, XGBClassifier or
+    distilled student to `path`. `type_classes` are the transaction types
+    in code order (the label encoder's classes). `negative_rate` records
+    the non-fraud sampling rate the model was trained with (its rows
+    weighted back by 1 / rate), if it was downsampled.
+    """
+    if isinstance(model, LinearStudent):
+        meta = {"kind": "linear", "source": "student", "intercept": model.intercept}
+        arrays = {"coef": model.coef}
+    else:
+        if isinstance(model, TreeStudent):
+            meta, arrays = _student_trees(model)
+        elif hasattr(model, "get_booster"):
+            meta, arrays = _xgboost_trees(model)
+        elif hasattr(model, "estimators_"):
+            meta, arrays = _sklearn_forest(model)
+        else:
+            raise TypeError(f"Cannot export model of type {type(model).__name__}")
+        meta["kind"] = "trees"
+
+    names = feature_names or getattr(model, "feature_names", None)
+    if names is None:
+        raise ValueError("feature_names are required for this model")
+    meta["feature_names"] = list(names)
+    if type_classes is not None:
+        meta["type_classes"] = [str(t) for t in type_classes]
+    if negative_rate is not None:
+        meta["negative_rate"] = float(negative_rate)
+    save_model(path, meta, arrays)
+
+
+# --- Reading ---------------------------------------------------------------
+
+def read_header(path: str) -> Dict[str, Any]:
+    with open(path, "rb") as f:
+        magic, version, header_size = _PREFIX.unpack(f.read(_PREFIX.size))
+        if magic != MAGIC:
+            raise ValueError(f"{path} is not a model file (bad magic {magic!r})")
+        if version != FORMAT_VERSION:
+            raise ValueError(f"{path} has model format version {version}, expected {FORMAT_VERSION}")
+        header = json.loads(f.read(header_size))
+    header["format_version"] = version
+    header["data_start"] = -(-(_PREFIX.size + header_size) // ALIGNMENT) * ALIGNMENT
+    return header
+
+
+def load_model(path: str):
+    """Memory-maps a model file read-only and returns its scoring object (TreeEnsemble or LinearModel)."""
+    header = read_header(path)
+    with open(path, "rb") as f:
+        buffer = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    arrays = {}
+    for name, entry in header.pop("arrays").items():
+        dtype = np.dtype(entry["dtype"])
+        count = int(np.prod(entry["shape"], dtype=np.int64))
+        arrays[name] = np.frombuffer(buffer, dtype=dtype, count=count,
+                                     offset=header["data_start"] + entry["offset"]).reshape(entry["shape"])
+    return _MODEL_CLASSES[header["kind"]](header, arrays)
@@ -0,0 +1,199 @@
+"""
+Hyperparameter search with stratified k-fold cross-validation.
+
+The feature matrix is written once to .npy files and every pool worker
+memory-maps it read-only, so the dataset is not copied per process. Each
+(candidate, fold) pair is one task; results are folded into a leaderboard
+that puts per-row inference latency next to PR-AUC. Latency is timed on the
+model as the server scores with it: exported to the binary model format and
+loaded back (see model_format.py), not sklearn/XGBoost predict_proba.
+
+    python train_model.py --search random --n-iter 20 --folds 5 --latency-budget-us 500
+"""
+
+import json
+import os
+import shutil
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+from sklearn.ensemble import RandomForestClassifier
+from sklearn.metrics import average_precision_score
+from sklearn.model_selection import ParameterGrid, ParameterSampler, StratifiedKFold
+
+import train_model
+from model_format import export_model, load_model
+
+# Candidate hyperparameters per model kind
+SEARCH_SPACE = {
+    "rf": {
+        "n_estimators": [25, 50, 100, 200],
+        "max_depth": [None, 8, 16],
+        "min_samples_leaf": [1, 5, 20],
+    },
+    "xgb": {
+        "n_estimators": [50, 100, 300],
+        "max_depth": [3, 6, 8],
+        "learning_rate": [0.05, 0.1, 0.3],
+    },
+}
+LATENCY_ROWS = 200        # Single-row predict calls timed per fold
+LATENCY_BATCH_ROWS = 1000  # Rows in the timed batch predict call
+
+# Per-worker state, set by _init_worker
+_X = _y = _folds = _workdir = None
+
+
+def build_model(kind: str, params: Dict[str, Any], seed: int):
+    # One thread per model: the pool already uses every core
+    if kind == "rf":
+        return RandomForestClassifier(random_state=seed, n_jobs=1, **params)
+    from xgboost import XGBClassifier
+    return XGBClassifier(objective='binary:logistic', eval_metric='logloss', random_state=seed, n_jobs=1, **params)
+
+
+def candidates(mode: str, kinds: List[str], n_iter: int, seed: int) -> List[Dict[str, Any]]:
+    result = []
+    for kind in kinds:
+        space = SEARCH_SPACE[kind]
+        grid = ParameterGrid(space) if mode == "grid" else ParameterSampler(space, n_iter, random_state=seed)
+        result.extend({"model": kind, "params": params} for params in grid)
+    return result
+
+
+def _init_worker(x_path: str, y_path: str, folds: int, seed: int):
+    global _X, _y, _folds, _workdir
+    _workdir = os.path.dirname(x_path)
+    _X = np.load(x_path, mmap_mode="r")
+    _y = np.load(y_path, mmap_mode="r")
+    # Same seed in every worker, so every worker derives the same splits
+    _folds = list(StratifiedKFold(folds, shuffle=True, random_state=seed).split(np.zeros(len(_y)), _y))
+
+
+def _run_fold(index: int, candidate: Dict[str, Any], fold: int, seed: int) -> Dict[str, Any]:
+    train_idx, val_idx = _folds[fold]
+    model = build_model(candidate["model"], candidate["params"], seed)
+
+    started = time.perf_counter()
+    model.fit(_X[train_idx], _y[train_idx])
+    fit_seconds = time.perf_counter() - started
+
+    X_val = _X[val_idx]
+    pr_auc = average_precision_score(_y[val_idx], model.predict_proba(X_val)[:, 1])
+
+    # Serving scores the exported model, one transaction (1 x n_features) or one small batch at a time
+    model_path = os.path.join(_workdir, f"model_{index}_{fold}.bin")
+    export_model(model, model_path, train_model.FEATURE_PIPELINE.names)
+    served = load_model(model_path)
+    try:
+        rows = np.ascontiguousarray(X_val[:LATENCY_ROWS])
+        started = time.perf_counter()
+        for i in range(len(rows)):
+            served.predict_proba(rows[i:i + 1])
+        row_us = (time.perf_counter() - started) / max(len(rows), 1) * 1e6
+
+        batch = np.ascontiguousarray(X_val[:LATENCY_BATCH_ROWS])
+        started = time.perf_counter()
+        served.predict_proba(batch)
+        batch_us = (time.perf_counter() - started) / max(len(batch), 1) * 1e6
+    finally:
+        del served
+        os.remove(model_path)
+
+    return {"index": index, "fold": fold, "pr_auc": pr_auc, "fit_s": fit_seconds,
+            "row_us": row_us, "batch_us": batch_us}
+
+
+def prepare_dataset(data_path: str, workdir: str, negative_rate: float, seed: int):
+    """Builds the feature matrix chunk by chunk and writes X.npy / y.npy for the workers to mmap."""
+    rng = np.random.default_rng(seed)
+    X_parts, y_parts = [], []
+    for chunk in train_model.read_transactions(data_path, chunksize=train_model.CHUNK_SIZE):
+        X, y, _, _ = train_model.sample_chunk(chunk, negative_rate, 0.0, rng)
+        X_parts.append(X)
+        y_parts.append(y)
+
+    x_path, y_path = os.path.join(workdir, "X.npy"), os.path.join(workdir, "y.npy")
+    np.save(x_path, np.concatenate(X_parts))
+    np.save(y_path, np.concatenate(y_parts).astype(np.int8))
+    return x_path, y_path
+
+
+def run_search(data_path: str, mode: str = "random", kinds: Optional[List[str]] = None, n_iter: int = 10,
+               folds: int = 5, workers: Optional[int] = None, negative_rate: float = 1.0, seed: int = 42,
+               latency_budget_us: Optional[float] = None, leaderboard_path: Optional[str] = None):
+    print(f"🔎 Starting {mode} hyperparameter search ({folds}-fold stratified CV)...")
+    if not os.path.exists(data_path):
+        print(f"❌ Error: Data file not found at {data_path}")
+        return
+    kinds = kinds or (["rf", "xgb"] if train_model.XGBOOST_AVAILABLE else ["rf"])
+    pool_size = workers or os.cpu_count() or 1
+
+    workdir = tempfile.mkdtemp(prefix="model_search_")
+    try:
+        x_path, y_path = prepare_dataset(data_path, workdir, negative_rate, seed)
+        y = np.load(y_path, mmap_mode="r")
+        print(f"📊 {len(y):,} rows ({int(y.sum()):,} fraud) shared via {workdir}")
+
+        entries = candidates(mode, kinds, n_iter, seed)
+        print(f"🧪 {len(entries)} candidates x {folds} folds on {pool_size} worker(s)")
+        fold_results: Dict[int, List[Dict[str, Any]]] = {i: [] for i in range(len(entries))}
+
+        started = time.perf_counter()
+        with ProcessPoolExecutor(pool_size, initializer=_init_worker,
+                                 initargs=(x_path, y_path, folds, seed)) as pool:
+            futures = [pool.submit(_run_fold, i, entry, fold, seed)
+                       for i, entry in enumerate(entries) for fold in range(folds)]
+            for done, future in enumerate(as_completed(futures), start=1):
+                result = future.result()
+                fold_results[result["index"]].append(result)
+                if done % max(len(futures) // 10, 1) == 0 or done == len(futures):
+                    print(f"   ⏳ {done}/{len(futures)} folds done ({time.perf_counter() - started:.0f}s)")
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    leaderboard = []
+    for i, entry in enumerate(entries):
+        results = fold_results[i]
+        scores = [r["pr_auc"] for r in results]
+        row_us = float(np.median([r["row_us"] for r in results]))
+        leaderboard.append({
+            "model": entry["model"],
+            "params": entry["params"],
+            "pr_auc": float(np.mean(scores)),
+            "pr_auc_std": float(np.std(scores)),
+            "row_us": row_us,
+            "batch_us": float(np.median([r["batch_us"] for r in results])),
+            "fit_s": float(np.mean([r["fit_s"] for r in results])),
+            "within_budget": latency_budget_us is None or row_us <= latency_budget_us,
+        })
+    leaderboard.sort(key=lambda e: e["pr_auc"], reverse=True)
+
+    print_leaderboard(leaderboard, latency_budget_us)
+    if leaderboard_path:
+        with open(leaderboard_path, "w") as f:
+            json.dump({"mode": mode, "folds": folds, "rows": len(y), "seed": seed,
+                       "latency_budget_us": latency_budget_us, "leaderboard": leaderboard}, f, indent=2)
+        print(f"\n💾 Leaderboard written to {leaderboard_path}")
+    return leaderboard
+
+
+def print_leaderboard(leaderboard: List[Dict[str, Any]], latency_budget_us: Optional[float]):
+    print(f"\n🏆 Leaderboard (PR-AUC mean ± std over folds; latency is per row)\n")
+    print(f"  {'#':>3}  {'model':<5} {'PR-AUC':>14} {'row µs':>9} {'batch µs':>9} {'fit s':>7}  params")
+    for rank, e in enumerate(leaderboard, start=1):
+        flag = "" if latency_budget_us is None else ("✅ " if e["within_budget"] else "❌ ")
+        params = ", ".join(f"{k}={v}" for k, v in sorted(e["params"].items()))
+        print(f"  {rank:>3}  {e['model']:<5} {e['pr_auc']:>7.4f} ± {e['pr_auc_std']:.4f} "
+              f"{e['row_us']:>9.1f} {e['batch_us']:>9.2f} {e['fit_s']:>7.1f}  {flag}{params}")
+
+    if latency_budget_us is not None:
+        best = next((e for e in leaderboard if e["within_budget"]), None)
+        if best:
+            print(f"\n✅ Best within {latency_budget_us:g} µs/row: {best['model']} {best['params']} "
+                  f"(PR-AUC {best['pr_auc']:.4f}, {best['row_us']:.1f} µs/row)")
+        else:
+            print(f"\n❌ No candidate meets the {latency_budget_us:g} µs/row budget")
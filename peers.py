@@ -0,0 +1,270 @@
+"""
+Block and transaction replication between server nodes.
+
+Nodes started with --peers keep a websocket open to every listed peer and
+speak a small protocol next to the client one:
+
+    PEER_HELLO              node id, height, tip hash and chain work (both ways on connect)
+    GOSSIP_TXS              transactions accepted into a mempool, with their fraud verdicts
+    GOSSIP_BLOCK            a newly mined (or newly adopted) tip block
+    GET_HEADERS / HEADERS   headers after the fork point found from a block locator
+    GET_BLOCKS / BLOCKS     full blocks for a height range
+
+A node relays gossip the first time it sees it, so a partial mesh is enough.
+When a peer has a better chain, the node syncs headers first. It finds the
+fork point, then checks the header chain (links and proof of work) and
+compares work before downloading any bodies. Then it fetches the bodies in
+batches, verifies each one in full and switches branches.
+
+Chain work is the sum over block hashes of 16 ** (leading zero hex digits),
+the expected number of hashes needed to find them. Equal work goes to the
+lower tip hash, so every node settles on the same branch.
+"""
+
+import asyncio
+import itertools
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+import runtime
+from blockchain import Block, Blockchain, Transaction, merkle_root
+
+PEER_MESSAGES = {"PEER_HELLO", "GOSSIP_TXS", "GOSSIP_BLOCK", "GET_HEADERS", "HEADERS", "GET_BLOCKS", "BLOCKS"}
+MAX_HEADERS = 500  # Headers per HEADERS reply
+MAX_BLOCKS_PER_REQUEST = 20  # Blocks per BLOCKS reply
+MAX_MESSAGE_BYTES = 16 * 2**20  # Websocket frame limit on peer links (BLOCKS replies are large)
+REQUEST_TIMEOUT = 10.0  # seconds
+RECONNECT_DELAY = 2.0  # seconds between attempts to reach a peer
+
+# Field types peers must send; anything else is rejected before it reaches the chain or the mempool
+TX_FIELD_TYPES = {"tx_id": str, "sender": str, "receiver": str, "amount": (int, float),
+                  "timestamp": (int, float), "type": str}
+BLOCK_FIELD_TYPES = {"index": int, "timestamp": (int, float), "transactions": list, "previous_hash": str,
+                     "nonce": int, "hash": str, "merkle_root": str}
+HEADER_FIELD_TYPES = {k: v for k, v in BLOCK_FIELD_TYPES.items() if k != "transactions"}
+
+
+def block_work(block_hash: str) -> int:
+    return 16 ** (len(block_hash) - len(block_hash.lstrip("0")))
+
+
+def chain_work(hashes: Iterable[str]) -> int:
+    return sum(block_work(h) for h in hashes)
+
+
+def better_branch(theirs: List[str], ours: List[str]) -> bool:
+    """Whether the branch with block hashes `theirs` beats `ours` (both after the same fork point)."""
+    work_theirs, work_ours = chain_work(theirs), chain_work(ours)
+    if work_theirs != work_ours:
+        return work_theirs > work_ours
+    return bool(theirs) and (not ours or theirs[-1] < ours[-1])
+
+
+def block_header(block: Block) -> Dict[str, Any]:
+    return {
+        "index": block.index,
+        "timestamp": block.timestamp,
+        "previous_hash": block.previous_hash,
+        "nonce": block.nonce,
+        "hash": block.hash,
+        "merkle_root": block.merkle_root,
+    }
+
+
+def block_locator(chain: List[Block]) -> List[List[Any]]:
+    """[height, hash] pairs from the tip back to genesis: the last 10 blocks, then every 2nd, 4th, 8th..."""
+    locator, height, step = [], len(chain) - 1, 1
+    while height > 0:
+        locator.append([height, chain[height].hash])
+        if len(locator) >= 10:
+            step *= 2
+        height -= step
+    locator.append([0, chain[0].hash])
+    return locator
+
+
+def find_fork(chain: List[Block], locator: List[List[Any]]) -> int:
+    """Height of the first locator entry on `chain`, or -1 (no common genesis). Raises ValueError on a malformed locator."""
+    try:
+        entries = [(int(height), str(block_hash)) for height, block_hash in locator]
+    except (TypeError, ValueError):
+        raise ValueError("'locator' must be a list of [height, hash] pairs")
+    for height, block_hash in entries:
+        if 0 <= height < len(chain) and chain[height].hash == block_hash:
+            return height
+    return -1
+
+
+def _check_fields(data: Any, field_types: Dict[str, Any], what: str):
+    if not isinstance(data, dict):
+        raise ValueError(f"{what} must be an object")
+    for key, types in field_types.items():
+        if not isinstance(data.get(key), types) or isinstance(data.get(key), bool):
+            raise ValueError(f"{what} field '{key}' is missing or has the wrong type")
+
+
+def parse_transaction(data: Any) -> Transaction:
+    """Transaction from a peer, with field types and tx_id checked. Raises ValueError."""
+    _check_fields(data, TX_FIELD_TYPES, "transaction")
+    analysis = data.get("fraud_analysis")
+    if not isinstance(analysis, (dict, type(None))) or not isinstance((analysis or {}).get("risk_level"), (str, type(None))):
+        raise ValueError("transaction field 'fraud_analysis' must be an object with a string risk_level")
+    return Transaction.from_dict(data)
+
+
+def parse_block(data: Any) -> Block:
+    """Block from a peer, with field types and every transaction checked (not its hashes). Raises ValueError."""
+    _check_fields(data, BLOCK_FIELD_TYPES, "block")
+    if data["index"] < 1:
+        raise ValueError("peers cannot send the genesis block")
+    for tx in data["transactions"]:
+        parse_transaction(tx)
+    return Block(**{key: data[key] for key in BLOCK_FIELD_TYPES})
+
+
+def parse_headers(data: Any) -> List[Dict[str, Any]]:
+    """A HEADERS page from a peer, with every header's field types checked. Raises ValueError."""
+    if not isinstance(data, list):
+        raise ValueError("'headers' must be a list")
+    for header in data:
+        _check_fields(header, HEADER_FIELD_TYPES, "header")
+    return data
+
+
+def check_headers(headers: List[Dict[str, Any]], parent: Block, difficulty: int) -> Optional[str]:
+    """Why a header chain cannot follow `parent`, or None. Hashes cover the bodies, so those are checked later."""
+    previous_index, previous_hash = parent.index, parent.hash
+    for header in headers:
+        if header["index"] != previous_index + 1:
+            return f"header {header['index']} does not follow {previous_index}"
+        if header["previous_hash"] != previous_hash:
+            return f"header {header['index']} does not link to the previous block"
+        if not header["hash"].startswith("0" * difficulty):
+            return f"header {header['index']} lacks proof of work"
+        previous_index, previous_hash = header["index"], header["hash"]
+    return None
+
+
+def check_block(block: Block, difficulty: int) -> Optional[str]:
+    """Why a full block (from parse_block) is invalid on its own (hash, proof of work, Merkle root), or None."""
+    if block.calculate_hash() != block.hash:
+        return "hash does not match block data"
+    if not block.hash.startswith("0" * difficulty):
+        return "lacks proof of work"
+    if not block.merkle_root or merkle_root(block.transactions) != block.merkle_root:
+        return "Merkle root missing or does not match transactions"
+    return None
+
+
+class Peer:
+    """One peer connection (opened by either side), with replies matched to requests."""
+
+    def __init__(self, websocket, url: Optional[str] = None):
+        self.websocket = websocket
+        self.url = url  # Set for connections this node opened (--peers)
+        self.node_id: Optional[str] = None
+        self.height = 0
+        self.tip_hash = ""
+        self.work = 0
+        self._requests = itertools.count(1)
+        self._replies: Dict[int, asyncio.Future] = {}
+
+    @property
+    def name(self) -> str:
+        return self.node_id or self.url or str(id(self.websocket))
+
+    def update(self, hello: Dict[str, Any]):
+        self.node_id = str(hello.get("node_id"))
+        self.height = int(hello.get("height", 0))
+        self.tip_hash = str(hello.get("tip_hash", ""))
+        self.work = int(hello.get("work", 0))
+
+    async def send(self, message: Dict[str, Any]):
+        await self.websocket.send(runtime.dumps(message))
+
+    async def request(self, message: Dict[str, Any], timeout: float = REQUEST_TIMEOUT) -> Dict[str, Any]:
+        request_id = next(self._requests)
+        reply = self._replies[request_id] = asyncio.get_running_loop().create_future()
+        try:
+            await self.send({**message, "request_id": request_id})
+            return await asyncio.wait_for(reply, timeout)
+        finally:
+            self._replies.pop(request_id, None)
+
+    def resolve(self, data: Dict[str, Any]) -> bool:
+        """Hands a HEADERS / BLOCKS reply to the request waiting for it."""
+        reply = self._replies.get(data.get("reply_to"))
+        if reply is None or reply.done():
+            return False
+        reply.set_result(data)
+        return True
+
+    def close(self):
+        for reply in self._replies.values():
+            reply.cancel()
+
+
+def headers_reply(blockchain: Blockchain, data: Dict[str, Any]) -> Dict[str, Any]:
+    """HEADERS for a GET_HEADERS request. Raises ValueError on a bad locator."""
+    chain = blockchain.chain
+    fork = find_fork(chain, data.get("locator") or [])
+    headers = [block_header(block) for block in chain[fork + 1:fork + 1 + MAX_HEADERS]] if fork >= 0 else []
+    return {"type": "HEADERS", "reply_to": data.get("request_id"), "fork_height": fork, "headers": headers}
+
+
+def blocks_reply(blockchain: Blockchain, data: Dict[str, Any]) -> Dict[str, Any]:
+    """BLOCKS for a GET_BLOCKS request. Raises ValueError on a bad range."""
+    try:
+        start, count = int(data["start"]), int(data["count"])
+    except (KeyError, TypeError, ValueError):
+        raise ValueError("'start' and 'count' must be integers")
+    if start < 1 or not 1 <= count <= MAX_BLOCKS_PER_REQUEST:
+        raise ValueError(f"'start' must be at least 1 and 'count' between 1 and {MAX_BLOCKS_PER_REQUEST}")
+    blocks = [{**block_header(block), "transactions": blockchain.get_block_transactions(block.index)}
+              for block in blockchain.chain[start:start + count]]
+    return {"type": "BLOCKS", "reply_to": data.get("request_id"), "blocks": blocks}
+
+
+async def fetch_branch(peer: Peer, blockchain: Blockchain) -> Optional[Tuple[int, List[Block]]]:
+    """
+    Headers-first download of the peer's branch where it beats ours:
+    (fork height, verified blocks to switch to), or None when ours is at
+    least as good. Raises ValueError when the peer sends anything invalid.
+    """
+    chain = blockchain.chain
+    locator = block_locator(chain)
+    headers: List[Dict[str, Any]] = []
+    fork_height = None
+    while True:
+        reply = await peer.request({"type": "GET_HEADERS", "locator": locator})
+        if fork_height is None:
+            fork_height = reply.get("fork_height")
+            if not isinstance(fork_height, int) or isinstance(fork_height, bool):
+                raise ValueError("'fork_height' must be an integer")
+            if not 0 <= fork_height < len(chain):
+                raise ValueError("no common genesis block")
+        page = parse_headers(reply.get("headers"))
+        headers.extend(page)
+        if len(page) < MAX_HEADERS:
+            break
+        locator = [[page[-1]["index"], page[-1]["hash"]]]
+
+    parent = chain[fork_height]
+    reason = check_headers(headers, parent, blockchain.difficulty)
+    if reason:
+        raise ValueError(reason)
+    if not better_branch([h["hash"] for h in headers], [block.hash for block in chain[fork_height + 1:]]):
+        return None
+
+    blocks = []
+    for start in range(0, len(headers), MAX_BLOCKS_PER_REQUEST):
+        batch = headers[start:start + MAX_BLOCKS_PER_REQUEST]
+        reply = await peer.request({"type": "GET_BLOCKS", "start": batch[0]["index"], "count": len(batch)})
+        if not isinstance(reply.get("blocks"), list) or len(reply["blocks"]) != len(batch):
+            raise ValueError("peer no longer has the announced blocks")
+        for header, data in zip(batch, reply["blocks"]):
+            block = parse_block(data)
+            reason = check_block(block, blockchain.difficulty)
+            if reason or block.hash != header["hash"]:
+                raise ValueError(f"block {header['index']}: {reason or 'does not match its header'}")
+            blocks.append(block)
+    return fork_height, blocks
@@ -1,3 +1,4 @@
+import argparse
 import asyncio
 import websockets
 import json
@@ -111,10 +112,18 @@ def print_stats_bar():
     secs = int(uptime % 60)
     print(f"\n{Fore.WHITE}{Style.DIM}  📊 Received: {rx_stats['total_tx']} txs | {rx_stats['total_blocks']} blocks | 🚨 {rx_stats['fraud_alerts']} alerts | 💰 ${rx_stats['total_volume']:,.2f} volume | ⏱ {mins}m {secs}s{Style.RESET_ALL}")
 
-async def receiver_loop():
+def build_subscription(args):
+    events = ["blocks"] if args.blocks_only else ["transactions", "blocks"]
+    subscription = {"type": "SUBSCRIBE", "events": events, "min_risk": args.min_risk}
+    if args.accounts:
+        subscription["accounts"] = args.accounts
+    return subscription
+
+async def receiver_loop(args):
     uri = "ws://localhost:8765"
     try:
         async with websockets.connect(uri) as websocket:
+            await websocket.send(json.dumps(build_subscription(args)))
             clear()
             print_banner()
             print(f"{Fore.GREEN}{Style.BRIGHT}🔗 Connected! Listening for events...{Style.RESET_ALL}\n")
@@ -124,14 +133,22 @@ async def receiver_loop():
                 data = json.loads(message)
                 msg_type = data.get("type")
 
-                if msg_type == "NEW_TRANSACTION":
-                    print_transaction(data.get("transaction", {}))
+                if msg_type == "NEW_TRANSACTIONS":
+                    for tx in data.get("transactions", []):
+                        print_transaction(tx)
                     print_stats_bar()
 
                 elif msg_type == "NEW_BLOCK":
                     print_block(data.get("block", {}))
                     print_stats_bar()
 
+                elif msg_type == "SUBSCRIBED":
+                    accounts = ', '.join(data.get('accounts', [])) or 'all'
+                    print(f"{Fore.WHITE}{Style.DIM}  Subscribed: {', '.join(data.get('events', []))} | min risk {data.get('min_risk')} | accounts: {accounts}{Style.RESET_ALL}\n")
+
+                elif msg_type == "ERROR":
+                    print(f"{Fore.RED}❌ {data.get('message')}{Style.RESET_ALL}")
+
                 elif msg_type == "WELCOME":
                     pass  # Already handled
 
@@ -146,8 +163,15 @@ async def receiver_loop():
         print(f"\n{Fore.RED}🔌 Connection lost.{Style.RESET_ALL}")
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Live blockchain event stream")
+    parser.add_argument("--min-risk", default="LOW", choices=["LOW", "MEDIUM", "HIGH"],
+                        help="Only show transactions at or above this risk level")
+    parser.add_argument("--accounts", nargs="+", metavar="ACCOUNT",
+                        help="Only show transactions sent or received by these accounts")
+    parser.add_argument("--blocks-only", action="store_true", help="Only show mined blocks")
+    args = parser.parse_args()
     try:
-        asyncio.run(receiver_loop())
+        asyncio.run(receiver_loop(args))
     except KeyboardInterrupt:
         print(f"\n{Fore.RED}Receiver terminated.{Style.RESET_ALL}")
         sys.exit(0)
@@ -0,0 +1,282 @@
+"""
+Offline bulk re-scoring of historical transactions.
+
+Runs the fraud engine (rules + the current model) over a PaySim CSV or a
+chain dump in large vectorized chunks, spread over a process pool, and
+writes the results as columns:
+
+    <output>/<column>.bin   one raw array per column
+    <output>/meta.json      row count, column dtypes, risk level names, run info
+
+CSV chunks are read by the workers straight from the memory-mapped columnar
+cache (see dataset.py), so only the scores travel back to the parent. Chain
+sources are streamed: blocks are read one at a time, cut into chunks as
+they arrive, and only TASKS_PER_WORKER chunks per worker are in flight, so
+the parent's memory stays flat however long the chain is. Every worker
+memory-maps the same model file.
+
+    python rescore.py --csv data/output_1_to_10.csv --output rescored/
+    python rescore.py --chain chain.json --output rescored_chain/
+    python rescore.py --server ws://localhost:8765 --output rescored_chain/
+    python rescore.py --store chain_data/ --output rescored_chain/
+
+    from rescore import load_scores
+    df = load_scores("rescored/")
+"""
+
+import argparse
+import asyncio
+import json
+import logging
+import os
+import shutil
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Dict, Iterable, Iterator, List, Optional
+
+import numpy as np
+import pandas as pd
+
+from block_store import BlockStore
+from dataset import open_cache
+from fraud_engine import RISK_LEVELS, FraudDetectionEngine
+from features import RAW_COLUMNS
+
+CHUNK_ROWS = 50_000  # Rows per task; bounds the tree walker's working memory per worker
+TASKS_PER_WORKER = 2  # Chunks in flight per worker; the parent holds no more than this many at once
+PROGRESS_INTERVAL = 5.0  # seconds between progress lines
+OUTPUT_VERSION = 1
+
+# Columns written for every source; chain sources add block, tx_id and timestamp
+SCORE_COLUMNS = {"score": "float64", "rule_score": "float32", "ml_score": "float32", "risk_level": "int8"}
+CHAIN_COLUMNS = {"block": "int32", "tx_id": "S64", "timestamp": "float64"}
+
+# Per-worker state, set by _init_worker
+_engine = _cache = _merchant_names = None
+
+
+def _init_worker(use_student: bool, csv_path: Optional[str] = None):
+    global _engine, _cache, _merchant_names
+    logging.getLogger("FraudEngine").setLevel(logging.WARNING)
+    _engine = FraudDetectionEngine(use_student=use_student)
+    if csv_path:
+        _cache = open_cache(csv_path)
+        # Sender names are dictionary codes; flag merchant names once, not once per row
+        _merchant_names = np.char.startswith(np.asarray(_cache.names), "M")
+
+
+def _score_csv_range(start: int, stop: int) -> Dict[str, np.ndarray]:
+    raw = _cache.to_frame(list(RAW_COLUMNS), start, stop)
+    merchant = _merchant_names[_cache.codes("nameOrig")[start:stop]]
+    return _engine.evaluate_frame(raw, merchant)
+
+
+def _score_chain_chunk(chunk: Dict[str, np.ndarray]) -> Dict[str, np.ndarray]:
+    raw = pd.DataFrame({c: chunk[c] for c in RAW_COLUMNS})
+    result = _engine.evaluate_frame(raw, chunk["merchant_sender"])
+    result.update({c: chunk[c] for c in CHAIN_COLUMNS})
+    return result
+
+
+def read_chain(chain_path: Optional[str] = None, server: Optional[str] = None,
+               store_dir: Optional[str] = None) -> Iterable[Dict[str, Any]]:
+    """
+    Blocks from a chain dump (a GET_CHAIN reply or Blockchain.to_list() JSON),
+    a live node or a block store. Store blocks are read lazily, one at a time.
+    """
+    if server:
+        return asyncio.run(_fetch_chain(server))
+    if store_dir:
+        return _stream_store(store_dir)
+    with open(chain_path) as f:
+        data = json.load(f)
+    return data["chain"] if isinstance(data, dict) else data
+
+
+def _stream_store(store_dir: str) -> Iterator[Dict[str, Any]]:
+    store = BlockStore(store_dir, readonly=True)
+    try:
+        yield from store.iter_blocks()
+    finally:
+        store.close()
+
+
+async def _fetch_chain(uri: str) -> List[Dict[str, Any]]:
+    import websockets
+    async with websockets.connect(uri, max_size=None) as websocket:
+        await websocket.send(json.dumps({"type": "GET_CHAIN"}))
+        async for message in websocket:
+            data = json.loads(message)
+            if data.get("type") == "CHAIN_DATA":
+                if any(block["transactions"] is None for block in data["chain"]):
+                    raise ValueError(f"{uri} prunes old blocks: rescore with --store on its data directory")
+                return data["chain"]
+    raise ConnectionError(f"{uri} closed before sending the chain")
+
+
+def chain_chunks(blocks: Iterable[Dict[str, Any]], chunk_rows: int) -> Iterator[Dict[str, np.ndarray]]:
+    """
+    Raw feature columns for every transaction in `blocks`, mapped the way the
+    server maps a live transaction (features.FeaturePipeline._raw_values).
+    Consumes `blocks` lazily and holds at most one chunk of rows at a time.
+    """
+    part = []
+    for block in blocks:
+        for tx in block["transactions"]:
+            part.append((block["index"], tx))
+            if len(part) == chunk_rows:
+                yield _chain_chunk(part)
+                part = []
+    if part:
+        yield _chain_chunk(part)
+
+
+def _chain_chunk(part: List[Any]) -> Dict[str, np.ndarray]:
+    txs = [tx for _, tx in part]
+    amount = np.array([float(tx.get("amount", 0.0)) for tx in txs])
+    old_org = np.array([float(tx.get("sender_balance", 0.0)) for tx in txs])
+    old_dest = np.array([float(tx.get("receiver_balance", 0.0)) for tx in txs])
+    return {
+        "type": pd.Series([tx.get("type", "PAYMENT") for tx in txs]),
+        "amount": amount,
+        "oldbalanceOrg": old_org,
+        "newbalanceOrig": old_org - amount,
+        "oldbalanceDest": old_dest,
+        "newbalanceDest": old_dest + amount,
+        "step": np.array([float(tx.get("step", 0)) for tx in txs]),
+        "merchant_sender": np.array([str(tx.get("sender", "")).startswith("M") for tx in txs]),
+        "block": np.array([index for index, _ in part], dtype=CHAIN_COLUMNS["block"]),
+        "tx_id": np.array([tx.get("tx_id", "") for tx in txs], dtype=CHAIN_COLUMNS["tx_id"]),
+        "timestamp": np.array([float(tx.get("timestamp", 0.0)) for tx in txs]),
+    }
+
+
+def _ordered_results(pool, score, tasks: Iterable[tuple], window: int) -> Iterator[Dict[str, np.ndarray]]:
+    """score(*task) for each task, in task order, with at most `window` tasks submitted and not yet consumed."""
+    if pool is None:
+        for task in tasks:
+            yield score(*task)
+        return
+    pending = deque()
+    for task in tasks:
+        pending.append(pool.submit(score, *task))
+        if len(pending) >= window:
+            yield pending.popleft().result()
+    while pending:
+        yield pending.popleft().result()
+
+
+def rescore(output: str, csv_path: Optional[str] = None, blocks: Optional[Iterable[Dict[str, Any]]] = None,
+            workers: Optional[int] = None, chunk_rows: int = CHUNK_ROWS, use_student: bool = False):
+    pool_size = workers or os.cpu_count() or 1
+    columns = dict(SCORE_COLUMNS)
+    block_count = 0
+
+    def counted(blocks):
+        nonlocal block_count
+        for block in blocks:
+            block_count += 1
+            yield block
+
+    if csv_path:
+        total = open_cache(csv_path).rows
+        tasks = ((start, min(start + chunk_rows, total)) for start in range(0, total, chunk_rows))
+        score, initargs = _score_csv_range, (use_student, csv_path)
+        source = os.path.basename(csv_path)
+        print(f"🔁 Re-scoring {total:,} transactions from {source} on {pool_size} worker(s)...")
+    else:
+        total = None  # Streamed: not known until the last block
+        tasks = ((chunk,) for chunk in chain_chunks(counted(blocks), chunk_rows))
+        score, initargs = _score_chain_chunk, (use_student,)
+        columns.update(CHAIN_COLUMNS)
+        print(f"🔁 Re-scoring chain transactions on {pool_size} worker(s)...")
+
+    building = output.rstrip("/\\") + ".tmp"
+    shutil.rmtree(building, ignore_errors=True)
+    os.makedirs(building)
+    files = {c: open(os.path.join(building, f"{c}.bin"), "wb") for c in columns}
+    risk_counts = np.zeros(len(RISK_LEVELS), dtype=np.int64)
+    done = 0
+    started = last_progress = time.perf_counter()
+    pool = ProcessPoolExecutor(pool_size, initializer=_init_worker, initargs=initargs) if pool_size > 1 else None
+    if pool is None:
+        _init_worker(*initargs)
+    try:
+        # Results come back in submission order, so the columns are written in row order
+        for result in _ordered_results(pool, score, tasks, pool_size * TASKS_PER_WORKER):
+            for column, dtype in columns.items():
+                np.ascontiguousarray(result[column], dtype=dtype).tofile(files[column])
+            risk_counts += np.bincount(result["risk_level"], minlength=len(RISK_LEVELS))
+            done += len(result["score"])
+            now = time.perf_counter()
+            if now - last_progress >= PROGRESS_INTERVAL:
+                last_progress = now
+                print(f"   ⏳ {done:,}{f'/{total:,}' if total else ''} rows ({done / (now - started):,.0f} rows/sec)")
+    finally:
+        for f in files.values():
+            f.close()
+        if pool:
+            pool.shutdown(cancel_futures=True)
+    if not csv_path:
+        source = f"chain ({block_count:,} blocks)"
+
+    elapsed = time.perf_counter() - started
+    rows_per_sec = done / elapsed if elapsed else 0.0
+    meta = {
+        "version": OUTPUT_VERSION,
+        "source": source,
+        "rows": done,
+        "columns": columns,
+        "risk_levels": RISK_LEVELS,
+        "model": "student" if use_student else "default",
+        "workers": pool_size,
+        "seconds": round(elapsed, 3),
+        "rows_per_sec": round(rows_per_sec, 1),
+    }
+    with open(os.path.join(building, "meta.json"), "w") as f:
+        json.dump(meta, f, indent=2)
+    shutil.rmtree(output, ignore_errors=True)
+    os.replace(building, output)
+
+    print(f"\n✅ Re-scored {done:,} rows in {elapsed:.1f}s ({rows_per_sec:,.0f} rows/sec) -> {output}")
+    for level, count in zip(RISK_LEVELS, risk_counts):
+        print(f"   {level:<7} {count:>12,} ({count / max(done, 1) * 100:.2f}%)")
+    return meta
+
+
+def load_scores(output: str) -> pd.DataFrame:
+    """Reads a rescore output directory back as a DataFrame (risk_level as a Categorical)."""
+    with open(os.path.join(output, "meta.json")) as f:
+        meta = json.load(f)
+    frame = {}
+    for column, dtype in meta["columns"].items():
+        values = np.fromfile(os.path.join(output, f"{column}.bin"), dtype=dtype)
+        if column == "risk_level":
+            values = pd.Categorical.from_codes(values, meta["risk_levels"])
+        elif column == "tx_id":
+            values = values.astype(str)
+        frame[column] = values
+    return pd.DataFrame(frame)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Re-score historical transactions with the current model")
+    source = parser.add_mutually_exclusive_group(required=True)
+    source.add_argument("--csv", help="PaySim-style transaction CSV")
+    source.add_argument("--chain", help="Chain dump: GET_CHAIN reply or Blockchain.to_list() as JSON")
+    source.add_argument("--server", help="Fetch the chain from a running node, e.g. ws://localhost:8765")
+    source.add_argument("--store", help="Read the chain from a node's --data-dir")
+    parser.add_argument("--output", required=True, help="Output directory for the score columns")
+    parser.add_argument("--workers", type=int, help="Worker processes (default: CPU count)")
+    parser.add_argument("--chunk-rows", type=int, default=CHUNK_ROWS, help="Rows scored per task")
+    parser.add_argument("--student", action="store_true", help="Score with the distilled student model")
+    args = parser.parse_args()
+
+    if args.csv:
+        rescore(args.output, csv_path=args.csv, workers=args.workers, chunk_rows=args.chunk_rows,
+                use_student=args.student)
+    else:
+        blocks = read_chain(args.chain, args.server, args.store)
+        rescore(args.output, blocks=blocks, workers=args.workers, chunk_rows=args.chunk_rows,
+                use_student=args.student)
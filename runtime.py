@@ -0,0 +1,78 @@
+"""
+Server runtime profiles: the event loop the node runs on and the JSON codec
+for websocket frames.
+
+    default      asyncio's own loop and the stdlib json module
+    performance  uvloop and orjson where installed (each falls back to the default on its own)
+
+Only frames go through the codec. Block and transaction hashes keep using
+json.dumps(sort_keys=True), so hashes do not depend on the profile.
+
+    import runtime
+    runtime.use_profile("performance")
+    runtime.run(main())
+    payload = runtime.dumps(message)
+"""
+
+import asyncio
+import json
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import uvloop
+except ImportError:
+    uvloop = None  # Not available on Windows
+
+PROFILES = ("default", "performance")
+
+# Active profile, set by use_profile
+profile = "default"
+loop_name = "asyncio"
+codec_name = "json"
+dumps = json.dumps
+loads = json.loads
+
+
+def _orjson_default(obj):
+    if hasattr(obj, "item"):  # NumPy scalars (e.g. ML scores)
+        return obj.item()
+    raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
+
+
+def _orjson_dumps(obj) -> str:
+    # Text, not bytes: websockets sends str as text frames, which every client expects
+    return orjson.dumps(obj, default=_orjson_default,
+                        option=orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY).decode()
+
+
+def use_profile(name: str):
+    global profile, loop_name, codec_name, dumps, loads
+    if name not in PROFILES:
+        raise ValueError(f"Unknown runtime profile: {name}")
+    fast = name == "performance"
+    profile = name
+    loop_name = "uvloop" if fast and uvloop else "asyncio"
+    if fast and orjson:
+        codec_name, dumps, loads = "orjson", _orjson_dumps, orjson.loads
+    else:
+        codec_name, dumps, loads = "json", json.dumps, json.loads
+
+
+def describe() -> str:
+    """One line for the startup banner, naming what the profile wanted but could not get."""
+    text = f"{profile}: {loop_name} + {codec_name}"
+    missing = [package for package, module in (("uvloop", uvloop), ("orjson", orjson)) if not module]
+    if profile == "performance" and missing:
+        text += f" (no {', '.join(missing)})"
+    return text
+
+
+def run(main):
+    """asyncio.run on the profile's event loop."""
+    if loop_name == "uvloop":
+        asyncio.set_event_loop_policy(uvloop.EventLoopPolicy())
+    return asyncio.run(main)
@@ -8,6 +8,9 @@ from colorama import init, Fore, Back, Style
 
 init(autoreset=True)
 
+# Transactions per ADD_TRANSACTIONS frame in stress test mode
+STRESS_BATCH_SIZE = 50
+
 def clear():
     os.system('cls' if os.name == 'nt' else 'clear')
 
@@ -143,18 +146,22 @@ async def sender_loop():
                             count = int(input(f"  {Fore.WHITE}How many? : {Style.RESET_ALL}") or "20")
                         except ValueError:
                             count = 20
-                        print(f"\n{Fore.YELLOW}{Style.BRIGHT}⚡ STRESS TEST: {count} transactions...{Style.RESET_ALL}")
-                        for i in range(count):
-                            tx_data = {
-                                "sender": f"C{random.randint(100000000, 999999999)}",
-                                "receiver": f"C{random.randint(100000000, 999999999)}",
-                                "amount": round(random.uniform(10, 100000), 2),
-                                "type": random.choice(["PAYMENT", "TRANSFER", "CASH_OUT"]),
-                                "timestamp": time.time()
-                            }
+                        print(f"\n{Fore.YELLOW}{Style.BRIGHT}⚡ STRESS TEST: {count} transactions in batches of {STRESS_BATCH_SIZE}...{Style.RESET_ALL}")
+                        sent = 0
+                        while sent < count:
+                            batch = []
+                            for _ in range(min(STRESS_BATCH_SIZE, count - sent)):
+                                batch.append({
+                                    "sender": f"C{random.randint(100000000, 999999999)}",
+                                    "receiver": f"C{random.randint(100000000, 999999999)}",
+                                    "amount": round(random.uniform(10, 100000), 2),
+                                    "type": random.choice(["PAYMENT", "TRANSFER", "CASH_OUT"]),
+                                    "timestamp": time.time()
+                                })
                             try:
-                                await websocket.send(json.dumps({"type": "ADD_TRANSACTION", "transaction": tx_data}))
-                                print(f"  {Fore.GREEN}⚡ [{i+1}/{count}]{Style.RESET_ALL} ${tx_data['amount']:,.2f}")
+                                await websocket.send(json.dumps({"type": "ADD_TRANSACTIONS", "transactions": batch}))
+                                sent += len(batch)
+                                print(f"  {Fore.GREEN}⚡ [{sent}/{count}]{Style.RESET_ALL} {len(batch)} tx(s) ${sum(tx['amount'] for tx in batch):,.2f}")
                             except websockets.exceptions.ConnectionClosed:
                                 print(f"\n{Fore.RED}❌ Connection lost.{Style.RESET_ALL}")
                                 return
@@ -1,11 +1,28 @@
+import argparse
 import asyncio
+import hmac
 import json
+import os
+import random
 import time
 import logging
+import uuid
 import websockets
+import runtime
 from colorama import init, Fore, Back, Style
 from blockchain import Blockchain, Transaction, Block
+from block_store import BlockStore, write_snapshot
+from admission import AdmissionControl
+from chain_audit import audit_chain
+from peers import (PEER_MESSAGES, MAX_MESSAGE_BYTES, RECONNECT_DELAY, Peer, better_branch, block_header,
+                   blocks_reply, chain_work, check_block, fetch_branch, headers_reply, parse_block, parse_transaction)
+from chain_index import parse_history_query
+from chain_query import parse_tx_query, run_query
 from fraud_engine import FraudDetectionEngine
+from sharding import ShardedScorer
+from subscriptions import Subscription, SubscriptionIndex, parse_subscription
+from metrics import LiveStats, StageTimings, render_prometheus
+from structured_log import log_event, setup_structured_logging
 
 init(autoreset=True)
 
@@ -13,20 +30,55 @@ init(autoreset=True)
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
 logger = logging.getLogger("Server")
 
+# Per-stage latency histograms (GET_METRICS / Prometheus listener)
+stage_timings = StageTimings()
+
 # Initialize core components
 blockchain = Blockchain()
-fraud_engine = FraudDetectionEngine()
+fraud_engine = None  # Scores on the event loop; not loaded when a ShardedScorer does the scoring
+scorer = None  # ShardedScorer with --score-workers
 
 # Connected clients
 connected = set()
 
-# Stats
-stats = {
-    "total_tx": 0,
-    "total_blocks": 1,  # genesis
-    "fraud_detected": 0,
-    "start_time": time.time()
-}
+# Upper bound on transactions accepted in a single ADD_TRANSACTIONS frame
+MAX_BATCH_SIZE = 1000
+
+# Admission control (see admission.py): floods get RETRY_AFTER instead of queueing up for scoring
+CONNECTION_RATE_LIMIT = 2000  # transactions per second per connection
+ACCOUNT_RATE_LIMIT = 20  # transactions per second per sender account
+MAX_SCORING = 4 * MAX_BATCH_SIZE  # transactions being scored at once, across all connections
+admission = AdmissionControl(CONNECTION_RATE_LIMIT, ACCOUNT_RATE_LIMIT, MAX_SCORING)
+
+# What each client wants to receive (event types, risk threshold, accounts)
+subscriptions = SubscriptionIndex()
+
+# Transaction events waiting for the next coalesced NEW_TRANSACTIONS frame
+pending_tx_events = []
+BROADCAST_FLUSH_INTERVAL = 0.05  # seconds
+BROADCAST_FLUSH_MAX_EVENTS = 200
+
+# Stats (running aggregates, updated on every transaction and block)
+stats = LiveStats(genesis_block=blockchain.get_latest_block())
+STATS_PUSH_INTERVAL = 1.0  # seconds between STATS_UPDATE pushes to subscribed dashboards
+
+# Persistence (see --data-dir): blocks on disk, snapshot of headers + indexes every SNAPSHOT_EVERY blocks
+SNAPSHOT_EVERY = 100
+
+# Replication (see --peers and peers.py)
+HOST, PORT = "localhost", 8765
+NODE_ID = uuid.uuid4().hex[:12]
+PEER_URLS = []
+PEER_SECRET = os.environ.get("PEER_SECRET", "")  # Inbound peers must present it in PEER_HELLO (see --peer-secret)
+peers = {}  # websocket -> Peer, for links opened by either side
+sync_lock = asyncio.Lock()  # One branch download at a time
+MINE_INTERVAL = 10.0  # seconds between mining rounds (0 = never mine, only follow peers)
+
+# Console output (see --headless): colorama boxes, or sampled JSON lines plus a periodic summary
+HEADLESS = False
+TX_LOG_SAMPLE_RATE = 0.01  # fraction of non-HIGH-risk transactions logged in headless mode
+SUMMARY_INTERVAL = 10.0  # seconds between headless summary lines
+event_log = logging.getLogger("Server.events")
 
 def print_banner():
     print(f"""
@@ -34,11 +86,13 @@ def print_banner():
 ║          🏗️  BLOCKCHAIN SERVER — NODE ACTIVE                ║
 ║          SHA-256 Proof-of-Work Consensus Engine              ║
 ╠══════════════════════════════════════════════════════════════╣
-║  Protocol  : WebSocket (ws://localhost:8765)                 ║
+║  Protocol  : {f"WebSocket (ws://{HOST}:{PORT})":<48}║
 ║  Hashing   : SHA-256                                         ║
 ║  Difficulty : {blockchain.difficulty} leading zeros                                 ║
-║  Mining     : Auto every 10 seconds                          ║
-║  Fraud AI   : {'ACTIVE' if fraud_engine.models_loaded else 'RULES ONLY'}                                     ║
+║  Mining     : {f"Auto every {MINE_INTERVAL:g} seconds" if MINE_INTERVAL > 0 else "Off (follows peers)":<47}║
+║  Fraud AI   : {'ACTIVE' if (scorer or fraud_engine).models_loaded else 'RULES ONLY'}                                     ║
+║  Runtime    : {runtime.describe():<47}║
+║  Limits     : {admission.describe():<47}║
 ╚══════════════════════════════════════════════════════════════╝{Style.RESET_ALL}
 """)
 
@@ -59,6 +113,18 @@ def print_tx_received(tx, analysis):
 │  {Fore.CYAN}Details  :{Style.RESET_ALL} {'; '.join(analysis.details) if analysis.details else 'No anomalies'}
 {Fore.WHITE}{Style.BRIGHT}└───────────────────────────────────────────────────────┘{Style.RESET_ALL}""")
 
+def print_batch_received(txs, analysis_results):
+    high = sum(1 for r in analysis_results if r.risk_level == "HIGH")
+    medium = sum(1 for r in analysis_results if r.risk_level == "MEDIUM")
+    low = len(analysis_results) - high - medium
+    total_amount = sum(tx.amount for tx in txs)
+    print(f"""
+{Fore.WHITE}{Style.BRIGHT}┌─────────────── 📦 BATCH RECEIVED ───────────────┐{Style.RESET_ALL}
+│  {Fore.CYAN}Transactions :{Style.RESET_ALL} {len(txs)}
+│  {Fore.CYAN}Volume       :{Style.RESET_ALL} {Fore.WHITE}{Style.BRIGHT}${total_amount:,.2f}{Style.RESET_ALL}
+│  {Fore.CYAN}Risk         :{Style.RESET_ALL} {Fore.GREEN}{low} LOW{Style.RESET_ALL} | {Fore.YELLOW}{medium} MEDIUM{Style.RESET_ALL} | {Fore.RED}{high} HIGH{Style.RESET_ALL}
+{Fore.WHITE}{Style.BRIGHT}└─────────────────────────────────────────────────┘{Style.RESET_ALL}""")
+
 def print_block_mined(block):
     print(f"""
 {Fore.GREEN}{Style.BRIGHT}╔═══════════════════ ⛏️  BLOCK MINED ═══════════════════╗{Style.RESET_ALL}
@@ -69,28 +135,175 @@ def print_block_mined(block):
 {Fore.GREEN}║{Style.RESET_ALL}  {Fore.YELLOW}Nonce         :{Style.RESET_ALL} {block.nonce}
 {Fore.GREEN}║{Style.RESET_ALL}  {Fore.YELLOW}Transactions  :{Style.RESET_ALL} {len(block.transactions)} tx(s)
 {Fore.GREEN}║{Style.RESET_ALL}  {Fore.YELLOW}Timestamp     :{Style.RESET_ALL} {time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(block.timestamp))}
-{Fore.GREEN}║{Style.RESET_ALL}  {Fore.YELLOW}Chain Valid   :{Style.RESET_ALL} {'✅ YES' if blockchain.is_chain_valid() else '❌ NO'}
+{Fore.GREEN}║{Style.RESET_ALL}  {Fore.YELLOW}Chain Valid   :{Style.RESET_ALL} {'✅ YES' if stats.chain_valid else '❌ NO'}
 {Fore.GREEN}{Style.BRIGHT}╚═══════════════════════════════════════════════════════╝{Style.RESET_ALL}""")
 
 
 
 
-async def broadcast(message):
-    """Broadcast message to all connected clients, removing dead connections."""
-    if not connected:
+def log_tx_received(tx, analysis):
+    """Headless per-transaction line: HIGH risk always, the rest sampled."""
+    if analysis.risk_level == "HIGH" or random.random() < TX_LOG_SAMPLE_RATE:
+        log_event(event_log, "tx_received",
+                  tx_id=tx.id, sender=tx.sender, receiver=tx.receiver, amount=tx.amount, tx_type=tx.type,
+                  score=analysis.score, risk_level=analysis.risk_level, decision=analysis.decision)
+
+def report_tx_received(tx, analysis):
+    if HEADLESS:
+        log_tx_received(tx, analysis)
+    else:
+        print_tx_received(tx, analysis)
+
+def report_batch_received(txs, analysis_results):
+    if HEADLESS:
+        for tx, analysis in zip(txs, analysis_results):
+            log_tx_received(tx, analysis)
+    else:
+        print_batch_received(txs, analysis_results)
+
+def report_block_mined(block):
+    if HEADLESS:
+        log_event(event_log, "block_mined",
+                  index=block.index, hash=block.hash, tx_count=len(block.transactions),
+                  nonce=block.nonce, chain_valid=stats.chain_valid)
+    else:
+        print_block_mined(block)
+
+async def log_summaries():
+    """Headless mode: one summary line every SUMMARY_INTERVAL seconds."""
+    while True:
+        await asyncio.sleep(SUMMARY_INTERVAL)
+        snapshot = current_stats()
+        log_event(event_log, "summary",
+                  total_tx=snapshot["total_tx"], tx_per_sec=round(snapshot["tx_per_sec"], 2),
+                  fraud_detected=snapshot["fraud_detected"], total_blocks=snapshot["total_blocks"],
+                  mempool_size=snapshot["mempool_size"], chain_valid=snapshot["chain_valid"],
+                  clients=len(connected), scoring_p99_ms=snapshot["scoring_latency"]["p99_ms"],
+                  throttled=snapshot["throttled"])
+
+
+async def send_to_clients(clients, message):
+    """Sends a message to the given clients, removing dead connections."""
+    if not clients:
         return
-    
+
+    payload = runtime.dumps(message)  # Serialize once, not once per client
     dead_connections = set()
-    for ws in connected:
+    for ws in list(clients):
         try:
-            await ws.send(json.dumps(message))
+            await ws.send(payload)
         except Exception as e:
             logger.warning(f"Failed to send to client: {e}")
             dead_connections.add(ws)
-    
+
     # Remove dead connections
     for ws in dead_connections:
         connected.discard(ws)
+        subscriptions.unsubscribe(ws)
+
+
+async def broadcast(message):
+    """Broadcast message to all connected clients, removing dead connections."""
+    await send_to_clients(connected, message)
+
+
+async def queue_transaction_event(tx):
+    """Queues a NEW_TRANSACTIONS event, flushing early once the batch is full."""
+    pending_tx_events.append(tx.to_dict())
+    if len(pending_tx_events) >= BROADCAST_FLUSH_MAX_EVENTS:
+        await flush_transaction_events()
+
+
+async def flush_transaction_events():
+    """Sends all queued transaction events as one frame per client."""
+    if not pending_tx_events:
+        return
+
+    events = pending_tx_events[:]
+    pending_tx_events.clear()
+
+    started = time.perf_counter()
+    try:
+        with stage_timings.span("broadcast_route"):
+            groups = subscriptions.route_transactions(events)
+        for clients, matched in groups:
+            await send_to_clients(clients, {
+                "type": "NEW_TRANSACTIONS",
+                "transactions": matched
+            })
+
+        if subscriptions.summary_clients:
+            risk_counts = {"LOW": 0, "MEDIUM": 0, "HIGH": 0}
+            for event in events:
+                risk = (event.get("fraud_analysis") or {}).get("risk_level")
+                if risk in risk_counts:
+                    risk_counts[risk] += 1
+            await send_to_clients(subscriptions.summary_clients, {
+                "type": "TRANSACTION_SUMMARY",
+                "count": len(events),
+                "volume": sum(event["amount"] for event in events),
+                "risk_counts": risk_counts,
+                "fraud_detected": risk_counts["HIGH"],
+                "mempool_size": len(blockchain.mempool)
+            })
+    except Exception as broadcast_error:
+        logger.warning(f"Broadcast failed (client may have disconnected): {broadcast_error}")
+    stage_timings.record("broadcast_flush", time.perf_counter() - started)
+
+
+async def broadcast_flusher():
+    """Flushes coalesced transaction events every BROADCAST_FLUSH_INTERVAL seconds."""
+    while True:
+        await asyncio.sleep(BROADCAST_FLUSH_INTERVAL)
+        await flush_transaction_events()
+
+
+def build_transaction(tx_data):
+    """Creates a Transaction from an incoming transaction payload."""
+    sender = tx_data.get("sender")
+    receiver = tx_data.get("receiver")
+    amount = float(tx_data.get("amount", 0))
+    tx_type = tx_data.get("type", "PAYMENT")
+    timestamp = tx_data.get("timestamp", time.time())
+    return Transaction(sender, receiver, amount, tx_type, timestamp)
+
+
+def attach_analysis(tx, analysis_result):
+    """Stores the fraud verdict on the transaction."""
+    tx.fraud_analysis = {
+        "score": analysis_result.score,
+        "risk_level": analysis_result.risk_level,
+        "decision": analysis_result.decision,
+        "details": analysis_result.details
+    }
+
+
+async def send_error(websocket, message):
+    """Sends an ERROR frame to a single client, ignoring closed connections."""
+    try:
+        await websocket.send(runtime.dumps({
+            "type": "ERROR",
+            "message": message
+        }))
+    except:
+        pass  # Client already disconnected
+
+
+async def send_retry_after(websocket, shed, count):
+    """Turns a frame away: counts its transactions as throttled and tells the client when to retry."""
+    stats.record_throttled(shed.reason, count)
+    message = {
+        "type": "RETRY_AFTER",
+        "reason": shed.reason,
+        "retry_after": round(shed.retry_after, 3),
+        "rejected": count,
+    }
+    if shed.account is not None:
+        message["account"] = shed.account
+    try:
+        await websocket.send(runtime.dumps(message))
+    except:
+        pass  # Client already disconnected
 
 
 async def handle_transaction(websocket, data):
@@ -99,86 +312,450 @@ async def handle_transaction(websocket, data):
         if not tx_data:
             return
 
-        sender = tx_data.get("sender")
-        receiver = tx_data.get("receiver")
-        amount = float(tx_data.get("amount", 0))
-        tx_type = tx_data.get("type", "PAYMENT")
-        timestamp = tx_data.get("timestamp", time.time())
+        with stage_timings.span("build_tx"):
+            tx = build_transaction(tx_data)
 
-        tx = Transaction(sender, receiver, amount, tx_type, timestamp)
+        shed = admission.admit(websocket, [tx.sender])
+        if shed:
+            await send_retry_after(websocket, shed, 1)
+            return
 
         # Fraud Analysis
-        analysis_result = fraud_engine.evaluate_transaction(tx_data)
-        tx.fraud_analysis = {
-            "score": analysis_result.score,
-            "risk_level": analysis_result.risk_level,
-            "decision": analysis_result.decision,
-            "details": analysis_result.details
-        }
+        started = time.perf_counter()
+        try:
+            if scorer is not None:
+                analysis_result = await scorer.evaluate_transaction(tx_data)
+                stage_timings.record("score_sharded", time.perf_counter() - started)
+            else:
+                analysis_result = fraud_engine.evaluate_transaction(tx_data)
+        finally:
+            admission.release(1)
+        stats.record_transactions([analysis_result], time.perf_counter() - started)
+        attach_analysis(tx, analysis_result)
 
         # Beautiful print
-        print_tx_received(tx, analysis_result)
-
-        stats["total_tx"] += 1
-        if analysis_result.risk_level == "HIGH":
-            stats["fraud_detected"] += 1
+        with stage_timings.span("print"):
+            report_tx_received(tx, analysis_result)
 
         # Add to Mempool
-        blockchain.mempool.append(tx)
+        with stage_timings.span("mempool"):
+            blockchain.add_transaction(tx)
+        await gossip({"type": "GOSSIP_TXS", "transactions": [tx.to_dict()]})
 
-        # Notify Clients
-        try:
-            await broadcast({
-                "type": "NEW_TRANSACTION",
-                "transaction": tx.to_dict()
-            })
-        except Exception as broadcast_error:
-            logger.warning(f"Broadcast failed (client may have disconnected): {broadcast_error}")
+        # Notify Clients (coalesced into the next NEW_TRANSACTIONS frame)
+        started = time.perf_counter()
+        await queue_transaction_event(tx)
+        stage_timings.record("broadcast_queue", time.perf_counter() - started)
 
     except Exception as e:
         logger.error(f"Error handling transaction: {e}", exc_info=True)
         # Send error response to client if possible
+        await send_error(websocket, f"Transaction processing failed: {str(e)}")
+
+
+async def score_batch(tx_list):
+    """Fraud analysis for a batch: one vectorized pass, or one per shard in parallel."""
+    started = time.perf_counter()
+    if scorer is not None:
+        analysis_results = await scorer.evaluate_batch(tx_list)
+        stage_timings.record("score_sharded_batch", time.perf_counter() - started)
+    else:
+        analysis_results = fraud_engine.evaluate_batch(tx_list)
+    stats.record_transactions(analysis_results, time.perf_counter() - started)
+    return analysis_results
+
+
+async def handle_transactions(websocket, data):
+    """
+    Handles an ADD_TRANSACTIONS batch: every transaction is parsed and scored
+    together, then the whole batch enters the mempool in one step and the
+    sender gets a single aggregated result frame.
+    """
+    try:
+        tx_list = data.get("transactions")
+        if not isinstance(tx_list, list) or not tx_list:
+            await send_error(websocket, "Batch rejected: 'transactions' must be a non-empty list")
+            return
+        if len(tx_list) > MAX_BATCH_SIZE:
+            await send_error(websocket, f"Batch rejected: {len(tx_list)} transactions exceeds limit of {MAX_BATCH_SIZE}")
+            return
+
+        # Parse everything first so a single bad entry rejects the whole batch
+        try:
+            with stage_timings.span("build_tx_batch"):
+                txs = [build_transaction(tx_data) for tx_data in tx_list]
+        except (AttributeError, TypeError, ValueError) as e:
+            await send_error(websocket, f"Batch rejected: invalid transaction ({e})")
+            return
+
+        shed = admission.admit(websocket, [tx.sender for tx in txs])
+        if shed:
+            await send_retry_after(websocket, shed, len(txs))
+            return
+
         try:
-            await websocket.send(json.dumps({
-                "type": "ERROR",
-                "message": f"Transaction processing failed: {str(e)}"
+            analysis_results = await score_batch(tx_list)
+        finally:
+            admission.release(len(txs))
+        for tx, analysis_result in zip(txs, analysis_results):
+            attach_analysis(tx, analysis_result)
+
+        with stage_timings.span("print_batch"):
+            report_batch_received(txs, analysis_results)
+
+        # Add to Mempool (no await between scoring and insert, so the batch lands atomically)
+        with stage_timings.span("mempool_batch"):
+            blockchain.add_transactions(txs)
+
+        try:
+            await websocket.send(runtime.dumps({
+                "type": "TRANSACTIONS_RESULT",
+                "accepted": len(txs),
+                "fraud_detected": sum(1 for r in analysis_results if r.risk_level == "HIGH"),
+                "results": [
+                    {
+                        "tx_id": tx.id,
+                        "score": r.score,
+                        "risk_level": r.risk_level,
+                        "decision": r.decision
+                    }
+                    for tx, r in zip(txs, analysis_results)
+                ]
             }))
-        except:
-            pass  # Client already disconnected
+        except Exception as e:
+            logger.warning(f"Failed to send batch result: {e}")
+        await gossip({"type": "GOSSIP_TXS", "transactions": [tx.to_dict() for tx in txs]})
+
+        # Notify Clients (coalesced into the next NEW_TRANSACTIONS frame)
+        for tx in txs:
+            await queue_transaction_event(tx)
+
+    except Exception as e:
+        logger.error(f"Error handling transaction batch: {e}", exc_info=True)
+        await send_error(websocket, f"Batch processing failed: {str(e)}")
+
+async def handle_get_tx(websocket, data):
+    """GET_TX: looks a mined transaction up by tx_id through the chain index."""
+    tx_id = str(data.get("tx_id", ""))
+    found = blockchain.find_transaction(tx_id)
+    reply = {"type": "TX_DATA", "tx_id": tx_id, "found": found is not None}
+    if found:
+        block_index, offset, tx = found
+        block = blockchain.chain[block_index]
+        reply.update(block=block_index, offset=offset, block_hash=block.hash, transaction=tx,
+                     merkle_root=block.merkle_root, merkle_proof=blockchain.get_merkle_proof(block_index, offset))
+    await websocket.send(runtime.dumps(reply))
+
+async def handle_account_history(websocket, data):
+    """GET_ACCOUNT_HISTORY: one page of an account's mined transactions (sent or received)."""
+    try:
+        query = parse_history_query(data)
+    except ValueError as e:
+        await send_error(websocket, f"History query rejected: {e}")
+        return
+    positions, total, next_cursor = blockchain.index.account_page(query)
+    await websocket.send(runtime.dumps({
+        "type": "ACCOUNT_HISTORY",
+        "account": query.account,
+        "order": "desc" if query.newest_first else "asc",
+        "total": total,
+        "transactions": [
+            {"block": block_index, "offset": offset, "transaction": tx}
+            for (block_index, offset), tx in zip(positions, blockchain.get_transactions(positions))
+        ],
+        "next_cursor": next_cursor
+    }))
+
+async def handle_query(websocket, data):
+    """
+    QUERY_TXS: one page of matching transactions, or with "stream": true every
+    page in turn (yielding to the event loop between pages) until the last.
+    """
+    try:
+        query = parse_tx_query(data)
+    except ValueError as e:
+        await send_error(websocket, f"Query rejected: {e}")
+        return
+    stream = bool(data.get("stream"))
+    while True:
+        page = run_query(blockchain, query)
+        done = page.next_cursor is None
+        await websocket.send(runtime.dumps({
+            "type": "QUERY_RESULT",
+            "transactions": [
+                {"block": block_index, "offset": offset, "transaction": tx}
+                for block_index, offset, tx in page.matches
+            ],
+            "next_cursor": page.next_cursor,
+            "blocks_scanned": page.blocks_scanned,
+            "blocks_skipped": page.blocks_skipped,
+            "done": done
+        }))
+        if done or not stream:
+            return
+        query.cursor = page.next_cursor
+        await asyncio.sleep(0)
 
 async def mine_blocks():
     while True:
-        await asyncio.sleep(10)
+        await asyncio.sleep(MINE_INTERVAL)
         if blockchain.mempool:
+            previous_block = blockchain.get_latest_block()
+            started = time.perf_counter()
             new_block = blockchain.mine_pending_transactions(miner_address="SYSTEM_MINER")
             if new_block:
-                stats["total_blocks"] += 1
-                print_block_mined(new_block)
-                try:
-                    await broadcast({
-                        "type": "NEW_BLOCK",
-                        "block": {
-                            "index": new_block.index,
-                            "timestamp": new_block.timestamp,
-                            "transactions": new_block.transactions,
-                            "hash": new_block.hash,
-                            "previous_hash": new_block.previous_hash,
-                            "nonce": new_block.nonce,
-                            "merkle_root": new_block.merkle_root
-                        }
-                    })
-                except Exception as e:
-                    logger.warning(f"Block broadcast failed: {e}")
+                # Only the new block needs checking; everything before it was checked on arrival
+                stats.record_block(new_block, time.perf_counter() - started,
+                                   blockchain.is_block_valid(new_block, previous_block))
+                report_block_mined(new_block)
+                await announce_block(new_block)
+
+async def announce_block(block, source=None):
+    """NEW_BLOCK to subscribed clients, GOSSIP_BLOCK to every peer but `source`, and a snapshot when one is due."""
+    block_data = {**block_header(block), "transactions": block.transactions}
+    # Deliver pending transaction events before the block that contains them
+    await flush_transaction_events()
+    try:
+        await send_to_clients(subscriptions.block_clients, {"type": "NEW_BLOCK", "block": block_data})
+    except Exception as e:
+        logger.warning(f"Block broadcast failed: {e}")
+    await gossip({"type": "GOSSIP_BLOCK", "block": block_data}, exclude=source)
+    if blockchain.store is not None and block.index % SNAPSHOT_EVERY == 0:
+        await save_snapshot()
+
+async def save_snapshot():
+    """Captures the state on the loop, writes it off the loop so mining and clients are not held up."""
+    state = blockchain.snapshot_state()
+    try:
+        await asyncio.to_thread(write_snapshot, blockchain.store.snapshot_path, state)
+    except Exception as e:  # A failed snapshot must not take the miner or a sync down with it
+        logger.warning(f"Snapshot at height {state['height']} failed: {e}")
+
+def current_stats():
+    return stats.snapshot(len(blockchain.mempool), blockchain.difficulty)
+
+async def push_stats():
+    """Pushes a STATS_UPDATE to stats subscribers every STATS_PUSH_INTERVAL seconds."""
+    while True:
+        await asyncio.sleep(STATS_PUSH_INTERVAL)
+        if subscriptions.stats_clients:
+            # One snapshot and one serialization per tick, however many dashboards listen
+            await send_to_clients(subscriptions.stats_clients, {
+                "type": "STATS_UPDATE",
+                "stats": current_stats()
+            })
+
+def hello_message():
+    tip = blockchain.get_latest_block()
+    return {"type": "PEER_HELLO", "node_id": NODE_ID, "height": tip.index, "tip_hash": tip.hash,
+            "work": chain_work(block.hash for block in blockchain.chain), "secret": PEER_SECRET}
+
+def register_peer(websocket, url=None):
+    """Tracks a peer link. Peers get gossip, not the client event streams."""
+    peer = peers[websocket] = Peer(websocket, url)
+    connected.discard(websocket)
+    subscriptions.unsubscribe(websocket)
+    return peer
+
+def unregister_peer(websocket):
+    peer = peers.pop(websocket, None)
+    if peer:
+        peer.close()
+        logger.info(f"Peer {peer.name} disconnected. Peers: {len(peers)}")
+
+async def gossip(message, exclude=None):
+    """Sends a peer message to every peer except `exclude` (the peer it came from)."""
+    targets = [ws for ws, peer in peers.items() if peer is not exclude and peer.node_id]
+    if not targets:
+        return
+    payload = runtime.dumps(message)
+    for ws in targets:
+        try:
+            await ws.send(payload)
+        except Exception as e:
+            logger.warning(f"Gossip to peer {peers[ws].name if ws in peers else '?'} failed: {e}")
+
+def schedule_sync(peer):
+    if not sync_lock.locked():
+        asyncio.create_task(sync_with(peer))
+
+async def sync_with(peer):
+    """Downloads the peer's branch if it beats ours and switches to it."""
+    async with sync_lock:
+        try:
+            branch = await fetch_branch(peer, blockchain)
+        except (asyncio.TimeoutError, asyncio.CancelledError, websockets.exceptions.ConnectionClosed) as e:
+            logger.warning(f"Sync from peer {peer.name} interrupted: {e!r}")
+            return
+        except (KeyError, TypeError, ValueError) as e:
+            logger.warning(f"Sync from peer {peer.name} rejected: {e}")
+            return
+        if branch is None:
+            return
+        fork_height, blocks = branch
+        # The chain may have moved while the bodies downloaded (a block mined or received)
+        chain = blockchain.chain
+        if fork_height >= len(chain) or chain[fork_height].hash != blocks[0].previous_hash or \
+                not better_branch([b.hash for b in blocks], [b.hash for b in chain[fork_height + 1:]]):
+            return
+        dropped = len(chain) - 1 - fork_height
+        returned = blockchain.reorganize(fork_height, blocks)
+        blockchain.remove_transactions({tx["tx_id"] for block in blocks for tx in block.transactions})
+        blockchain.add_transactions([Transaction.from_dict(tx) for tx in returned])
+        stats.record_reorg(fork_height, blocks)
+        log_event(event_log, "chain_synced", peer=peer.name, fork_height=fork_height, added=len(blocks),
+                  dropped=dropped, requeued_tx=len(returned), height=len(blockchain.chain) - 1)
+        if not HEADLESS:
+            print(f"{Fore.CYAN}🔀 Synced {len(blocks)} block(s) from peer {peer.name} "
+                  f"(fork at #{fork_height}, {dropped} dropped){Style.RESET_ALL}")
+        for block in blocks[:-1]:
+            await send_to_clients(subscriptions.block_clients, {
+                "type": "NEW_BLOCK", "block": {**block_header(block), "transactions": block.transactions}})
+        await announce_block(blocks[-1], source=peer)
+
+async def receive_transactions(peer, data):
+    """
+    GOSSIP_TXS: scores transactions not seen yet (the peer's verdicts are not
+    trusted), adds them to the mempool and relays them. Per-account limits
+    are not applied: the node a client sent them to already charged them to
+    their accounts, and charging again here would let one busy account stop
+    a whole frame from replicating. The peer link is held to the connection
+    and scoring limits; gossip shed by those is dropped (the peer does not
+    retry).
+    """
+    fresh = []
+    tx_list = data.get("transactions")
+    for tx_data in tx_list if isinstance(tx_list, list) else []:
+        try:
+            tx = parse_transaction(tx_data)
+        except ValueError as e:
+            logger.warning(f"Gossiped transaction from peer {peer.name} rejected: {e}")
+            continue
+        if not blockchain.has_transaction(tx.id):
+            fresh.append(tx)
+    if not fresh:
+        return
+
+    shed = admission.admit(peer.websocket, [tx.sender for tx in fresh], check_accounts=False)
+    if shed:
+        stats.record_throttled(shed.reason, len(fresh))
+        logger.warning(f"Dropped {len(fresh)} gossiped transaction(s) from peer {peer.name}: {shed.reason} limit")
+        return
+    try:
+        analysis_results = await score_batch([tx.to_dict() for tx in fresh])
+    finally:
+        admission.release(len(fresh))
+    for tx, analysis_result in zip(fresh, analysis_results):
+        attach_analysis(tx, analysis_result)
+    # Scoring may have awaited (sharded): skip anything that arrived meanwhile
+    fresh = [tx for tx in fresh if not blockchain.has_transaction(tx.id)]
+    blockchain.add_transactions(fresh)
+    for tx in fresh:
+        await queue_transaction_event(tx)
+    await gossip({"type": "GOSSIP_TXS", "transactions": [tx.to_dict() for tx in fresh]}, exclude=peer)
+
+async def receive_block(peer, data):
+    """GOSSIP_BLOCK: appends a block that extends our tip; anything else ahead of us starts a sync."""
+    try:
+        block = parse_block(data.get("block"))
+    except ValueError as e:
+        await send_error(peer.websocket, f"Block rejected: {e}")
+        return
+    chain = blockchain.chain
+    if block.index < len(chain) and chain[block.index].hash == block.hash:
+        return  # Already have it
+    tip = chain[-1]
+    if block.index != tip.index + 1 or block.previous_hash != tip.hash:
+        if block.index >= tip.index:
+            schedule_sync(peer)
+        return
+    reason = check_block(block, blockchain.difficulty)
+    if reason:
+        logger.warning(f"Block #{block.index} from peer {peer.name} rejected: {reason}")
+        return
+    blockchain.append_block(block)
+    blockchain.remove_transactions({tx["tx_id"] for tx in block.transactions})
+    stats.record_received_block(block)
+    log_event(event_log, "block_received", peer=peer.name, index=block.index, hash=block.hash,
+              tx_count=len(block.transactions))
+    if not HEADLESS:
+        print(f"{Fore.CYAN}📥 Block #{block.index} from peer {peer.name} ({len(block.transactions)} tx(s)){Style.RESET_ALL}")
+    await announce_block(block, source=peer)
+
+async def handle_peer_message(websocket, data):
+    """Peer protocol messages (see peers.py), from links opened by either side."""
+    msg_type = data.get("type")
+    peer = peers.get(websocket)
+    if msg_type == "PEER_HELLO":
+        if data.get("node_id") == NODE_ID:
+            await websocket.close()  # Listed ourselves as a peer
+            return
+        if peer is None:  # Inbound link: only nodes that know the secret become peers
+            if not PEER_SECRET or not hmac.compare_digest(str(data.get("secret", "")), PEER_SECRET):
+                await send_error(websocket, "PEER_HELLO rejected: wrong or missing peer secret")
+                return
+            peer = register_peer(websocket)
+            await peer.send(hello_message())
+        peer.update(data)
+        logger.info(f"Peer {peer.name} at height {peer.height}. Peers: {len(peers)}")
+        if peer.work > chain_work(block.hash for block in blockchain.chain) or \
+                (peer.height >= len(blockchain.chain) - 1 and peer.tip_hash != blockchain.get_latest_block().hash):
+            schedule_sync(peer)
+        return
+    if peer is None:
+        await send_error(websocket, f"{msg_type} rejected: send PEER_HELLO first")
+        return
+    if msg_type in ("HEADERS", "BLOCKS"):
+        peer.resolve(data)
+    elif msg_type == "GOSSIP_TXS":
+        await receive_transactions(peer, data)
+    elif msg_type == "GOSSIP_BLOCK":
+        await receive_block(peer, data)
+    else:
+        try:
+            reply = headers_reply(blockchain, data) if msg_type == "GET_HEADERS" else blocks_reply(blockchain, data)
+        except ValueError as e:
+            await send_error(websocket, f"{msg_type} rejected: {e}")
+            return
+        await peer.send(reply)
+
+async def maintain_peer(url):
+    """Keeps a link to one configured peer open, reconnecting every RECONNECT_DELAY seconds."""
+    while True:
+        websocket = None
+        try:
+            async with websockets.connect(url, max_size=MAX_MESSAGE_BYTES) as websocket:
+                peer = register_peer(websocket, url)
+                await peer.send(hello_message())
+                async for message in websocket:
+                    try:
+                        data = runtime.loads(message)
+                        if data.get("type") in PEER_MESSAGES:
+                            await handle_peer_message(websocket, data)
+                    except websockets.exceptions.ConnectionClosed:
+                        raise
+                    except Exception as e:  # One bad message must not drop the link
+                        logger.error(f"Error processing message from peer {url}: {e}", exc_info=True)
+        except (OSError, websockets.exceptions.WebSocketException) as e:
+            logger.debug(f"Peer {url} unreachable: {e}")
+        except Exception as e:
+            logger.error(f"Peer link to {url} failed: {e}", exc_info=True)
+        finally:
+            if websocket is not None:
+                unregister_peer(websocket)
+        await asyncio.sleep(RECONNECT_DELAY)
 
 async def handler(websocket):
     connected.add(websocket)
+    subscriptions.subscribe(websocket, Subscription())  # Full stream until the client says otherwise
     client_id = id(websocket)
     try:
         logger.info(f"Client {client_id} connected. Total clients: {len(connected)}")
-        print(f"{Fore.GREEN}🔗 Client connected. Total clients: {len(connected)}{Style.RESET_ALL}")
+        if not HEADLESS:
+            print(f"{Fore.GREEN}🔗 Client connected. Total clients: {len(connected)}{Style.RESET_ALL}")
         
         try:
-            await websocket.send(json.dumps({
+            await websocket.send(runtime.dumps({
                 "type": "WELCOME",
                 "message": "Connected to Blockchain Server",
                 "chain_height": len(blockchain.chain),
@@ -190,31 +767,60 @@ async def handler(websocket):
 
         async for message in websocket:
             try:
-                data = json.loads(message)
+                with stage_timings.span("parse"):
+                    data = runtime.loads(message)
                 msg_type = data.get("type")
                 logger.debug(f"Client {client_id} sent {msg_type}")
 
                 if msg_type == "ADD_TRANSACTION":
                     await handle_transaction(websocket, data)
+                elif msg_type == "ADD_TRANSACTIONS":
+                    await handle_transactions(websocket, data)
+                elif msg_type == "SUBSCRIBE":
+                    try:
+                        subscription = parse_subscription(data)
+                    except ValueError as e:
+                        await send_error(websocket, f"Subscription rejected: {e}")
+                        continue
+                    subscriptions.subscribe(websocket, subscription)
+                    await websocket.send(runtime.dumps({
+                        "type": "SUBSCRIBED",
+                        "events": sorted(subscription.events),
+                        "min_risk": subscription.min_risk,
+                        "accounts": sorted(subscription.accounts)
+                    }))
                 elif msg_type == "GET_CHAIN":
                     try:
-                        await websocket.send(json.dumps({
+                        await websocket.send(runtime.dumps({
                             "type": "CHAIN_DATA",
                             "chain": blockchain.to_list(),
-                            "stats": stats
+                            "stats": current_stats()
                         }))
                     except Exception as e:
                         logger.error(f"Failed to send chain data: {e}")
+                elif msg_type == "GET_TX":
+                    await handle_get_tx(websocket, data)
+                elif msg_type == "GET_ACCOUNT_HISTORY":
+                    await handle_account_history(websocket, data)
+                elif msg_type == "QUERY_TXS":
+                    await handle_query(websocket, data)
+                elif msg_type in PEER_MESSAGES:
+                    await handle_peer_message(websocket, data)
+                elif msg_type == "GET_METRICS":
+                    try:
+                        await websocket.send(runtime.dumps({
+                            "type": "METRICS_DATA",
+                            "stages": stage_timings.to_dict(),
+                            "shards": scorer.routed if scorer is not None else None,
+                            "stats": current_stats()
+                        }))
+                    except Exception as e:
+                        logger.error(f"Failed to send metrics: {e}")
                 elif msg_type == "GET_STATS":
                     try:
-                        await websocket.send(json.dumps({
+                        await websocket.send(runtime.dumps({
                             "type": "STATS_DATA",
-                            "stats": {
-                                **stats,
-                                "mempool_size": len(blockchain.mempool),
-                                "chain_valid": blockchain.is_chain_valid(),
-                                "uptime": time.time() - stats["start_time"]
-                            }
+                            "stats": current_stats()
                         }))
                     except Exception as e:
                         logger.error(f"Failed to send stats: {e}")
@@ -226,24 +832,155 @@ async def handler(websocket):
 
     except websockets.exceptions.ConnectionClosed:
         logger.info(f"Client {client_id} disconnected normally")
-        print(f"{Fore.YELLOW}🔌 Client disconnected. Remaining: {len(connected) - 1}{Style.RESET_ALL}")
+        if not HEADLESS:
+            print(f"{Fore.YELLOW}🔌 Client disconnected. Remaining: {len(connected) - 1}{Style.RESET_ALL}")
     except Exception as e:
         logger.error(f"Unexpected error with client {client_id}: {e}", exc_info=True)
-        print(f"{Fore.RED}❌ Client {client_id} error: {e}{Style.RESET_ALL}")
+        if not HEADLESS:
+            print(f"{Fore.RED}❌ Client {client_id} error: {e}{Style.RESET_ALL}")
     finally:
         connected.discard(websocket)
+        subscriptions.unsubscribe(websocket)
+        unregister_peer(websocket)
+        admission.forget(websocket)
         logger.info(f"Client {client_id} cleaned up. Remaining: {len(connected)}")
 
-async def main():
-    print_banner()
-    server = await websockets.serve(handler, "localhost", 8765)
-    print(f"{Fore.GREEN}{Style.BRIGHT}🚀 Server listening on ws://localhost:8765{Style.RESET_ALL}")
-    print(f"{Fore.WHITE}   Waiting for connections...{Style.RESET_ALL}\n")
-    asyncio.create_task(mine_blocks())
+async def serve_prometheus(reader, writer):
+    """Minimal HTTP responder: any GET returns the Prometheus text exposition."""
+    try:
+        await reader.readline()  # Request line; every path serves the metrics
+        while (await reader.readline()) not in (b"\r\n", b"\n", b""):
+            pass  # Skip headers
+        body = render_prometheus(stage_timings, current_stats()).encode()
+        writer.write(
+            b"HTTP/1.1 200 OK\r\n"
+            b"Content-Type: text/plain; version=0.0.4\r\n"
+            + f"Content-Length: {len(body)}\r\n".encode()
+            + b"Connection: close\r\n\r\n"
+            + body
+        )
+        await writer.drain()
+    except Exception as e:
+        logger.warning(f"Metrics request failed: {e}")
+    finally:
+        writer.close()
+
+async def main(args):
+    if not HEADLESS:
+        print_banner()
+    server = await websockets.serve(handler, HOST, PORT, max_size=MAX_MESSAGE_BYTES)
+    if args.metrics_port:
+        await asyncio.start_server(serve_prometheus, "127.0.0.1", args.metrics_port)
+    if HEADLESS:
+        log_event(event_log, "server_started", uri=f"ws://{HOST}:{PORT}", difficulty=blockchain.difficulty,
+                  fraud_ai=(scorer or fraud_engine).models_loaded, metrics_port=args.metrics_port or None,
+                  data_dir=args.data_dir, height=len(blockchain.chain) - 1, node_id=NODE_ID, peers=PEER_URLS,
+                  score_workers=scorer.shards if scorer is not None else 0, runtime=runtime.describe())
+        asyncio.create_task(log_summaries())
+    else:
+        print(f"{Fore.GREEN}{Style.BRIGHT}🚀 Server listening on ws://{HOST}:{PORT}{Style.RESET_ALL}")
+        if args.metrics_port:
+            print(f"{Fore.GREEN}📈 Prometheus metrics on http://127.0.0.1:{args.metrics_port}/metrics{Style.RESET_ALL}")
+        if scorer is not None:
+            print(f"{Fore.GREEN}🧮 Scoring on {scorer.shards} worker process(es), sharded by sender{Style.RESET_ALL}")
+        if PEER_URLS:
+            print(f"{Fore.GREEN}🌐 Node {NODE_ID} gossiping with {', '.join(PEER_URLS)}{Style.RESET_ALL}")
+        if blockchain.store is not None:
+            print(f"{Fore.GREEN}💾 Chain stored in {args.data_dir} (height {len(blockchain.chain) - 1}){Style.RESET_ALL}")
+        print(f"{Fore.WHITE}   Waiting for connections...{Style.RESET_ALL}\n")
+    if MINE_INTERVAL > 0:
+        asyncio.create_task(mine_blocks())
+    for url in PEER_URLS:
+        asyncio.create_task(maintain_peer(url))
+    asyncio.create_task(broadcast_flusher())
+    asyncio.create_task(push_stats())
     await server.wait_closed()
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Blockchain server node")
+    parser.add_argument("--metrics-port", type=int, default=0,
+                        help="Serve Prometheus text metrics on this localhost port (0 = off)")
+    parser.add_argument("--student", action="store_true",
+                        help="Score with the distilled student model (train_model.py --distill) instead of the forest")
+    parser.add_argument("--headless", action="store_true",
+                        help="JSON-lines logging through a background writer instead of console boxes")
+    parser.add_argument("--log-sample-rate", type=float, default=TX_LOG_SAMPLE_RATE,
+                        help="Headless: fraction of transactions logged (HIGH risk is always logged)")
+    parser.add_argument("--summary-interval", type=float, default=SUMMARY_INTERVAL,
+                        help="Headless: seconds between summary lines")
+    parser.add_argument("--profile", choices=runtime.PROFILES, default="default",
+                        help="Runtime: 'performance' uses uvloop and orjson where installed")
+    parser.add_argument("--score-workers", type=int, default=0,
+                        help="Score in N worker processes, routed by sender account (0 = on the event loop)")
+    parser.add_argument("--rate-limit", type=float, default=CONNECTION_RATE_LIMIT,
+                        help="Transactions per second accepted from one connection (0 = no limit)")
+    parser.add_argument("--account-rate-limit", type=float, default=ACCOUNT_RATE_LIMIT,
+                        help="Transactions per second accepted from one sender account (0 = no limit)")
+    parser.add_argument("--max-scoring", type=int, default=MAX_SCORING,
+                        help="Transactions scored at once across all connections; more get RETRY_AFTER (0 = no limit)")
+    parser.add_argument("--host", default=HOST, help="Interface to listen on")
+    parser.add_argument("--port", type=int, default=PORT, help="Port to listen on")
+    parser.add_argument("--peers", default="",
+                        help="Comma-separated peer nodes to replicate with, e.g. ws://localhost:8766,ws://10.0.0.2:8765")
+    parser.add_argument("--peer-secret", default=PEER_SECRET,
+                        help="Shared secret between nodes; inbound peer links without it are refused "
+                             "(default: $PEER_SECRET; unset = accept no inbound peers)")
+    parser.add_argument("--mine-interval", type=float, default=MINE_INTERVAL,
+                        help="Seconds between mining rounds (0 = do not mine, only follow peers)")
+    parser.add_argument("--data-dir",
+                        help="Persist blocks and snapshots here and resume from them on restart (default: in memory)")
+    parser.add_argument("--prune-horizon", type=int,
+                        help="With --data-dir: keep transactions in memory only for the last N blocks")
+    parser.add_argument("--snapshot-every", type=int, default=SNAPSHOT_EVERY,
+                        help="With --data-dir: blocks between snapshots")
+    parser.add_argument("--audit", action="store_true",
+                        help="With --data-dir: re-check every stored block (hashes, links, Merkle roots) before serving")
+    args = parser.parse_args()
+    if args.prune_horizon is not None and (not args.data_dir or args.prune_horizon < 1):
+        parser.error("--prune-horizon needs --data-dir and must be at least 1")
+
+    HOST, PORT, MINE_INTERVAL = args.host, args.port, args.mine_interval
+    runtime.use_profile(args.profile)
+    if min(args.rate_limit, args.account_rate_limit, args.max_scoring) < 0:
+        parser.error("--rate-limit, --account-rate-limit and --max-scoring cannot be negative")
+    admission = AdmissionControl(args.rate_limit, args.account_rate_limit, args.max_scoring)
+    PEER_SECRET = args.peer_secret
+    PEER_URLS = [url.strip() for url in args.peers.split(",") if url.strip()]
+
+    if args.data_dir:
+        SNAPSHOT_EVERY = max(args.snapshot_every, 1)
+        blockchain = Blockchain(store=BlockStore(args.data_dir), prune_horizon=args.prune_horizon)
+        stats = LiveStats(genesis_block=blockchain.get_latest_block())
+        stats.total_blocks = len(blockchain.chain)
+        if args.audit:
+            audit = audit_chain(blockchain)
+            if not audit.valid:
+                parser.exit(1, f"Stored chain invalid at block {audit.first_invalid}: {audit.reason}\n")
+            print(f"🔍 Audited {audit.blocks_checked:,} blocks in {audit.seconds:.2f}s on {audit.workers} worker(s)")
+
+    if args.score_workers > 0:
+        scorer = ShardedScorer(args.score_workers, use_student=args.student, timings=stage_timings)
+        scorer.warm_up()
+    else:
+        fraud_engine = FraudDetectionEngine(timings=stage_timings, use_student=args.student)
+
+    log_listener = None
+    if args.headless:
+        HEADLESS = True
+        TX_LOG_SAMPLE_RATE = args.log_sample_rate
+        SUMMARY_INTERVAL = args.summary_interval
+        blockchain.verbose = False
+        log_listener = setup_structured_logging()
     try:
-        asyncio.run(main())
+        runtime.run(main(args))
     except KeyboardInterrupt:
-        print(f"\n{Fore.RED}Server stopped.{Style.RESET_ALL}")
+        if not HEADLESS:
+            print(f"\n{Fore.RED}Server stopped.{Style.RESET_ALL}")
+    finally:
+        if blockchain.store is not None:
+            blockchain.save_snapshot()
+            blockchain.store.close()
+        if scorer is not None:
+            scorer.close()
+        if log_listener:
+            log_listener.stop()
@@ -0,0 +1,153 @@
+"""
+Sharded scoring: fraud scoring spread over worker processes by sender account.
+
+With --score-workers N the server stops scoring on its event loop. Every
+transaction goes to shard crc32(sender) % N, and each shard is one worker
+process with its own FraudDetectionEngine. A batch is split by shard, the
+shards score their parts at the same time, and the results are put back in
+batch order. The server then adds the whole batch to its one mempool, so
+block assembly is unchanged.
+
+The routing is stable (crc32, not Python's salted hash()), so an account's
+transactions always reach the same worker. Per-account state such as
+velocity counters can therefore live in the workers with no cross-shard
+coordination. The engine keeps no such state today.
+
+Each worker engine times its stages (rules_batch, ml_batch, ...) into its
+own StageTimings and ships the histograms back with every result, so they
+are merged into the server's stage timings like in-process scoring.
+
+    scorer = ShardedScorer(4, timings=stage_timings)
+    results = await scorer.evaluate_batch(tx_list)  # FraudAnalysisResult per tx, in order
+
+Throughput per worker count, against scoring in-process:
+
+    python sharding.py --workers 1 2 4 --transactions 20000
+"""
+
+import argparse
+import asyncio
+import logging
+import random
+import time
+import zlib
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Dict, List, Optional, Tuple
+
+from fraud_engine import FraudAnalysisResult, FraudDetectionEngine
+from metrics import LatencyHistogram, StageTimings
+
+# Per-worker engine, set by _init_worker
+_engine = None
+
+
+def shard_of(account: str, shards: int) -> int:
+    return zlib.crc32(str(account).encode()) % shards
+
+
+def _init_worker(use_student: bool):
+    global _engine
+    logging.getLogger("FraudEngine").setLevel(logging.WARNING)
+    _engine = FraudDetectionEngine(timings=StageTimings(), use_student=use_student)
+
+
+def _score(tx_list: List[Dict[str, Any]]) -> Tuple[List[FraudAnalysisResult], Dict[str, LatencyHistogram]]:
+    """Scores a shard's part of a batch; returns the results and the stage timings recorded since the last call."""
+    if len(tx_list) == 1:
+        results = [_engine.evaluate_transaction(tx_list[0])]
+    else:
+        results = _engine.evaluate_batch(tx_list)
+    return results, _engine.timings.drain()
+
+
+def _models_loaded() -> bool:
+    return _engine.models_loaded
+
+
+class ShardedScorer:
+    def __init__(self, shards: int, use_student: bool = False, timings: Optional[StageTimings] = None):
+        self.shards = shards
+        self.timings = timings  # Worker stage timings are merged in here
+        # One single-process executor per shard, so a shard is always the same process
+        self.workers = [ProcessPoolExecutor(1, initializer=_init_worker, initargs=(use_student,))
+                        for _ in range(shards)]
+        self.routed = [0] * shards  # Transactions sent to each shard
+        self.models_loaded = False  # Set by warm_up
+
+    async def evaluate_batch(self, tx_list: List[Dict[str, Any]]) -> List[FraudAnalysisResult]:
+        by_shard: Dict[int, List[int]] = {}
+        for i, tx in enumerate(tx_list):
+            by_shard.setdefault(shard_of(tx.get("sender", ""), self.shards), []).append(i)
+
+        loop = asyncio.get_running_loop()
+        shard_results = await asyncio.gather(*(
+            loop.run_in_executor(self.workers[shard], _score, [tx_list[i] for i in indices])
+            for shard, indices in by_shard.items()
+        ))
+
+        results: List[FraudAnalysisResult] = [None] * len(tx_list)
+        for (shard, indices), (scored, timings) in zip(by_shard.items(), shard_results):
+            self.routed[shard] += len(indices)
+            if self.timings is not None:
+                self.timings.merge(timings)
+            for i, result in zip(indices, scored):
+                results[i] = result
+        return results
+
+    async def evaluate_transaction(self, tx_data: Dict[str, Any]) -> FraudAnalysisResult:
+        return (await self.evaluate_batch([tx_data]))[0]
+
+    def warm_up(self) -> bool:
+        """Starts every worker (and loads its models) now rather than on the first transaction; True if models loaded."""
+        self.models_loaded = all([worker.submit(_models_loaded).result() for worker in self.workers])
+        return self.models_loaded
+
+    def close(self):
+        for worker in self.workers:
+            worker.shutdown(cancel_futures=True)
+
+
+def measure_throughput(tx_list: List[Dict[str, Any]], workers: int, batch_size: int,
+                       use_student: bool = False) -> float:
+    """Transactions per second scoring `tx_list` in batches: in-process for workers=0, else sharded."""
+    batches = [tx_list[i:i + batch_size] for i in range(0, len(tx_list), batch_size)]
+    if not workers:
+        engine = FraudDetectionEngine(use_student=use_student)
+        started = time.perf_counter()
+        for batch in batches:
+            engine.evaluate_batch(batch)
+        return len(tx_list) / (time.perf_counter() - started)
+
+    scorer = ShardedScorer(workers, use_student=use_student)
+    try:
+        scorer.warm_up()
+
+        async def run():
+            # Several batches in flight, as with several clients
+            await asyncio.gather(*(scorer.evaluate_batch(batch) for batch in batches))
+
+        started = time.perf_counter()
+        asyncio.run(run())
+        return len(tx_list) / (time.perf_counter() - started)
+    finally:
+        scorer.close()
+
+
+if __name__ == "__main__":
+    from benchmark import make_tx_dicts
+
+    parser = argparse.ArgumentParser(description="Scoring throughput per worker count")
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4], help="Worker counts to try")
+    parser.add_argument("--transactions", type=int, default=20000)
+    parser.add_argument("--batch", type=int, default=500, help="Transactions per ADD_TRANSACTIONS batch")
+    parser.add_argument("--student", action="store_true", help="Score with the distilled student")
+    args = parser.parse_args()
+
+    logging.getLogger("FraudEngine").setLevel(logging.WARNING)
+    tx_list = make_tx_dicts(random.Random(1234), args.transactions)
+    baseline = measure_throughput(tx_list, 0, args.batch, args.student)
+    print(f"🧮 {args.transactions:,} transactions in batches of {args.batch}")
+    print(f"   in-process  : {baseline:10,.0f} tx/s")
+    for workers in args.workers:
+        rate = measure_throughput(tx_list, workers, args.batch, args.student)
+        print(f"   {workers:>2} worker(s): {rate:10,.0f} tx/s  ({rate / baseline:.2f}x)")
@@ -0,0 +1,57 @@
+"""
+Structured (JSON lines) logging for headless runs.
+
+Records are handed to a queue on the calling thread and formatted/written
+by a background QueueListener, so a slow terminal or pipe never blocks the
+event loop.
+"""
+
+import json
+import logging
+import logging.handlers
+import queue
+import sys
+
+
+class JsonLineFormatter(logging.Formatter):
+    """One JSON object per line: ts, level, logger, event, plus any `fields`."""
+
+    def format(self, record):
+        entry = {
+            "ts": round(record.created, 6),
+            "level": record.levelname,
+            "logger": record.name,
+            "event": record.getMessage(),
+        }
+        fields = getattr(record, "fields", None)
+        if fields:
+            entry.update(fields)
+        if record.exc_info:
+            entry["exc"] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str)
+
+
+def setup_structured_logging(stream=sys.stdout, level=logging.INFO):
+    """
+    Routes every logger through a queue to a JSON line writer thread.
+    Returns the started QueueListener; call .stop() on shutdown to flush.
+    """
+    log_queue = queue.SimpleQueue()
+
+    writer = logging.StreamHandler(stream)
+    writer.setFormatter(JsonLineFormatter())
+    listener = logging.handlers.QueueListener(log_queue, writer, respect_handler_level=False)
+
+    root = logging.getLogger()
+    for handler in list(root.handlers):
+        root.removeHandler(handler)
+    root.addHandler(logging.handlers.QueueHandler(log_queue))
+    root.setLevel(level)
+
+    listener.start()
+    return listener
+
+
+def log_event(logger, event, **fields):
+    """Logs a structured event; `fields` become top-level JSON keys."""
+    logger.info(event, extra={"fields": fields})
@@ -0,0 +1,93 @@
+"""
+Compact student models distilled from the RF/XGB teacher (see distill.py).
+
+Both are plain NumPy parameters with a small evaluator, so scoring one
+transaction costs a handful of array operations instead of walking a full
+forest through sklearn. They expose predict_proba() like the sklearn models
+and name the features they expect, so FraudDetectionEngine can score with
+either through features.FeaturePipeline.
+"""
+
+from typing import List
+
+import numpy as np
+
+
+def _sigmoid(z: np.ndarray) -> np.ndarray:
+    return 1.0 / (1.0 + np.exp(-z))
+
+
+class LinearStudent:
+    """Logistic model on engineered features: p = sigmoid(X @ coef + intercept)."""
+
+    kind = "linear"
+
+    def __init__(self, feature_names: List[str], coef: np.ndarray, intercept: float):
+        self.feature_names = list(feature_names)
+        self.coef = np.asarray(coef, dtype=np.float64)
+        self.intercept = float(intercept)
+
+    def predict_proba(self, X: np.ndarray) -> np.ndarray:
+        p = _sigmoid(X @ self.coef + self.intercept)
+        return np.column_stack([1.0 - p, p])
+
+
+class TreeStudent:
+    """
+    Boosted ensemble of shallow regression trees on the teacher's logit.
+    Trees are stored as (n_trees, max_nodes) arrays with leaves pointing at
+    themselves, so every tree is walked `depth` steps in lockstep for all rows.
+    """
+
+    kind = "trees"
+
+    def __init__(self, feature_names: List[str], feature: np.ndarray, threshold: np.ndarray,
+                 left: np.ndarray, right: np.ndarray, value: np.ndarray,
+                 depth: int, base: float, learning_rate: float):
+        self.feature_names = list(feature_names)
+        self.feature = feature
+        self.threshold = threshold
+        self.left = left
+        self.right = right
+        self.value = value
+        self.depth = depth
+        self.base = base
+        self.learning_rate = learning_rate
+        self._trees = np.arange(feature.shape[0])
+
+    @classmethod
+    def from_sklearn(cls, model, feature_names: List[str]) -> "TreeStudent":
+        """Packs a fitted sklearn GradientBoostingRegressor into lockstep tree arrays."""
+        trees = [estimator[0].tree_ for estimator in model.estimators_]
+        n_trees, max_nodes = len(trees), max(t.node_count for t in trees)
+        feature = np.zeros((n_trees, max_nodes), dtype=np.int32)
+        threshold = np.full((n_trees, max_nodes), np.inf, dtype=np.float64)
+        self_index = np.tile(np.arange(max_nodes, dtype=np.int32), (n_trees, 1))
+        left, right = self_index.copy(), self_index.copy()
+        value = np.zeros((n_trees, max_nodes), dtype=np.float64)
+
+        for i, tree in enumerate(trees):
+            n = tree.node_count
+            split = tree.children_left[:n] != -1  # Leaves keep feature 0 / +inf and loop on themselves
+            feature[i, :n][split] = tree.feature[:n][split]
+            threshold[i, :n][split] = tree.threshold[:n][split]
+            left[i, :n][split] = tree.children_left[:n][split]
+            right[i, :n][split] = tree.children_right[:n][split]
+            value[i, :n] = tree.value[:n, 0, 0]
+
+        return cls(feature_names, feature, threshold, left, right, value,
+                   depth=max(t.max_depth for t in trees), base=float(model.init_.constant_.ravel()[0]),
+                   learning_rate=float(model.learning_rate))
+
+    def decision_function(self, X: np.ndarray) -> np.ndarray:
+        rows = np.arange(len(X))[:, None]
+        trees = self._trees
+        node = np.zeros((len(X), len(trees)), dtype=np.int32)
+        for _ in range(self.depth):
+            go_left = X[rows, self.feature[trees, node]] <= self.threshold[trees, node]
+            node = np.where(go_left, self.left[trees, node], self.right[trees, node])
+        return self.base + self.learning_rate * self.value[trees, node].sum(axis=1)
+
+    def predict_proba(self, X: np.ndarray) -> np.ndarray:
+        p = _sigmoid(self.decision_function(X))
+        return np.column_stack([1.0 - p, p])
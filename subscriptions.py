@@ -0,0 +1,143 @@
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Set, Tuple
+
+# Event types a client can subscribe to
+EVENT_TRANSACTIONS = "transactions"
+EVENT_BLOCKS = "blocks"
+EVENT_SUMMARY = "summary"
+EVENT_STATS = "stats"
+EVENT_TYPES = {EVENT_TRANSACTIONS, EVENT_BLOCKS, EVENT_SUMMARY, EVENT_STATS}
+
+# Risk levels ordered so "min_risk" filters can compare ranks
+RISK_RANK = {"LOW": 0, "MEDIUM": 1, "HIGH": 2}
+
+
+@dataclass
+class Subscription:
+    events: Set[str] = field(default_factory=lambda: {EVENT_TRANSACTIONS, EVENT_BLOCKS})
+    min_risk: str = "LOW"
+    accounts: Set[str] = field(default_factory=set)
+
+
+def parse_subscription(data: Dict[str, Any]) -> Subscription:
+    """
+    Builds a Subscription from a SUBSCRIBE message.
+
+    Accepts either the "mode" shorthand ("full" / "summary") or explicit
+    filters: "events", "min_risk" and "accounts". Raises ValueError on
+    anything it does not understand.
+    """
+    mode = data.get("mode")
+    if mode == "full":
+        return Subscription()
+    if mode == "summary":
+        return Subscription(events={EVENT_SUMMARY, EVENT_BLOCKS})
+    if mode is not None:
+        raise ValueError(f"Unknown subscription mode: {mode}")
+
+    events = data.get("events", [EVENT_TRANSACTIONS, EVENT_BLOCKS])
+    if not isinstance(events, list) or not all(isinstance(event, str) for event in events):
+        raise ValueError("'events' must be a list of event types")
+    events = set(events)
+    unknown = events - EVENT_TYPES
+    if unknown:
+        raise ValueError(f"Unknown event type(s): {', '.join(sorted(unknown))}")
+
+    min_risk = str(data.get("min_risk", "LOW")).upper()
+    if min_risk not in RISK_RANK:
+        raise ValueError(f"Unknown risk level: {min_risk}")
+
+    accounts = data.get("accounts") or []
+    if not isinstance(accounts, list) or not all(isinstance(account, (str, int)) for account in accounts):
+        raise ValueError("'accounts' must be a list of account names")
+
+    return Subscription(events=events, min_risk=min_risk, accounts=set(map(str, accounts)))
+
+
+def _risk_rank(event: Dict[str, Any]) -> int:
+    return RISK_RANK.get((event.get("fraud_analysis") or {}).get("risk_level"), 0)
+
+
+class SubscriptionIndex:
+    """
+    Keeps client subscriptions in lookup tables keyed by what they filter on,
+    so routing an event batch costs a few dict/set lookups instead of
+    evaluating every client's filter against every event.
+    """
+
+    def __init__(self):
+        self.subscriptions: Dict[Any, Subscription] = {}
+        self.block_clients: Set[Any] = set()
+        self.summary_clients: Set[Any] = set()
+        self.stats_clients: Set[Any] = set()
+        # Transaction clients without an account filter, keyed by min risk rank
+        self.risk_clients: Dict[int, Set[Any]] = {rank: set() for rank in RISK_RANK.values()}
+        # Transaction clients with an account filter: account -> {client: min risk rank}
+        self.account_clients: Dict[str, Dict[Any, int]] = {}
+
+    def subscribe(self, client, subscription: Subscription):
+        """Registers (or replaces) a client's subscription."""
+        self.unsubscribe(client)
+        self.subscriptions[client] = subscription
+
+        if EVENT_BLOCKS in subscription.events:
+            self.block_clients.add(client)
+        if EVENT_SUMMARY in subscription.events:
+            self.summary_clients.add(client)
+        if EVENT_STATS in subscription.events:
+            self.stats_clients.add(client)
+        if EVENT_TRANSACTIONS in subscription.events:
+            min_rank = RISK_RANK[subscription.min_risk]
+            if subscription.accounts:
+                for account in subscription.accounts:
+                    self.account_clients.setdefault(account, {})[client] = min_rank
+            else:
+                self.risk_clients[min_rank].add(client)
+
+    def unsubscribe(self, client):
+        """Removes a client from every index."""
+        subscription = self.subscriptions.pop(client, None)
+        if subscription is None:
+            return
+
+        self.block_clients.discard(client)
+        self.summary_clients.discard(client)
+        self.stats_clients.discard(client)
+        for clients in self.risk_clients.values():
+            clients.discard(client)
+        for account in subscription.accounts:
+            clients = self.account_clients.get(account)
+            if clients is not None:
+                clients.pop(client, None)
+                if not clients:
+                    del self.account_clients[account]
+
+    def route_transactions(self, events: List[Dict[str, Any]]) -> List[Tuple[Set[Any], List[Dict[str, Any]]]]:
+        """
+        Splits a batch of transaction events into (clients, events) groups.
+        Clients sharing the same risk threshold share one group, so the frame
+        for them only has to be built and serialized once.
+        """
+        groups = []
+        ranks = [_risk_rank(event) for event in events]
+
+        for min_rank, clients in self.risk_clients.items():
+            if not clients:
+                continue
+            subset = events if min_rank == 0 else [e for e, r in zip(events, ranks) if r >= min_rank]
+            if subset:
+                groups.append((clients, subset))
+
+        if self.account_clients:
+            per_client: Dict[Any, List[Dict[str, Any]]] = {}
+            for event, rank in zip(events, ranks):
+                for account in (event.get("sender"), event.get("receiver")):
+                    for client, min_rank in self.account_clients.get(account, {}).items():
+                        if rank < min_rank:
+                            continue
+                        matched = per_client.setdefault(client, [])
+                        if not matched or matched[-1] is not event:  # sender == receiver, or both watched
+                            matched.append(event)
+            groups.extend(({client}, matched) for client, matched in per_client.items())
+
+        return groups
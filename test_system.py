@@ -12,7 +12,7 @@ print("=" * 60)
 print()
 
 # Test 1: Blockchain Core
-print("[1/5] Testing Blockchain Core...")
+print("[1/8] Testing Blockchain Core...")
 try:
     from blockchain import Blockchain, Transaction, Block
     bc = Blockchain()
@@ -30,18 +30,20 @@ try:
     assert len(bc.chain) == 2, "Block not added"
     assert len(bc.mempool) == 0, "Mempool not cleared"
     assert bc.is_chain_valid(), "Chain invalid"
+    assert bc.find_transaction(tx.id)[:2] == (1, 0), "Transaction index out of date"
     
     print("  ✅ Blockchain Core: PASS")
     print(f"     - Genesis block created")
     print(f"     - Transaction added to mempool")
     print(f"     - Block mined successfully")
     print(f"     - Chain validation: OK")
+    print(f"     - Transaction index: OK")
 except Exception as e:
     print(f"  ❌ Blockchain Core: FAIL - {e}")
     sys.exit(1)
 
 # Test 2: Fraud Detection Engine
-print("\n[2/5] Testing Fraud Detection Engine...")
+print("\n[2/8] Testing Fraud Detection Engine...")
 try:
     from fraud_engine import FraudDetectionEngine
     engine = FraudDetectionEngine()
@@ -76,58 +78,60 @@ try:
     }
     invalid_result = engine.evaluate_transaction(invalid_tx)
     assert invalid_result.score == 100, "Negative amount not caught"
+
+    # Batch scoring must agree with per-transaction scoring
+    batch_results = engine.evaluate_batch([normal_tx, fraud_tx, invalid_tx])
+    assert batch_results == [result, fraud_result, invalid_result], "Batch scoring mismatch"
     
     print("  ✅ Fraud Detection Engine: PASS")
     print(f"     - Normal tx score: {result.score:.1f} ({result.risk_level})")
     print(f"     - Fraud tx score: {fraud_result.score:.1f} ({fraud_result.risk_level})")
     print(f"     - Invalid tx score: {invalid_result.score:.1f} ({invalid_result.risk_level})")
+    print(f"     - Batch scoring: OK")
     print(f"     - ML Models: {'LOADED' if engine.models_loaded else 'NOT LOADED'}")
 except Exception as e:
     print(f"  ❌ Fraud Detection Engine: FAIL - {e}")
     sys.exit(1)
 
 # Test 3: ML Models
-print("\n[3/5] Testing ML Models...")
+print("\n[3/8] Testing ML Models...")
 try:
-    import pickle
-    rf_path = "models/rf_model.pkl"
-    xgb_path = "models/xgb_model.pkl"
-    encoder_path = "models/label_encoder_type.pkl"
+    from model_format import load_model
+    rf_path = "models/rf_model.bin"
+    xgb_path = "models/xgb_model.bin"
     
-    models_exist = os.path.exists(rf_path) and os.path.exists(xgb_path) and os.path.exists(encoder_path)
+    models_exist = os.path.exists(rf_path) and os.path.exists(xgb_path)
     
     if models_exist:
-        with open(rf_path, "rb") as f:
-            rf_model = pickle.load(f)
-        with open(xgb_path, "rb") as f:
-            xgb_model = pickle.load(f)
-        with open(encoder_path, "rb") as f:
-            encoder = pickle.load(f)
+        rf_model = load_model(rf_path)
+        xgb_model = load_model(xgb_path)
+        assert rf_model.feature_names == xgb_model.feature_names, "RF and XGBoost trained on different features"
         
         print("  ✅ ML Models: PASS")
-        print(f"     - Random Forest: LOADED")
-        print(f"     - XGBoost: LOADED")
-        print(f"     - Label Encoder: LOADED")
+        print(f"     - Random Forest: LOADED ({len(rf_model.roots)} trees, format v{rf_model.meta['format_version']})")
+        print(f"     - XGBoost: LOADED ({len(xgb_model.roots)} trees)")
+        print(f"     - Transaction types: {', '.join(rf_model.type_classes or [])}")
     else:
         print("  ⚠️  ML Models: NOT TRAINED")
         print(f"     Run: python train_model.py")
+        print(f"     (pickled models from older runs: python train_model.py --export)")
 except Exception as e:
     print(f"  ❌ ML Models: FAIL - {e}")
 
 # Test 4: Data File
-print("\n[4/5] Testing Data File...")
+print("\n[4/8] Testing Data File...")
 try:
-    import pandas as pd
-    df = pd.read_csv("data/output_1_to_10.csv")
+    from dataset import open_cache
+    cache = open_cache("data/output_1_to_10.csv")
     print("  ✅ Data File: PASS")
-    print(f"     - Rows: {len(df):,}")
-    print(f"     - Columns: {len(df.columns)}")
-    print(f"     - Fraud cases: {df['isFraud'].sum():,}")
+    print(f"     - Rows: {cache.rows:,}")
+    print(f"     - Columns: {len(cache.schema)}")
+    print(f"     - Fraud cases: {int(cache.codes('isFraud').sum()):,}")
 except Exception as e:
     print(f"  ❌ Data File: FAIL - {e}")
 
 # Test 5: Dependencies
-print("\n[5/5] Testing Dependencies...")
+print("\n[5/8] Testing Dependencies...")
 try:
     import websockets
     import colorama
@@ -145,6 +149,211 @@ except ImportError as e:
     print(f"  ❌ Dependencies: FAIL - {e}")
     print(f"     Run: pip install websockets colorama scikit-learn numpy pandas xgboost")
 
+# Test 6: Block Store, Pruning & Snapshots
+print("\n[6/8] Testing Block Store & Snapshots...")
+data_dir = None
+try:
+    import shutil
+    import tempfile
+    import threading
+    from block_store import BlockStore, read_snapshot, write_snapshot
+    from blockchain import verify_merkle_proof
+
+    data_dir = tempfile.mkdtemp(prefix="test_chain_")
+    bc = Blockchain(store=BlockStore(data_dir), prune_horizon=2)
+    bc.verbose = False
+    txs = []
+    for i in range(5):
+        txs.append(Transaction(f"C10000000{i}", "C999999999", 10.0 + i, "PAYMENT"))
+        bc.add_transaction(txs[-1])
+        bc.mine_pending_transactions("MINER")
+    assert bc.chain[1].transactions is None, "Block behind the horizon not pruned"
+    assert bc.chain[-1].transactions is not None, "Block inside the horizon pruned"
+
+    # Pruned bodies come back from disk, checked against the header
+    block_index, offset, found = bc.find_transaction(txs[0].id)
+    assert found["tx_id"] == txs[0].id, "Pruned transaction not found"
+    proof = bc.get_merkle_proof(block_index, offset)
+    assert verify_merkle_proof(txs[0].id, proof, bc.chain[block_index].merkle_root), "Merkle proof rejected"
+
+    # Snapshot round trip: reopening restores the same headers and indexes
+    bc.save_snapshot()
+    bc.store.close()
+    bc = Blockchain(store=BlockStore(data_dir), prune_horizon=2)
+    bc.verbose = False
+    assert bc.chain[-1].hash == read_snapshot(bc.store.snapshot_path)["headers"][-1]["hash"], "Snapshot tip mismatch"
+    assert bc.find_transaction(txs[4].id) is not None, "Index not restored from snapshot"
+
+    # Reorg back into pruned blocks: bodies return, the index and store shrink
+    dropped = bc.truncate(2)
+    assert len(bc.chain) == 3 and len(bc.store) == 3, "Truncate did not shrink the chain and store"
+    assert all(block.transactions is not None for block in dropped), "Dropped blocks lost their bodies"
+    assert all(block.transactions is not None for block in bc.chain[-2:]), "Bodies not restored inside the horizon"
+    assert bc.find_transaction(txs[4].id) is None, "Dropped transaction still indexed"
+    assert bc.reorganize(2, dropped) == [], "Re-applied blocks returned transactions"
+    assert bc.find_transaction(txs[4].id) is not None and bc.is_chain_valid(), "Reorg left the chain invalid"
+
+    # A snapshot written off-thread holds the state it was captured with, however the chain moves on
+    state = bc.snapshot_state()
+    captured_ids = len(state["index"]["by_tx_id"])
+    writer = threading.Thread(target=write_snapshot, args=(bc.store.snapshot_path, state))
+    for i in range(3):
+        bc.add_transaction(Transaction(f"C20000000{i}", "C999999999", 20.0 + i, "PAYMENT"))
+        bc.mine_pending_transactions("MINER")
+        if i == 0:
+            writer.start()  # The chain has already moved past the captured state
+    writer.join()
+    saved = read_snapshot(bc.store.snapshot_path)
+    assert saved["height"] == state["height"], "Snapshot height moved"
+    assert len(saved["index"]["by_tx_id"]) == captured_ids < len(bc.index.by_tx_id), "Snapshot shares the live index"
+    bc.store.close()
+
+    print("  ✅ Block Store & Snapshots: PASS")
+    print(f"     - Pruning and Merkle proofs: OK")
+    print(f"     - Snapshot round trip: OK")
+    print(f"     - Reorg into pruned blocks: OK")
+    print(f"     - Concurrent snapshot: OK")
+except Exception as e:
+    print(f"  ❌ Block Store & Snapshots: FAIL - {e}")
+    sys.exit(1)
+finally:
+    if data_dir:
+        shutil.rmtree(data_dir, ignore_errors=True)
+
+# Test 7: Peer Block Validation
+print("\n[7/8] Testing Peer Block Validation...")
+try:
+    from dataclasses import asdict
+    from metrics import LiveStats
+    import asyncio
+    from peers import block_header, check_block, check_headers, fetch_branch, parse_block
+
+    bc = Blockchain()
+    bc.verbose = False
+    for i in range(2):
+        bc.add_transaction(Transaction(f"C30000000{i}", "C999999999", 30.0 + i, "TRANSFER"))
+        bc.mine_pending_transactions("MINER")
+    genesis, first, second = bc.chain
+    headers = [block_header(first), block_header(second)]
+
+    # Headers: must follow, link to the parent and carry proof of work
+    assert check_headers(headers, genesis, bc.difficulty) is None, "Valid headers rejected"
+    assert check_headers(headers[1:], genesis, bc.difficulty), "Out-of-order header accepted"
+    unlinked, unworked = {**headers[0], "previous_hash": "f" * 64}, {**headers[0], "hash": "f" * 64}
+    assert check_headers([unlinked], genesis, bc.difficulty), "Unlinked header accepted"
+    assert check_headers([unworked], genesis, bc.difficulty), "Header without proof of work accepted"
+
+    # Full blocks: the hash must cover the data and the Merkle root the transactions
+    block_data = asdict(first)
+    assert check_block(parse_block(block_data), bc.difficulty) is None, "Valid block rejected"
+    tampered = parse_block({**block_data, "timestamp": block_data["timestamp"] + 1})
+    assert check_block(tampered, bc.difficulty), "Tampered block accepted"
+    # Re-mined so the hash is right: no Merkle root, then the right root over the wrong transactions
+    for root, transactions in (("", block_data["transactions"]), (first.merkle_root, asdict(second)["transactions"])):
+        remined = parse_block({**block_data, "merkle_root": root, "transactions": transactions, "nonce": 0, "hash": ""})
+        remined.mine_block(bc.difficulty)
+        assert check_block(remined, bc.difficulty), "Block with a missing or wrong Merkle root accepted"
+
+    # Malformed blocks never reach the chain: parse_block raises ValueError
+    malformed = [None, [], {**block_data, "index": "1"}, {**block_data, "index": 0},
+                 {k: v for k, v in block_data.items() if k != "hash"}, {**block_data, "transactions": "x"},
+                 {**block_data, "transactions": [{**block_data["transactions"][0], "amount": "30"}]},
+                 {**block_data, "transactions": [{**block_data["transactions"][0], "amount": 1.0}]},
+                 {**block_data, "transactions": [{**block_data["transactions"][0], "fraud_analysis": "HIGH"}]}]
+    for data in malformed:
+        try:
+            parse_block(data)
+        except ValueError:
+            continue
+        raise AssertionError(f"Malformed block accepted: {str(data)[:60]}")
+
+    # Malformed HEADERS replies: fetch_branch raises ValueError before checking the header chain
+    class FakePeer:
+        def __init__(self, reply):
+            self.reply = reply
+
+        async def request(self, message):
+            return self.reply
+
+    malformed_headers = [{"fork_height": 0, "headers": [{"index": 1, "previous_hash": genesis.hash, "hash": 5}]},
+                         {"fork_height": 0, "headers": {"index": 1}}, {"fork_height": 0, "headers": [None]},
+                         {"fork_height": "0", "headers": headers}, {"headers": headers}]
+    for reply in malformed_headers:
+        try:
+            asyncio.run(fetch_branch(FakePeer(reply), Blockchain()))
+        except ValueError:
+            continue
+        raise AssertionError(f"Malformed HEADERS accepted: {str(reply)[:60]}")
+
+    # Received blocks stay out of the mining histogram; a reorg rewinds the block stats
+    stats = LiveStats(genesis_block=genesis)
+    stats.record_block(first, 0.5, valid=False)
+    stats.record_received_block(second)
+    assert stats.mining_time.count == 1 and stats.total_blocks == 3, "Received block counted as mined"
+    stats.record_reorg(0, [second])
+    assert stats.total_blocks == 2 and stats.chain_valid, "Reorg did not rewind the block stats"
+    assert [summary["index"] for summary in stats.recent_blocks] == [0, 2], "Dropped blocks still listed"
+
+    print("  ✅ Peer Block Validation: PASS")
+    print(f"     - Header checks: OK")
+    print(f"     - Block hash and Merkle root checks: OK")
+    print(f"     - Malformed blocks rejected: {len(malformed)}/{len(malformed)}")
+    print(f"     - Malformed HEADERS rejected: {len(malformed_headers)}/{len(malformed_headers)}")
+    print(f"     - Block stats on receive and reorg: OK")
+except Exception as e:
+    print(f"  ❌ Peer Block Validation: FAIL - {e}")
+    sys.exit(1)
+
+# Test 8: Admission Control
+print("\n[8/8] Testing Admission Control...")
+try:
+    import admission
+    from admission import AdmissionControl, TokenBucket
+
+    # A full bucket admits any batch, going into debt; the debt is paid off at `rate`
+    bucket = TokenBucket(rate=10, burst=10, now=0.0)
+    assert bucket.wait_time(25, now=0.0) == 0, "Full bucket refused a large batch"
+    bucket.take(25)
+    assert abs(bucket.wait_time(1, now=0.0) - 1.6) < 1e-9, "Debt not carried"
+    assert bucket.wait_time(1, now=1.6) == 0, "Debt not paid off by refill"
+
+    # All or nothing: a batch shed for one account spends no tokens anywhere
+    control = AdmissionControl(connection_rate=100, account_rate=2)
+    assert control.admit("ws", ["A", "A", "B"], now=0.0) is None, "Batch within limits shed"
+    shed = control.admit("ws", ["B", "A"], now=0.0)
+    assert shed and shed.reason == admission.REASON_ACCOUNT and shed.account == "A", "Busy account not shed"
+    assert control.admit("ws", ["B"], now=0.0) is None, "Shed batch spent the other account's tokens"
+    assert control._connections["ws"].tokens == 96, "Shed batch spent connection tokens"
+    assert control.admit("peer", ["A"] * 3, now=0.0, check_accounts=False) is None, "Peer gossip charged per account"
+    control.release(7)
+
+    # Scoring cap: an idle node takes any batch, a busy one sheds what would overflow
+    control = AdmissionControl(max_scoring=5)
+    assert control.admit("ws", ["A"] * 10) is None, "Idle node shed a batch"
+    assert control.admit("ws", ["B"]).reason == admission.REASON_OVERLOAD, "Overload not shed"
+    control.release(10)
+    assert control.admit("ws", ["B"] * 4) is None and control.scoring == 4, "Released slots not reused"
+
+    # Least recently seen accounts lose their bucket first
+    tracked = admission.MAX_TRACKED_ACCOUNTS
+    admission.MAX_TRACKED_ACCOUNTS = 3
+    try:
+        control = AdmissionControl(account_rate=5)
+        for account in ["A", "B", "C", "A", "D"]:
+            control.admit("ws", [account], now=0.0)
+        assert list(control._accounts) == ["C", "A", "D"], "LRU did not evict the least recently seen account"
+    finally:
+        admission.MAX_TRACKED_ACCOUNTS = tracked
+
+    print("  ✅ Admission Control: PASS")
+    print(f"     - Token bucket debt: OK")
+    print(f"     - All-or-nothing admission: OK")
+    print(f"     - Scoring cap: OK")
+    print(f"     - Account LRU eviction: OK")
+except Exception as e:
+    print(f"  ❌ Admission Control: FAIL - {e}")
+    sys.exit(1)
+
 print()
 print("=" * 60)
 print("  ALL TESTS COMPLETE")
@@ -1,11 +1,11 @@
-
+import argparse
 import pandas as pd
 import numpy as np
 import pickle
 import os
+import time
 from sklearn.model_selection import train_test_split
 from sklearn.ensemble import RandomForestClassifier
-from sklearn.preprocessing import LabelEncoder
 from sklearn.metrics import classification_report, accuracy_score
 
 # Try to import XGBoost, but fallback if not available
@@ -16,9 +16,81 @@ except ImportError:
     XGBOOST_AVAILABLE = False
     print("XGBoost not installed. Skipping XGBoost model.")
 
+try:
+    import resource  # Unix only
+except ImportError:
+    resource = None
+    import tracemalloc
+
+from dataset import iter_transactions, load_transactions
+from features import MODEL_FEATURES, TX_TYPES, UNKNOWN_TYPE, FeaturePipeline, type_codes
+from model_format import export_model
+
 DATA_PATH = r"data/output_1_to_10.csv"
 MODEL_DIR = r"models"
 
+TARGET = 'isFraud'
+
+# Same feature spec the fraud engine scores with (see features.py)
+FEATURE_PIPELINE = FeaturePipeline(MODEL_FEATURES)
+
+# Streaming defaults
+CHUNK_SIZE = 500_000        # Rows per chunk
+NEGATIVE_RATE = 0.05        # Fraction of non-fraud rows kept (all fraud rows are kept, kept rows are reweighted)
+BATCH_ROWS = 200_000        # Sampled rows buffered before each incremental fit
+TREES_PER_BATCH = 20        # Random Forest trees added per incremental fit
+ROUNDS_PER_BATCH = 50       # XGBoost boosting rounds added per incremental fit
+
+
+def read_transactions(path, chunksize=None):
+    """Reads the feature inputs through the columnar cache; yields chunks if chunksize is set."""
+    columns = FEATURE_PIPELINE.inputs + [TARGET]
+    if chunksize:
+        return iter_transactions(path, columns, chunksize)
+    return load_transactions(path, columns)
+
+
+def model_path(name):
+    return os.path.join(MODEL_DIR, f"{name}_model.bin")
+
+
+def save_model(model, name, feature_names=MODEL_FEATURES, negative_rate=None):
+    """Exports a fitted model to models/<name>_model.bin (see model_format.py), with the type codes it was trained on."""
+    export_model(model, model_path(name), feature_names, type_classes=TX_TYPES, negative_rate=negative_rate)
+
+
+def export_legacy_models():
+    """Converts models/*.pkl from older runs into the binary model format."""
+    type_classes = TX_TYPES
+    encoder_path = os.path.join(MODEL_DIR, "label_encoder_type.pkl")
+    if os.path.exists(encoder_path):
+        with open(encoder_path, "rb") as f:
+            type_classes = list(pickle.load(f).classes_)
+
+    exported = 0
+    for name in ("rf", "xgb", "student"):
+        pickle_path = os.path.join(MODEL_DIR, f"{name}_model.pkl")
+        if not os.path.exists(pickle_path):
+            continue
+        with open(pickle_path, "rb") as f:
+            model = pickle.load(f)
+        # Students carry their own feature names
+        feature_names = None if name == "student" else MODEL_FEATURES
+        export_model(model, model_path(name), feature_names, type_classes=type_classes)
+        print(f"💾 {pickle_path} -> {model_path(name)}")
+        exported += 1
+    if not exported:
+        print(f"⚠️ No pickled models found in {MODEL_DIR}/")
+
+
+def peak_memory_mb():
+    """Peak memory of this process in MB (max RSS on Unix, traced allocations elsewhere)."""
+    if resource is not None:
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak / 1024 / 1024 if os.uname().sysname == "Darwin" else peak / 1024
+    return tracemalloc.get_traced_memory()[1] / 1024 / 1024
+
+
 def train_and_save_models():
     print("🚀 Starting Model Training Pipeline...")
 
@@ -28,30 +100,21 @@ def train_and_save_models():
         return
 
     print(f"📂 Loading data from {DATA_PATH}...")
-    df = pd.read_csv(DATA_PATH)
-    
+    df = read_transactions(DATA_PATH)
+
     # 2. Preprocessing
     print("🛠️ Preprocessing data...")
-    
+
     # Drop columns that are not useful for prediction (or too high cardinality)
     # keeping 'type', 'amount', 'oldbalanceOrg', 'newbalanceOrig', 'oldbalanceDest', 'newbalanceDest'
     # 'nameOrig', 'nameDest', 'isFlaggedFraud', 'step' are dropped for simplicity/leakage prevention
     # In a real scenario, you might feature engineer 'step' (time of day) or 'nameDest' (frequency)
-    
-    features = ['type', 'amount', 'oldbalanceOrg', 'newbalanceOrig', 'oldbalanceDest', 'newbalanceDest']
-    target = 'isFraud'
-    
-    X = df[features].copy()
-    y = df[target]
-
-    # Encode Categorical Data ('type')
-    le = LabelEncoder()
-    X['type'] = le.fit_transform(X['type'])
-    
-    # Save the encoder for later use in inference
-    with open(os.path.join(MODEL_DIR, "label_encoder_type.pkl"), "wb") as f:
-        pickle.dump(le, f)
-    print("✅ Label Encoder saved.")
+
+    df = df[type_codes(df['type']) != UNKNOWN_TYPE]
+    X = FEATURE_PIPELINE.transform_frame(df)
+    y = df[TARGET].to_numpy()
+
+    # Categorical Data ('type') is encoded by the feature spec; the type codes are saved with each model
 
     # 3. Split Data
     X_train, X_test, y_train, y_test = train_test_split(X, y, test_size=0.2, random_state=42, stratify=y)
@@ -61,14 +124,13 @@ def train_and_save_models():
     print("🌲 Training Random Forest Classifier...")
     rf_model = RandomForestClassifier(n_estimators=100, random_state=42, n_jobs=-1)
     rf_model.fit(X_train, y_train)
-    
+
     y_pred_rf = rf_model.predict(X_test)
     print(f"✅ Random Forest Accuracy: {accuracy_score(y_test, y_pred_rf):.4f}")
     # print(classification_report(y_test, y_pred_rf))
 
     # Save RF Model
-    with open(os.path.join(MODEL_DIR, "rf_model.pkl"), "wb") as f:
-        pickle.dump(rf_model, f)
+    save_model(rf_model, "rf")
     print("💾 Random Forest model saved.")
 
     # 5. Train XGBoost (Optional)
@@ -82,18 +144,188 @@ def train_and_save_models():
             n_jobs=-1
         )
         xgb_model.fit(X_train, y_train)
-        
+
         y_pred_xgb = xgb_model.predict(X_test)
         print(f"✅ XGBoost Accuracy: {accuracy_score(y_test, y_pred_xgb):.4f}")
-        
+
         # Save XGBoost Model
-        with open(os.path.join(MODEL_DIR, "xgb_model.pkl"), "wb") as f:
-            pickle.dump(xgb_model, f)
+        save_model(xgb_model, "xgb")
         print("💾 XGBoost model saved.")
-    
+
     print("\n🎉 Training Complete! Models are ready in 'models/' directory.")
+    print(f"📈 Peak memory: {peak_memory_mb():.0f} MB")
+
+
+def sample_chunk(chunk, negative_rate, test_size, rng):
+    """
+    Stratified on-the-fly sampling of one chunk: keeps every fraud row and
+    `negative_rate` of the rest, then splits each class into train/test
+    with the same `test_size`, so both sides keep the sampled fraud ratio.
+    Returns (X_train, y_train, X_test, y_test) as NumPy arrays.
+    """
+    fraud = chunk[TARGET].to_numpy() == 1
+    keep = fraud | (rng.random(len(fraud)) < negative_rate)
+    keep &= type_codes(chunk['type']) != UNKNOWN_TYPE
+    chunk = chunk[keep]
+
+    X = FEATURE_PIPELINE.transform_frame(chunk)
+    y = chunk[TARGET].to_numpy()
+    test = rng.random(len(y)) < test_size  # Independent per row, so per class too
+    return X[~test], y[~test], X[test], y[test]
+
+
+def sample_weights(y, negative_rate):
+    """
+    Inverse sampling weights: each kept non-fraud row stands for
+    1 / negative_rate rows of the full data. Fitting with them keeps the
+    predicted probabilities calibrated to the real fraud rate instead of
+    the inflated rate of the downsampled set.
+    """
+    return np.where(y == 1, 1.0, 1.0 / negative_rate)
+
+
+def train_streaming(data_path=DATA_PATH, chunksize=CHUNK_SIZE, negative_rate=NEGATIVE_RATE,
+                    batch_rows=BATCH_ROWS, test_size=0.2, seed=42):
+    """
+    Trains on a CSV larger than memory. Chunks are sliced from the
+    memory-mapped columnar cache (see dataset.py), downsampled per class
+    on the fly, and buffered until `batch_rows` sampled rows (with both
+    classes) are available; each full buffer grows
+    the Random Forest by TREES_PER_BATCH trees (warm start) and continues
+    XGBoost boosting from the previous booster. Only the buffer and the
+    sampled hold-out set are kept in memory. Kept non-fraud rows are
+    weighted by 1 / negative_rate (see sample_weights), and the rate is
+    recorded in the saved models.
+    """
+    print("🚀 Starting Streaming Training Pipeline...")
+    if not os.path.exists(data_path):
+        print(f"❌ Error: Data file not found at {data_path}")
+        return
+
+    if resource is None:
+        tracemalloc.start()
+    started = time.perf_counter()
+    rng = np.random.default_rng(seed)
+
+    rf_model = RandomForestClassifier(n_estimators=0, warm_start=True, random_state=seed, n_jobs=-1)
+    xgb_model = None
+    if XGBOOST_AVAILABLE:
+        xgb_model = XGBClassifier(
+            objective='binary:logistic',
+            eval_metric='logloss',
+            n_estimators=ROUNDS_PER_BATCH,
+            random_state=seed,
+            n_jobs=-1
+        )
+    xgb_fitted = False
+
+    buffer_X, buffer_y, test_X, test_y = [], [], [], []
+    buffered = 0
+    rows_read = rows_sampled = fits = 0
+
+    def fit_buffer():
+        nonlocal buffered, fits, xgb_fitted
+        X = np.concatenate(buffer_X)
+        y = np.concatenate(buffer_y)
+        weights = sample_weights(y, negative_rate)
+        rf_model.n_estimators += TREES_PER_BATCH
+        rf_model.fit(X, y, sample_weight=weights)
+        if xgb_model is not None:
+            xgb_model.fit(X, y, sample_weight=weights, xgb_model=xgb_model.get_booster() if xgb_fitted else None)
+            xgb_fitted = True
+        fits += 1
+        print(f"   🌲 Fit #{fits}: {len(y):,} rows ({int(y.sum()):,} fraud), "
+              f"{rf_model.n_estimators} trees, peak {peak_memory_mb():.0f} MB")
+        buffer_X.clear()
+        buffer_y.clear()
+        buffered = 0
+
+    print(f"📂 Streaming {data_path} in chunks of {chunksize:,} rows "
+          f"(keeping all fraud, {negative_rate:.1%} of non-fraud)...")
+    for chunk in read_transactions(data_path, chunksize=chunksize):
+        rows_read += len(chunk)
+        X_train, y_train, X_test, y_test = sample_chunk(chunk, negative_rate, test_size, rng)
+        del chunk
+        rows_sampled += len(y_train) + len(y_test)
+        buffer_X.append(X_train)
+        buffer_y.append(y_train)
+        test_X.append(X_test)
+        test_y.append(y_test)
+        buffered += len(y_train)
+
+        # A warm-started forest needs both classes in every fit
+        if buffered >= batch_rows and len(np.unique(np.concatenate(buffer_y))) == 2:
+            fit_buffer()
+
+    if buffered and len(np.unique(np.concatenate(buffer_y))) == 2:
+        fit_buffer()
+    if not fits:
+        print("❌ Error: not enough data with both classes to train")
+        return
+
+    X_test = np.concatenate(test_X)
+    y_test = np.concatenate(test_y)
+    print(f"📊 Read {rows_read:,} rows, sampled {rows_sampled:,}; hold-out set {len(y_test):,} rows")
+
+    print(f"✅ Random Forest Accuracy (sampled hold-out): {accuracy_score(y_test, rf_model.predict(X_test)):.4f}")
+    save_model(rf_model, "rf", negative_rate=negative_rate)
+    print("💾 Random Forest model saved.")
+
+    if xgb_model is not None:
+        print(f"✅ XGBoost Accuracy (sampled hold-out): {accuracy_score(y_test, xgb_model.predict(X_test)):.4f}")
+        save_model(xgb_model, "xgb", negative_rate=negative_rate)
+        print("💾 XGBoost model saved.")
+
+    print(f"\n🎉 Streaming training complete in {time.perf_counter() - started:.1f}s "
+          f"({fits} incremental fits)")
+    print(f"📈 Peak memory: {peak_memory_mb():.0f} MB")
+
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Train the fraud detection models")
+    parser.add_argument("--data", default=DATA_PATH, help="PaySim-style transaction CSV")
+    parser.add_argument("--stream", action="store_true",
+                        help="Stream the CSV in chunks and train incrementally (for files larger than RAM)")
+    parser.add_argument("--chunksize", type=int, default=CHUNK_SIZE, help="Stream: CSV rows per chunk")
+    parser.add_argument("--negative-rate", type=float,
+                        help=f"Stream/search/distill: fraction of non-fraud rows kept, fraud rows are always kept "
+                             f"(default: {NEGATIVE_RATE}; 1.0 for --search)")
+    parser.add_argument("--batch-rows", type=int, default=BATCH_ROWS,
+                        help="Stream: sampled rows buffered per incremental fit")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--search", choices=["grid", "random"],
+                        help="Hyperparameter search with stratified k-fold CV instead of training (see model_search.py)")
+    parser.add_argument("--models", nargs="+", choices=["rf", "xgb"], help="Search: model kinds to try")
+    parser.add_argument("--n-iter", type=int, default=10, help="Search: random candidates per model kind")
+    parser.add_argument("--folds", type=int, default=5, help="Search: cross-validation folds")
+    parser.add_argument("--workers", type=int, help="Search: worker processes (default: CPU count)")
+    parser.add_argument("--latency-budget-us", type=float, help="Search: per-row inference budget to flag")
+    parser.add_argument("--leaderboard", help="Search: write the leaderboard JSON here")
+    parser.add_argument("--distill", choices=["trees", "linear"],
+                        help="Distill the saved teacher into a compact student for serving (see distill.py)")
+    parser.add_argument("--teacher", choices=["rf", "xgb"], default="rf", help="Distill: teacher model")
+    parser.add_argument("--export", action="store_true",
+                        help="Convert pickled models (models/*.pkl) from older runs into the binary format")
+    args = parser.parse_args()
+
     if not os.path.exists(MODEL_DIR):
         os.makedirs(MODEL_DIR)
-    train_and_save_models()
+    if args.export:
+        export_legacy_models()
+    elif args.distill:
+        from distill import distill
+        negative_rate = args.negative_rate if args.negative_rate is not None else NEGATIVE_RATE
+        distill(args.data, args.distill, args.teacher, negative_rate, args.seed)
+    elif args.search:
+        from model_search import run_search
+        negative_rate = args.negative_rate if args.negative_rate is not None else 1.0
+        run_search(args.data, args.search, args.models, args.n_iter, args.folds, args.workers,
+                   negative_rate, args.seed, args.latency_budget_us, args.leaderboard)
+    elif args.stream:
+        negative_rate = args.negative_rate if args.negative_rate is not None else NEGATIVE_RATE
+        train_streaming(args.data, args.chunksize, negative_rate, args.batch_rows, seed=args.seed)
+    else:
+        DATA_PATH = args.data
+        if resource is None:
+            tracemalloc.start()
+        train_and_save_models()